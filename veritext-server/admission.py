@@ -0,0 +1,232 @@
+# veritext-server/admission.py
+"""Control de admisión para el camino de análisis.
+
+Sin límite, un pico de textos grandes se acumula en el threadpool hasta que
+todas las peticiones (también `/auth/login` y `/`) acaban en timeout. Aquí
+se acota el trabajo en curso:
+
+  - `AdmissionController`: como mucho `max_concurrency` análisis a la vez y
+    `max_queue` esperando. Si la cola está llena, o la espera estimada (cola
+    por la duración media de un análisis) supera el objetivo de latencia,
+    se rechaza al momento con 503 en lugar de aceptar una petición que va a
+    llegar tarde. Quien espera más que el objetivo también sale con 503.
+  - `UserRateLimiter`: token bucket por usuario (429 al agotarse). Un lote
+    cuesta un token por texto y un documento por ventanas, uno por ventana.
+
+Ambos se usan desde los endpoints async, en el bucle de eventos, así que
+la cola no ocupa hilos.
+"""
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, nullcontext
+from typing import Hashable, Optional
+import asyncio
+import math
+import os
+import threading
+import time
+
+
+ANALYZE_MAX_CONCURRENCY = int(os.getenv("VERITEXT_ANALYZE_MAX_CONCURRENCY", "32"))  # 0 = sin límite
+ANALYZE_MAX_QUEUE = int(os.getenv("VERITEXT_ANALYZE_MAX_QUEUE", "128"))
+ANALYZE_LATENCY_TARGET_MS = float(os.getenv("VERITEXT_ANALYZE_LATENCY_TARGET_MS", "2000"))
+
+USER_RATE = float(os.getenv("VERITEXT_USER_RATE", "0"))  # análisis/s por usuario; 0 = sin límite
+USER_BURST = int(os.getenv("VERITEXT_USER_BURST", "20"))
+USER_RATE_MAX_KEYS = int(os.getenv("VERITEXT_USER_RATE_MAX_KEYS", "100000"))
+
+
+class Rejected(Exception):
+    """Petición rechazada; `retry_after` en segundos enteros para la cabecera Retry-After."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _retry_after(seconds: float) -> int:
+    return max(1, math.ceil(seconds))
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrency: int = ANALYZE_MAX_CONCURRENCY,
+        max_queue: int = ANALYZE_MAX_QUEUE,
+        latency_target_ms: float = ANALYZE_LATENCY_TARGET_MS,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max(max_queue, 0)
+        self.latency_target_s = latency_target_ms / 1000.0
+
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._service_s: Optional[float] = None  # media móvil de la duración de un análisis
+
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_queue_full = 0
+        self.rejected_latency = 0
+        self.rejected_timeout = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrency > 0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for f in self._waiters if not f.done())
+
+    def estimated_wait_s(self) -> float:
+        """Espera estimada de una petición que llegue ahora a la cola."""
+        if self._service_s is None:
+            return 0.0
+        return (self.queue_depth + 1) / self.max_concurrency * self._service_s
+
+    def slot(self):
+        """Contexto async que ocupa un hueco; lanza `Rejected` si no se admite."""
+        if not self.enabled:
+            return nullcontext()
+        return self._slot()
+
+    @asynccontextmanager
+    async def _slot(self):
+        await self._acquire()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - t0)
+
+    async def _acquire(self) -> None:
+        if self.in_flight < self.max_concurrency and not self.queue_depth:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        if self.queue_depth >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise Rejected("queue_full", _retry_after(self.estimated_wait_s()))
+        wait = self.estimated_wait_s()
+        if wait > self.latency_target_s:
+            self.rejected_latency += 1
+            raise Rejected("latency", _retry_after(wait))
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(fut, timeout=self.latency_target_s)
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                # El hueco llegó a la vez que el timeout o la cancelación.
+                self._release(None)
+            else:
+                fut.cancel()
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected_timeout += 1
+                raise Rejected("timeout", _retry_after(self.estimated_wait_s()))
+            raise
+        # El hueco se hereda de quien lo liberó: in_flight no cambia.
+        self.admitted += 1
+
+    def _release(self, service_s: Optional[float]) -> None:
+        if service_s is not None:
+            self._service_s = service_s if self._service_s is None else 0.8 * self._service_s + 0.2 * service_s
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "latency_target_ms": self.latency_target_s * 1000,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "service_ms_avg": (self._service_s or 0.0) * 1000,
+            "estimated_wait_ms": self.estimated_wait_s() * 1000 if self.enabled else 0.0,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_latency": self.rejected_latency,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+
+class UserRateLimiter:
+    """Token bucket por clave (id de usuario o IP del cliente anónimo).
+
+    Se guardan como mucho `max_keys` claves; las que no se usan desde hace
+    más tiempo se descartan (vuelven con el cubo lleno).
+    """
+
+    def __init__(self, rate: float = USER_RATE, burst: int = USER_BURST, max_keys: int = USER_RATE_MAX_KEYS):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, list[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.allowed = 0
+        self.limited = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def check(self, key: Hashable, cost: int = 1) -> None:
+        """Consume `cost` tokens de `key`; lanza `Rejected` si no hay bastantes.
+
+        Una petición que cuesta más que la ráfaga entra con el cubo lleno y lo
+        deja en negativo: el usuario espera después en proporción a lo que pidió.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            bucket = self._bucket(key)
+            need = float(min(max(cost, 1), self.burst))
+            if bucket[0] < need:
+                self.limited += 1
+                raise Rejected("rate_limit", _retry_after((need - bucket[0]) / self.rate))
+            bucket[0] -= max(cost, 1)
+            self.allowed += 1
+
+    def charge(self, key: Hashable, cost: int) -> None:
+        """Descuenta `cost` tokens sin rechazar: para trabajo que ya se admitió
+        con `check` y cuyo coste sólo se conoce después. Puede dejar deuda."""
+        if not self.enabled or cost <= 0:
+            return
+        with self._lock:
+            self._bucket(key)[0] -= cost
+
+    def _bucket(self, key: Hashable) -> list[float]:
+        """Cubo de `key` rellenado hasta ahora; se llama con el lock tomado."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "keys": len(self._buckets),
+                "allowed": self.allowed,
+                "limited": self.limited,
+            }
@@ -6,8 +6,10 @@ from fastapi import APIRouter, Depends, Header, HTTPException, status
 from sqlalchemy.orm import Session
 
 from db import get_db
-from models import User, Analysis
+from explain import score_batch
+from models import User
 from schemas import AnalyzeReq, AnalyzeRes
+from text_store import guardar_analisis
 
 router = APIRouter(prefix="/analyze", tags=["analyze"])
 
@@ -60,28 +62,26 @@ def analyze_text(
 
     model = _lazy_load_model()
     if model:
-        # TODO: aquí va tu lógica real con el modelo
-
-        prob = min(len(txt) / 1000.0, 1.0)
+        prob, top_words, top_words_human = score_batch(model, [txt])[0]
     else:
         prob = min(len(txt) / 1000.0, 1.0)
-
-    top_words = sorted(set(w.lower() for w in txt.split()))[:5]
+        top_words = sorted(set(w.lower() for w in txt.split()))[:5]
+        top_words_human = []
 
     # --- guardar en BD ---
-    analysis = Analysis(
-        user_id=user.id if user else None,
-        text=txt,
-        score=prob,
-        top_words=json.dumps(top_words),
-        created_at=datetime.now(timezone.utc),
-    )
-    db.add(analysis)
+    guardar_analisis(db, [{
+        "user_id": user.id if user else None,
+        "text": txt,
+        "score": prob,
+        "top_words": json.dumps(top_words),
+        "top_words_human": json.dumps(top_words_human),
+        "created_at": datetime.now(timezone.utc),
+    }])
     db.commit()
-    db.refresh(analysis)
 
     return AnalyzeRes(
         score=prob,
         buckets={"human": 1 - prob, "ai": prob},
         top_words=top_words,
+        top_words_human=top_words_human,
     )
@@ -1,14 +1,26 @@
-﻿from typing import Optional
+﻿from collections import Counter
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, Iterator, Optional, Union
 from datetime import datetime, timezone
+import asyncio
+import base64
 import json
-import re  
+import os
+import secrets
+import tempfile
+import threading
 
-from fastapi import FastAPI, Depends, HTTPException, status, Header
+from fastapi import FastAPI, Depends, HTTPException, Request, status, Header, Query, File, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from sqlalchemy import and_, case, func, or_
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, OperationalError
 
-from db import get_db, Base, engine
+from db import get_db, get_session, Base, engine, async_engine
 from models import User, Analysis
 from schemas import (
     RegisterReq,
@@ -17,9 +29,37 @@ from schemas import (
     UserRes,
     AnalyzeReq,
     AnalyzeRes,
+    AnalyzeBatchItem,
     HistoryItem,
+    AnalysisTextRes,
+    NearDuplicate,
+)
+from model_store import ModelStore
+from security import (
+    HashExecutor,
+    HashSaturated,
+    hash_password,
+    new_token,
+    verify_and_update,
+)
+from sessions import SessionCache, SessionUser
+from text_store import cargar_texto, comprimir_analisis, guardar_analisis, insertar_analisis, text_id
+from near_dup import NEARDUP_ENABLED, NEARDUP_MODE, NearDupIndex, firma
+from write_behind import WRITE_BEHIND_ENABLED, WriteBehind
+from extraction import ExtractionError, ExtractionPool, ExtractionSaturated, extraer_pdf
+from admission import AdmissionController, Rejected, UserRateLimiter
+from profiling import Profiler
+from metrics import CONTENT_TYPE, METRICS_ENABLED, REGISTRY, Gauges, MetricsMiddleware, etapa, pool_stats
+from batching import MicroBatcher
+from cache import ResultCache, text_hash
+from explain import TOP_K, Scored, score_batch
+from preprocess import Documento, preparar, ventanas
+from inference_pool import (
+    INFERENCE_TIMEOUT_S,
+    INFERENCE_WORKERS,
+    InferencePool,
+    PoolSaturated,
 )
-from security import hash_password, verify_password, new_token
 
 
 app = FastAPI(title="Veritext API", version="0.1.0")
@@ -27,7 +67,38 @@ app = FastAPI(title="Veritext API", version="0.1.0")
 
 @app.on_event("startup")
 def on_startup() -> None:
-  Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    # Carga y calentamiento al arrancar: el primer usuario no paga el
+    # unpickling y un modelo ausente se ve en el log y en /ready.
+    try:
+        _STORE.get()
+    except Exception as e:
+        print("[startup] Modelo no disponible:", repr(e))
+
+    if INFERENCE_WORKERS > 0:
+        _start_pool()
+
+    _STORE.start_watch()
+
+    if NEARDUP_ENABLED:
+        _NEARDUP.start_sync(engine)
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    _STORE.stop_watch()
+    _NEARDUP.stop_sync()
+    if _BATCHER is not None:
+        _BATCHER.close()
+    if _POOL is not None:
+        _POOL.shutdown()
+    _HASHER.shutdown()
+    _EXTRACTOR.shutdown()
+    if _WRITER is not None:
+        _WRITER.close()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 
 app.add_middleware(
@@ -36,8 +107,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # El cliente web lee el cursor de la siguiente página de /history.
+    expose_headers=["X-Next-Cursor"],
 )
 
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 
 def _extract_token(auth: Optional[str]) -> str:
     if not auth:
@@ -48,17 +124,118 @@ def _extract_token(auth: Optional[str]) -> str:
     return auth
 
 
+_SESSIONS = SessionCache()
+
+
+def _lookup_session(db: Session, token: str) -> Optional[SessionUser]:
+    """Busca el token en la base de datos y, si existe, lo guarda en caché."""
+    row = db.query(User.id, User.email).filter(User.token == token).first()
+    if row is None:
+        return None
+    user = SessionUser(row.id, row.email)
+    _SESSIONS.put(token, user)
+    return user
+
+
+def _session_user(db: Session, token: str) -> Optional[SessionUser]:
+    """Usuario del token; sólo consulta la base de datos si no está en caché."""
+    if not token:
+        return None
+    user = _SESSIONS.get(token)
+    if user is None:
+        user = _lookup_session(db, token)
+    return user
+
+
+def _current_user(Authorization: Optional[str], db: Session) -> SessionUser:
+    token = _extract_token(Authorization)
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Falta token",
+        )
+
+    user = _session_user(db, token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido",
+        )
+    return user
+
+
+# Sesión de base de datos de los endpoints que admiten los dos modos
+# (ver VERITEXT_DB_ASYNC en db.py).
+DbSession = Union[Session, AsyncSession]
+
+
+async def _db_run(db: DbSession, fn, *args):
+    """Ejecuta `fn(session, *args)` con la sesión síncrona de `db`.
+
+    En modo async corre sobre la AsyncSession (`run_sync`): la espera a la
+    base de datos no ocupa ningún hilo. En modo síncrono va al threadpool,
+    como un endpoint `def`. `fn` no debe hacer trabajo de CPU pesado.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(lambda session: fn(session, *args))
+    return await run_in_threadpool(fn, db, *args)
+
+
+async def _session_user_async(db: DbSession, token: str) -> Optional[SessionUser]:
+    """Como `_session_user`; con la sesión en caché no toca la base de datos."""
+    if not token:
+        return None
+    user = _SESSIONS.get(token)
+    if user is None:
+        user = await _db_run(db, _lookup_session, token)
+    return user
+
+
+async def _current_user_async(Authorization: Optional[str], db: DbSession) -> SessionUser:
+    token = _extract_token(Authorization)
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Falta token",
+        )
+
+    user = await _session_user_async(db, token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido",
+        )
+    return user
+
+
 # =========================
 #        AUTH
 # =========================
 
+# bcrypt corre en su propio ejecutor acotado y el acceso a la base de datos
+# en el threadpool, así que los endpoints de auth son async y no retienen
+# un hilo del threadpool mientras se calcula el hash.
+_HASHER = HashExecutor()
+
+
+async def _hash_call(fn, *args):
+    try:
+        return await _HASHER.run(fn, *args)
+    except HashSaturated:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor ocupado, inténtalo de nuevo en unos segundos",
+            headers={"Retry-After": "1"},
+        )
+
+
 @app.post(
     "/auth/register",
     response_model=UserRes,
     status_code=status.HTTP_201_CREATED,
     tags=["auth"],
 )
-def register(payload: RegisterReq, db: Session = Depends(get_db)):
+async def register(payload: RegisterReq, db: DbSession = Depends(get_session)):
     email = payload.email.strip().lower()
     pwd = payload.password.strip()
 
@@ -68,6 +245,11 @@ def register(payload: RegisterReq, db: Session = Depends(get_db)):
             detail="La contraseña debe tener al menos 6 caracteres",
         )
 
+    password_hash = await _hash_call(hash_password, pwd)
+    return await _db_run(db, _create_user, email, password_hash)
+
+
+def _create_user(db: Session, email: str, password_hash: str) -> UserRes:
     try:
         exists = db.query(User).filter(User.email == email).first()
         if exists:
@@ -76,7 +258,7 @@ def register(payload: RegisterReq, db: Session = Depends(get_db)):
                 detail="El email ya está registrado",
             )
 
-        user = User(email=email, password_hash=hash_password(pwd), token=None)
+        user = User(email=email, password_hash=password_hash, token=None)
         db.add(user)
         db.commit()
         db.refresh(user)
@@ -119,11 +301,14 @@ def register(payload: RegisterReq, db: Session = Depends(get_db)):
 
 
 @app.post("/auth/login", response_model=TokenRes, tags=["auth"])
-def login(payload: LoginReq, db: Session = Depends(get_db)):
+async def login(payload: LoginReq, db: DbSession = Depends(get_session)):
     email = payload.email.strip().lower()
-    user = db.query(User).filter(User.email == email).first()
+    user = await _db_run(db, lambda s: s.query(User).filter(User.email == email).first())
 
-    if not user or not verify_password(payload.password, user.password_hash):
+    ok, new_hash = (False, None)
+    if user:
+        ok, new_hash = await _hash_call(verify_and_update, payload.password, user.password_hash)
+    if not ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Credenciales inválidas",
@@ -131,128 +316,1068 @@ def login(payload: LoginReq, db: Session = Depends(get_db)):
 
     tok = new_token()
     user.token = tok
-    db.commit()
+    if new_hash:
+        # Hash con otro coste de bcrypt: se reemplaza aprovechando que
+        # tenemos la contraseña en claro.
+        user.password_hash = new_hash
+    # Antes del commit: después, leer `user` recargaría la fila (expire_on_commit)
+    # con una consulta bloqueante en el bucle de eventos.
+    session_user = SessionUser(user.id, user.email)
+    await _db_run(db, lambda s: s.commit())
+    # El token anterior deja de ser válido; se retira de la caché.
+    _SESSIONS.invalidate_user(session_user.id)
+    _SESSIONS.put(tok, session_user)
 
     return TokenRes(token=tok)
 
 
 @app.get("/auth/verify", tags=["auth"])
-def verify(Authorization: Optional[str] = Header(None), db: Session = Depends(get_db)):
-    token = _extract_token(Authorization)
-    if not token:
+async def verify(Authorization: Optional[str] = Header(None), db: DbSession = Depends(get_session)):
+    user = await _current_user_async(Authorization, db)
+    return {"ok": True, "email": user.email, "id": user.id}
+
+
+
+
+@app.get("/")
+def health():
+    return {"ok": True, "service": "Veritext API"}
+
+
+@app.get("/ready", tags=["ops"])
+def ready():
+    """Listo para recibir tráfico sólo cuando el modelo está cargado."""
+    if not _STORE.ready:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"ready": False, "error": _STORE.last_error},
+        )
+    return {
+        "ready": True,
+        "model_version": _STORE.version,
+        "model_source": _STORE.source,
+    }
+
+
+ADMIN_TOKEN = os.getenv("VERITEXT_ADMIN_TOKEN", "")
+
+
+def _is_admin(x_admin_token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN and x_admin_token and secrets.compare_digest(x_admin_token, ADMIN_TOKEN))
+
+
+def _require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    if not _is_admin(x_admin_token):
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Falta token",
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acceso restringido",
         )
 
-    user = db.query(User).filter(User.token == token).first()
-    if not user:
+
+@app.post("/admin/model/reload", tags=["ops"], dependencies=[Depends(_require_admin)])
+def reload_model(force: bool = False):
+    """Carga el modelo del disco y lo activa sin cortar el servicio."""
+    previous = _STORE.version
+    try:
+        changed = _STORE.reload(force=force)
+    except Exception as e:
+        print("[admin] Error al recargar modelo:", repr(e))
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token inválido",
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="No se pudo cargar el modelo nuevo; se mantiene el anterior.",
         )
+    return {
+        "reloaded": changed,
+        "previous_version": previous,
+        "model_version": _STORE.version,
+    }
 
-    return {"ok": True, "email": user.email, "id": user.id}
 
+_PROFILER = Profiler()
 
 
+def _forzar_perfil(x_profile: Optional[str], x_admin_token: Optional[str]) -> bool:
+    """`X-Profile: 1` sólo cuenta si viene con un token de administrador válido."""
+    return x_profile == "1" and _is_admin(x_admin_token)
 
-@app.get("/")
-def health():
-    return {"ok": True, "service": "Veritext API"}
+
+@app.get("/admin/profiles", tags=["ops"], dependencies=[Depends(_require_admin)])
+def list_profiles():
+    """Perfiles guardados, del más reciente al más antiguo."""
+    return {"profiles": _PROFILER.listar(), **_PROFILER.stats()}
+
+
+@app.get("/admin/profiles/{name}", tags=["ops"], dependencies=[Depends(_require_admin)])
+def get_profile(name: str, format: str = Query("prof", pattern="^(prof|text)$")):
+    """Descarga el perfil (`.prof` de pstats) o, con `format=text`, un resumen legible."""
+    path = _PROFILER.ruta(name)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Perfil no encontrado",
+        )
+    if format == "text":
+        return PlainTextResponse(_PROFILER.resumen(name))
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
+
+
+@app.get("/stats", tags=["ops"])
+def stats():
+    return {
+        "microbatch": _BATCHER.stats() if _BATCHER is not None else None,
+        "cache": _CACHE.stats(),
+        "sessions": _SESSIONS.stats(),
+        "auth_hashing": _HASHER.stats(),
+        "write_behind": _WRITER.stats() if _WRITER is not None else None,
+        "extraction": _EXTRACTOR.stats(),
+        "admission": _ADMISSION.stats() if _ADMISSION.enabled else None,
+        "rate_limit": _RATE_LIMIT.stats() if _RATE_LIMIT.enabled else None,
+        "profiling": _PROFILER.stats(),
+        "near_duplicates": _NEARDUP.stats() if NEARDUP_ENABLED else None,
+        "pool": _POOL.stats() if _POOL is not None else None,
+        "model": {
+            "version": _STORE.version,
+            "source": _STORE.source,
+            "load_seconds": _STORE.load_seconds,
+            "reloads": _STORE.reloads,
+        },
+    }
+
+
+def _component_stats() -> dict:
+    """Valores numéricos de /stats como gauges {(componente, nombre): valor}."""
+    components = {
+        "cache": _CACHE.stats,
+        "sessions": _SESSIONS.stats,
+        "auth_hashing": _HASHER.stats,
+        "extraction": _EXTRACTOR.stats,
+        "admission": _ADMISSION.stats if _ADMISSION.enabled else None,
+        "rate_limit": _RATE_LIMIT.stats if _RATE_LIMIT.enabled else None,
+        "microbatch": _BATCHER.stats if _BATCHER is not None else None,
+        "write_behind": _WRITER.stats if _WRITER is not None else None,
+        "near_duplicates": _NEARDUP.stats if NEARDUP_ENABLED else None,
+        "pool": _POOL.stats if _POOL is not None else None,
+    }
+    out = {}
+    for component, fn in components.items():
+        if fn is None:
+            continue
+        for name, value in fn().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                out[(component, name)] = value
+    return out
+
+
+def _pool_gauges() -> Optional[dict]:
+    st = pool_stats(engine)
+    return {(k,): v for k, v in st.items()} if st is not None else None
+
+
+REGISTRY.register(Gauges(
+    "veritext_model_load_seconds", "Duración de la última carga del modelo",
+    lambda: _STORE.load_seconds,
+))
+REGISTRY.register(Gauges(
+    "veritext_model_reloads_total", "Recargas del modelo en caliente",
+    lambda: _STORE.reloads, kind="counter",
+))
+REGISTRY.register(Gauges(
+    "veritext_model_ready", "1 si hay un modelo cargado",
+    lambda: _STORE.ready,
+))
+REGISTRY.register(Gauges(
+    "veritext_model_load_failed", "1 si el último intento de carga falló",
+    lambda: _STORE.last_error is not None,
+))
+REGISTRY.register(Gauges(
+    "veritext_db_pool_connections", "Conexiones del pool de SQLAlchemy por estado",
+    _pool_gauges, labels=("state",),
+))
+if async_engine is not None:
+    REGISTRY.register(Gauges(
+        "veritext_db_async_pool_connections", "Conexiones del pool del motor async por estado",
+        lambda: {(k,): v for k, v in (pool_stats(async_engine.sync_engine) or {}).items()} or None,
+        labels=("state",),
+    ))
+REGISTRY.register(Gauges(
+    "veritext_component", "Contadores y tamaños de los componentes (como en /stats)",
+    _component_stats, labels=("component", "stat"),
+))
+
+
+@app.get("/metrics", tags=["ops"], include_in_schema=False)
+def metrics():
+    """Métricas en formato Prometheus (sólo con VERITEXT_METRICS=1)."""
+    if not METRICS_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Métricas desactivadas",
+        )
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
 
 
 
-MODEL = None 
+_STORE = ModelStore()
+
 
 def _lazy_load_model():
-    """Carga el modelo TF-IDF + Regresión Logística desde model.joblib."""
-    global MODEL
-    if MODEL is None:
-        from joblib import load
-        try:
-            MODEL = load("model.joblib")
-            print("[analyze] Modelo cargado:", type(MODEL))
-        except FileNotFoundError:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="No se encontró model.joblib. Entrena el modelo primero.",
-            )
-        except Exception as e:
-            print("[analyze] Error al cargar modelo:", repr(e))
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="No se pudo cargar el modelo entrenado.",
-            )
-    return MODEL
+    """Devuelve el modelo activo; lo carga si todavía no se hizo."""
+    try:
+        return _STORE.get()
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="No se encontró model.joblib. Entrena el modelo primero.",
+        )
+    except Exception as e:
+        print("[analyze] Error al cargar modelo:", repr(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="No se pudo cargar el modelo entrenado.",
+        )
+
+
+CACHE_ENABLED = os.getenv("VERITEXT_CACHE", "1") == "1"
+_CACHE = ResultCache()
+_STORE.on_swap(lambda model, version, source: _CACHE.set_version(version))
+
+
+def _json_list(raw: Optional[str]) -> list[str]:
+    try:
+        return json.loads(raw) if raw else []
+    except Exception:
+        return []
+
+
+def _cache_lookup(
+    db: Session, key: str, model_version: Optional[str]
+) -> Optional[Scored]:
+    """Busca un resultado previo: primero en memoria y luego en `analyses`."""
+    hit = _CACHE.get(key)
+    if hit is not None:
+        return hit
+
+    row = (
+        db.query(Analysis.score, Analysis.top_words, Analysis.top_words_human)
+        .filter(Analysis.text_hash == key, Analysis.model_version == model_version)
+        .order_by(Analysis.id.desc())
+        .first()
+    )
+    if row is None:
+        _CACHE.record_miss()
+        return None
+
+    scored = (row.score, _json_list(row.top_words), _json_list(row.top_words_human))
+    _CACHE.record_db_hit()
+    _CACHE.put(key, scored, model_version)
+    return scored
+
+
+_NEARDUP = NearDupIndex()
+
+
+def _near_duplicate(
+    db: Session, sig, model_version: Optional[str], user: Optional[SessionUser]
+) -> tuple[Optional[NearDuplicate], Optional[Scored]]:
+    """Busca un texto casi igual ya analizado; devuelve el aviso y, en modo
+    "reuse", el resultado si es un análisis propio del modelo actual."""
+    match = _NEARDUP.query(sig)
+    if match is None:
+        return None, None
+    tid, similarity = match
+
+    q = (
+        db.query(
+            Analysis.id,
+            Analysis.user_id,
+            Analysis.model_version,
+            Analysis.text_hash,
+            Analysis.score,
+            Analysis.top_words,
+            Analysis.top_words_human,
+        )
+        .filter(Analysis.text_id == tid)
+    )
+    if user is not None:
+        # Primero los análisis del propio usuario.
+        q = q.order_by(case((Analysis.user_id == user.id, 0), else_=1))
+    rows = q.order_by(Analysis.id.desc()).limit(20).all()
+    if not rows:
+        return None, None  # aún en la cola de escritura
+
+    # Sólo se reutiliza un análisis propio: el de otro usuario devolvería sus
+    # top_words, palabras de un texto ajeno. Sin text_hash no es una
+    # puntuación del texto entero (p. ej. /analyze/stream).
+    own_rows = [r for r in rows if user is not None and r.user_id == user.id]
+    reusable = next(
+        (r for r in own_rows if r.model_version == model_version and r.text_hash is not None), None
+    )
+    row = reusable or (own_rows[0] if own_rows else None)
+    near = NearDuplicate(similarity=similarity, own=row is not None, analysis_id=row.id if row else None)
+    if NEARDUP_MODE == "reuse" and reusable is not None:
+        near.reused = True
+        return near, (row.score, _json_list(row.top_words), _json_list(row.top_words_human))
+    return near, None
+
+
+MICROBATCH_ENABLED = os.getenv("VERITEXT_MICROBATCH", "1") == "1"
+_BATCHER: Optional[MicroBatcher] = None
+_BATCHER_LOCK = threading.Lock()
+
+
+_POOL: Optional[InferencePool] = None
+
+
+def _start_pool() -> None:
+    """Arranca el pool de inferencia; cada worker carga el modelo activo de su origen."""
+    global _POOL
+    try:
+        model, _, source = _STORE.snapshot()
+    except Exception as e:
+        print("[pool] Pool no iniciado:", repr(e))
+        return
+    _POOL = InferencePool(model, source)
+    _POOL.start()
+    _STORE.on_swap(lambda model, version, source: _POOL.reload(model, source))
+
+
+def _score_texts(texts: list[Documento]) -> list[Scored]:
+    """Probabilidad de IA y términos influyentes de cada texto."""
+    if _POOL is not None:
+        return _POOL.score(texts)
+    return score_batch(_lazy_load_model(), texts)
+
+
+def _dispatch_scores(texts: list[Documento]):
+    """Como `_score_texts`, pero con el pool devuelve un Future sin esperar."""
+    if _POOL is not None:
+        return _POOL.submit(texts)
+    return _score_texts(texts)
+
+
+def _inference_error(e: Exception) -> HTTPException:
+    if isinstance(e, PoolSaturated):
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor saturado, inténtalo de nuevo en unos segundos",
+        )
+    if isinstance(e, TimeoutError):
+        return HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="El modelo tardó demasiado en responder",
+        )
+    return HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail="Error al ejecutar el modelo",
+    )
+
+
+def _get_batcher() -> MicroBatcher:
+    """Scheduler compartido que agrupa las llamadas concurrentes a /analyze/text."""
+    global _BATCHER
+    if _BATCHER is None:
+        with _BATCHER_LOCK:
+            if _BATCHER is None:
+                _BATCHER = MicroBatcher(_dispatch_scores)
+    return _BATCHER
+
+
+def _write_analyses(rows: list[dict]) -> None:
+    with engine.begin() as conn:
+        guardar_analisis(conn, rows)
+
+
+_WRITER: Optional[WriteBehind] = WriteBehind(_write_analyses) if WRITE_BEHIND_ENABLED else None
+
+
+def _persist_analyses(db: Optional[Session], rows: list[dict]) -> None:
+    """Guarda los análisis: en diferido si está activo y hay sitio en la cola.
+
+    En ambos casos son INSERT de Core (executemany para varias filas), sin
+    recuperar los ids fila a fila como haría el flush del ORM; la respuesta
+    no los necesita. El texto se comprime en `guardar_analisis`, así que en
+    modo diferido ese trabajo también sale del camino de la petición.
+    """
+    if _WRITER is not None and _WRITER.submit(rows):
+        return
+    if db is None:
+        _write_analyses(rows)
+        return
+    guardar_analisis(db, rows)
+    db.commit()
+
+
+def _insert_analyses(db: Session, blobs: list[dict], rows: list[dict]) -> None:
+    insertar_analisis(db, blobs, rows)
+    db.commit()
+
+
+async def _persist_analyses_async(db: DbSession, rows: list[dict]) -> None:
+    """`_persist_analyses` desde un endpoint async.
+
+    La compresión del texto (y la firma, si falta) va al threadpool; a la
+    sesión, que en modo async corre en el bucle de eventos, sólo llegan
+    los INSERT.
+    """
+    if _WRITER is not None and _WRITER.submit(rows):
+        return
+    blobs, rows = await run_in_threadpool(comprimir_analisis, rows)
+    await _db_run(db, _insert_analyses, blobs, rows)
 
 
-def _texto_suficiente(txt: str, min_words: int = 30) -> bool:
+def _texto_suficiente(doc: Documento, min_words: int = 30) -> bool:
+    # Las palabras ya vienen tokenizadas del preprocesado (secuencias de \w).
+    return doc.word_count >= min_words
 
-    cleaned = re.sub(r"[^\wÁÉÍÓÚáéíóúÑñ\s]", " ", txt, flags=re.UNICODE)
-    words = [w for w in cleaned.split() if w]
-    return len(words) >= min_words
+
+def _validar_texto(doc: Documento) -> Optional[str]:
+    """Devuelve el mensaje de error si el texto no se puede analizar, o None."""
+    if not doc.raw:
+        return "El texto no puede estar vacío"
+
+    if len(doc.raw) > 2000 and not _texto_suficiente(doc, min_words=30):
+        return (
+            "El archivo parece contener solo imágenes o muy poco texto legible. "
+            "No es posible analizarlo."
+        )
+    return None
+
+
+# Admisión: análisis concurrentes y en cola acotados (503 si no caben) y
+# token bucket por usuario (429). Ver admission.py.
+_ADMISSION = AdmissionController()
+_RATE_LIMIT = UserRateLimiter()
+
+
+def _rejected_error(e: Rejected) -> HTTPException:
+    headers = {"Retry-After": str(e.retry_after)}
+    if e.reason == "rate_limit":
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados análisis seguidos, espera unos segundos",
+            headers=headers,
+        )
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Servidor saturado, inténtalo de nuevo en unos segundos",
+        headers=headers,
+    )
+
+
+async def _limitar_usuario(
+    request: Request, Authorization: Optional[str], db: DbSession, cost: int = 1
+) -> None:
+    """Consume `cost` tokens del usuario (o de la IP si es anónimo); lanza `Rejected` si no quedan."""
+    if not _RATE_LIMIT.enabled:
+        return
+    _RATE_LIMIT.check(await _clave_limite(request, Authorization, db), cost)
+
+
+async def _clave_limite(request: Request, Authorization: Optional[str], db: DbSession) -> tuple:
+    user = await _session_user_async(db, _extract_token(Authorization))
+    if user is not None:
+        return ("user", user.id)
+    return ("ip", request.client.host if request.client else "")
 
 
 @app.post("/analyze/text", response_model=AnalyzeRes, tags=["analyze"])
-def analyze_text(
+async def analyze_text(
     body: AnalyzeReq,
+    request: Request,
     Authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db),
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None),
+    db: DbSession = Depends(get_session),
 ) -> AnalyzeRes:
-    txt = (body.text or "").strip()
-    if not txt:
+    try:
+        await _limitar_usuario(request, Authorization, db)
+        async with _ADMISSION.slot():
+            if isinstance(db, AsyncSession):
+                return await _analyze_async(body.text, Authorization, db)
+            forced = x_profile is not None and _forzar_perfil(x_profile, x_admin_token)
+            return await run_in_threadpool(_analyze_profiled, body.text, Authorization, db, forced)
+    except Rejected as e:
+        raise _rejected_error(e)
+
+
+def _analyze_profiled(raw: Optional[str], Authorization: Optional[str], db: Session, forced: bool) -> AnalyzeRes:
+    with _PROFILER.perfilar("analyze_text", len(raw or ""), forced=forced):
+        return _analyze(raw, Authorization, db)
+
+
+def _analyze(raw: Optional[str], Authorization: Optional[str], db: Session) -> AnalyzeRes:
+    """Camino normal de análisis de un texto: validación, caché, modelo y guardado."""
+    txt = (raw or "").strip()
+    # Se normaliza y tokeniza una sola vez; validación, caché, modelo y
+    # explicación reutilizan el mismo Documento.
+    with etapa("validation"):
+        doc = preparar(txt)
+        error = _validar_texto(doc)
+    if error:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="El texto no puede estar vacío",
+            detail=error,
         )
 
 
-    if len(txt) > 2000 and not _texto_suficiente(txt, min_words=30):
+    with etapa("auth"):
+        user = _session_user(db, _extract_token(Authorization))
+
+    _lazy_load_model()
+    model_version = _STORE.version
+    with etapa("cache"):
+        key = text_hash(doc)
+        hit = _cache_lookup(db, key, model_version) if CACHE_ENABLED else None
+
+    near: Optional[NearDuplicate] = None
+    sig = None
+    if hit is None and NEARDUP_ENABLED:
+        with etapa("near_duplicate"):
+            sig = firma(doc)
+            if sig is not None:
+                near, hit = _near_duplicate(db, sig, model_version, user)
+                if hit is not None:
+                    _CACHE.put(key, hit, model_version)
+
+    if hit is not None:
+        prob, top_words, top_words_human = hit
+    else:
+        try:
+            with etapa("inference"):
+                if MICROBATCH_ENABLED:
+                    scored = _get_batcher().score(doc, timeout=INFERENCE_TIMEOUT_S)
+                else:
+                    scored = _score_texts([doc])[0]
+        except Exception as e:
+            print("[analyze] Error al predecir:", repr(e))
+            raise _inference_error(e)
+
+        prob, top_words, top_words_human = scored
+        _CACHE.put(key, scored, model_version)
+
+    with etapa("persistence"):
+        _persist_analyses(db, [{
+            "user_id": user.id if user else None,
+            "text": txt,
+            "text_hash": key,
+            "model_version": model_version,
+            "score": prob,
+            "top_words": json.dumps(top_words),
+            "top_words_human": json.dumps(top_words_human),
+            "created_at": datetime.now(timezone.utc),
+            "minhash": sig.tobytes() if sig is not None else None,
+        }])
+        if sig is not None:
+            _NEARDUP.add(text_id(txt), sig)
+
+    return AnalyzeRes(
+        score=prob,
+        buckets={"human": 1 - prob, "ai": prob},
+        top_words=top_words,
+        top_words_human=top_words_human,
+        near_duplicate=near,
+    )
+
+
+def _preparar_y_validar(txt: str) -> tuple[Documento, Optional[str]]:
+    doc = preparar(txt)
+    return doc, _validar_texto(doc)
+
+
+async def _analyze_async(raw: Optional[str], Authorization: Optional[str], db: AsyncSession) -> AnalyzeRes:
+    """`_analyze` para el modo async (VERITEXT_DB_ASYNC=1).
+
+    Los mismos pasos, pero las consultas se esperan sin ocupar un hilo y el
+    trabajo de CPU sale del bucle de eventos: el preprocesado, la firma
+    MinHash y la compresión del texto van al threadpool, y la inferencia al
+    micro-batcher, cuyo Future se espera directamente.
+    """
+    txt = (raw or "").strip()
+    with etapa("validation"):
+        doc, error = await run_in_threadpool(_preparar_y_validar, txt)
+    if error:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=(
-                "El archivo parece contener solo imágenes o muy poco texto legible. "
-                "No es posible analizarlo."
-            ),
+            detail=error,
         )
 
+    with etapa("auth"):
+        user = await _session_user_async(db, _extract_token(Authorization))
 
-    token = _extract_token(Authorization)
-    user: Optional[User] = None
-    if token:
-        user = db.query(User).filter(User.token == token).first()
+    if not _STORE.ready:
+        await run_in_threadpool(_lazy_load_model)
+    model_version = _STORE.version
+    hit = None
+    with etapa("cache"):
+        key = text_hash(doc)
+        if CACHE_ENABLED:
+            hit = _CACHE.get(key)
+            if hit is None:
+                hit = await _db_run(db, _cache_lookup, key, model_version)
 
-    model = _lazy_load_model()
-    try:
-        proba = model.predict_proba([txt])[0][1]
-        prob = float(proba)
-    except Exception as e:
-        print("[analyze] Error al predecir:", repr(e))
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error al ejecutar el modelo",
-        )
+    near: Optional[NearDuplicate] = None
+    sig = None
+    if hit is None and NEARDUP_ENABLED:
+        with etapa("near_duplicate"):
+            sig = await run_in_threadpool(firma, doc)
+            if sig is not None:
+                near, hit = await _db_run(db, _near_duplicate, sig, model_version, user)
+                if hit is not None:
+                    _CACHE.put(key, hit, model_version)
+
+    if hit is not None:
+        prob, top_words, top_words_human = hit
+    else:
+        try:
+            with etapa("inference"):
+                if MICROBATCH_ENABLED:
+                    scored = await asyncio.wait_for(
+                        asyncio.wrap_future(_get_batcher().submit(doc)), INFERENCE_TIMEOUT_S
+                    )
+                else:
+                    scored = (await run_in_threadpool(_score_texts, [doc]))[0]
+        except Exception as e:
+            print("[analyze] Error al predecir:", repr(e))
+            raise _inference_error(e)
 
-    top_words = sorted(set(w.lower() for w in txt.split()))[:5]
+        prob, top_words, top_words_human = scored
+        _CACHE.put(key, scored, model_version)
 
-    analysis = Analysis(
-        user_id=user.id if user else None,
-        text=txt,
-        score=prob,
-        top_words=json.dumps(top_words),
-        created_at=datetime.now(timezone.utc),
-    )
-    db.add(analysis)
-    db.commit()
-    db.refresh(analysis)
+    with etapa("persistence"):
+        await _persist_analyses_async(db, [{
+            "user_id": user.id if user else None,
+            "text": txt,
+            "text_hash": key,
+            "model_version": model_version,
+            "score": prob,
+            "top_words": json.dumps(top_words),
+            "top_words_human": json.dumps(top_words_human),
+            "created_at": datetime.now(timezone.utc),
+            "minhash": sig.tobytes() if sig is not None else None,
+        }])
+        if sig is not None:
+            _NEARDUP.add(text_id(txt), sig)
 
     return AnalyzeRes(
         score=prob,
         buckets={"human": 1 - prob, "ai": prob},
         top_words=top_words,
+        top_words_human=top_words_human,
+        near_duplicate=near,
     )
 
+
+# =========================
+#   FICHEROS
+# =========================
+
+UPLOAD_MAX_BYTES = int(os.getenv("VERITEXT_UPLOAD_MAX_MB", "25")) * 1024 * 1024
+_UPLOAD_CHUNK = 1024 * 1024
+
+_EXTRACTOR = ExtractionPool()
+
+
+def _spool_upload(upload: UploadFile) -> tuple[str, bytes]:
+    """Copia la subida a un fichero temporal por bloques; devuelve (ruta, cabecera).
+
+    El fichero nunca está entero en memoria: el parser multipart ya lo
+    vuelca a disco a partir de 1 MB y aquí se copia de a 1 MB.
+    """
+    fd, path = tempfile.mkstemp(prefix="veritext-upload-")
+    size = 0
+    head = b""
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = upload.file.read(_UPLOAD_CHUNK)
+                if not chunk:
+                    break
+                if not head:
+                    head = chunk[:8]
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"El archivo supera el máximo de {UPLOAD_MAX_BYTES // (1024 * 1024)} MB",
+                    )
+                out.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, head
+
+
+@app.post("/analyze/file", response_model=AnalyzeRes, tags=["analyze"])
+async def analyze_file(
+    request: Request,
+    file: UploadFile = File(...),
+    Authorization: Optional[str] = Header(None),
+    db: DbSession = Depends(get_session),
+) -> AnalyzeRes:
+    """Analiza un PDF o un .txt subido como multipart.
+
+    El texto del PDF se extrae en el servidor, en el pool de extracción, y
+    el resultado sigue el mismo camino que `/analyze/text`, con la misma
+    admisión.
+    """
+    try:
+        await _limitar_usuario(request, Authorization, db)
+    except Rejected as e:
+        raise _rejected_error(e)
+
+    path, head = await run_in_threadpool(_spool_upload, file)
+    try:
+        if head.startswith(b"%PDF-"):
+            try:
+                extracted = await _EXTRACTOR.run(extraer_pdf, path)
+            except ExtractionError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            except ExtractionSaturated:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Servidor ocupado, inténtalo de nuevo en unos segundos",
+                    headers={"Retry-After": "1"},
+                )
+            except TimeoutError:
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                    detail="El PDF tardó demasiado en procesarse",
+                )
+            except BrokenProcessPool:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="No se pudo procesar el PDF, inténtalo de nuevo",
+                    headers={"Retry-After": "1"},
+                )
+            txt = extracted["text"]
+        elif (file.content_type or "").startswith("text/") or (file.filename or "").lower().endswith(".txt"):
+            with open(path, "rb") as f:
+                txt = f.read().decode("utf-8", errors="replace")
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Formato no soportado: sube un PDF o un archivo de texto",
+            )
+    finally:
+        os.unlink(path)
+
+    try:
+        async with _ADMISSION.slot():
+            if isinstance(db, AsyncSession):
+                return await _analyze_async(txt, Authorization, db)
+            return await run_in_threadpool(_analyze, txt, Authorization, db)
+    except Rejected as e:
+        raise _rejected_error(e)
+
+
+BATCH_MAX_ITEMS = int(os.getenv("VERITEXT_BATCH_MAX_ITEMS", "1000"))
+
+
+@app.post(
+    "/analyze/batch",
+    response_model=list[AnalyzeBatchItem],
+    tags=["analyze"],
+)
+async def analyze_batch(
+    body: list[AnalyzeReq],
+    request: Request,
+    Authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+) -> list[AnalyzeBatchItem]:
+    """Analiza varios textos con una sola llamada al modelo.
+
+    Los textos inválidos no hacen fallar el lote: cada posición de la
+    respuesta trae su propio resultado o su propio error. Pasa por la misma
+    admisión que `/analyze/text` y gasta un token del usuario por texto.
+    """
+    if len(body) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Máximo {BATCH_MAX_ITEMS} textos por lote",
+        )
+
+    try:
+        await _limitar_usuario(request, Authorization, db, cost=len(body))
+        async with _ADMISSION.slot():
+            return await run_in_threadpool(_analyze_batch, body, Authorization, db)
+    except Rejected as e:
+        raise _rejected_error(e)
+
+
+def _analyze_batch(
+    body: list[AnalyzeReq], Authorization: Optional[str], db: Session
+) -> list[AnalyzeBatchItem]:
+    results: list[AnalyzeBatchItem] = []
+    valid_idx: list[int] = []
+    valid_docs: list[Documento] = []
+    for i, item in enumerate(body):
+        doc = preparar((item.text or "").strip())
+        error = _validar_texto(doc)
+        if error:
+            results.append(AnalyzeBatchItem(index=i, ok=False, error=error))
+        else:
+            results.append(AnalyzeBatchItem(index=i, ok=True))
+            valid_idx.append(i)
+            valid_docs.append(doc)
+
+    if not valid_docs:
+        return results
+
+    user = _session_user(db, _extract_token(Authorization))
+
+    _lazy_load_model()
+    model_version = _STORE.version
+    keys = [text_hash(doc) for doc in valid_docs]
+    scored: dict[int, Scored] = {}
+    if CACHE_ENABLED:
+        for j, key in enumerate(keys):
+            hit = _CACHE.get(key)
+            if hit is not None:
+                scored[j] = hit
+
+        pending = {keys[j] for j in range(len(keys)) if j not in scored}
+        if pending:
+            # Nivel persistente: una sola consulta para todo el lote y una
+            # fila por hash (la más reciente, como `_cache_lookup`), aunque
+            # un texto popular se haya analizado cientos de veces. El máximo
+            # sale del índice (text_hash, model_version), que incluye el id.
+            latest = (
+                db.query(func.max(Analysis.id))
+                .filter(
+                    Analysis.text_hash.in_(pending),
+                    Analysis.model_version == model_version,
+                )
+                .group_by(Analysis.text_hash)
+            )
+            found: dict[str, Scored] = {}
+            db_rows = (
+                db.query(
+                    Analysis.text_hash,
+                    Analysis.score,
+                    Analysis.top_words,
+                    Analysis.top_words_human,
+                )
+                .filter(Analysis.id.in_(latest.scalar_subquery()))
+                .all()
+            )
+            for r in db_rows:
+                found[r.text_hash] = (
+                    r.score,
+                    _json_list(r.top_words),
+                    _json_list(r.top_words_human),
+                )
+            for j, key in enumerate(keys):
+                if j not in scored and key in found:
+                    scored[j] = found[key]
+                    _CACHE.record_db_hit()
+                    _CACHE.put(key, found[key], model_version)
+
+    misses = [j for j in range(len(valid_docs)) if j not in scored]
+    if CACHE_ENABLED:
+        _CACHE.record_miss(len(misses))
+
+    if misses:
+        try:
+            # Una sola transformación TF-IDF y un solo predict_proba sobre
+            # la matriz dispersa completa del lote.
+            fresh = _score_texts([valid_docs[j] for j in misses])
+        except Exception as e:
+            print("[analyze] Error al predecir lote:", repr(e))
+            raise _inference_error(e)
+        for j, res in zip(misses, fresh):
+            scored[j] = res
+            _CACHE.put(keys[j], res, model_version)
+
+    now = datetime.now(timezone.utc)
+    rows = []
+    for j, (i, doc) in enumerate(zip(valid_idx, valid_docs)):
+        prob, top_words, top_words_human = scored[j]
+        results[i] = AnalyzeBatchItem(
+            index=i,
+            ok=True,
+            score=prob,
+            buckets={"human": 1 - prob, "ai": prob},
+            top_words=top_words,
+            top_words_human=top_words_human,
+        )
+        rows.append({
+            "user_id": user.id if user else None,
+            "text": doc.raw,
+            "text_hash": keys[j],
+            "model_version": model_version,
+            "score": prob,
+            "top_words": json.dumps(top_words),
+            "top_words_human": json.dumps(top_words_human),
+            "created_at": now,
+        })
+
+    _persist_analyses(db, rows)
+
+    return results
+
+
+# =========================
+#   DOCUMENTOS LARGOS
+# =========================
+
+WINDOW_WORDS = int(os.getenv("VERITEXT_WINDOW_WORDS", "200"))
+WINDOW_STRIDE = int(os.getenv("VERITEXT_WINDOW_STRIDE", "150"))
+# Ventanas que se puntúan juntas; el primer resultado sale tras el primer lote.
+WINDOW_BATCH = int(os.getenv("VERITEXT_WINDOW_BATCH", "8"))
+
+
+def _stream_line(event: str, payload: dict, sse: bool) -> bytes:
+    data = json.dumps({"type": event, **payload}, ensure_ascii=False)
+    if sse:
+        return f"event: {event}\ndata: {data}\n\n".encode("utf-8")
+    return (data + "\n").encode("utf-8")
+
+
+def _stream_windows(txt: str, user_id: Optional[int], model_version: Optional[str], sse: bool) -> Iterator[bytes]:
+    """Puntúa las ventanas por lotes y emite una línea por ventana y un resumen.
+
+    En memoria sólo hay un lote de ventanas a la vez. La puntuación del
+    documento es la media de las ventanas ponderada por su número de
+    palabras; se guarda en el historial al terminar, pero sin `text_hash`:
+    no es lo que daría el modelo con el texto entero y no debe servirse
+    desde la caché de resultados.
+    """
+    n_windows = 0
+    weighted = 0.0
+    total_words = 0
+    max_score = 0.0
+    ai_windows = 0
+    ai_words: Counter = Counter()
+    human_words: Counter = Counter()
+
+    spans = ventanas(txt, WINDOW_WORDS, WINDOW_STRIDE)
+    while True:
+        batch = [(a, b) for _, (a, b) in zip(range(WINDOW_BATCH), spans)]
+        if not batch:
+            break
+        docs = [preparar(txt[a:b]) for a, b in batch]
+        try:
+            scored = _score_texts(docs)
+        except Exception as e:
+            print("[analyze] Error al predecir ventanas:", repr(e))
+            err = _inference_error(e)
+            yield _stream_line("error", {"status": err.status_code, "detail": err.detail}, sse)
+            return
+
+        for (a, b), doc, (prob, top_words, top_words_human) in zip(batch, docs, scored):
+            words = doc.word_count
+            n_windows += 1
+            total_words += words
+            weighted += prob * words
+            max_score = max(max_score, prob)
+            ai_windows += prob >= 0.5
+            ai_words.update(top_words)
+            human_words.update(top_words_human)
+            yield _stream_line("window", {
+                "index": n_windows - 1,
+                "start": a,
+                "end": b,
+                "words": words,
+                "score": prob,
+                "top_words": top_words,
+                "top_words_human": top_words_human,
+            }, sse)
+
+    score = weighted / total_words if total_words else 0.0
+    top_words = [w for w, _ in ai_words.most_common(TOP_K)]
+    top_words_human = [w for w, _ in human_words.most_common(TOP_K)]
+    _persist_analyses(None, [{
+        "user_id": user_id,
+        "text": txt,
+        "text_hash": None,
+        "model_version": model_version,
+        "score": score,
+        "top_words": json.dumps(top_words),
+        "top_words_human": json.dumps(top_words_human),
+        "created_at": datetime.now(timezone.utc),
+    }])
+    yield _stream_line("summary", {
+        "score": score,
+        "buckets": {"human": 1 - score, "ai": score},
+        "windows": n_windows,
+        "ai_windows": ai_windows,
+        "max_window_score": max_score,
+        "top_words": top_words,
+        "top_words_human": top_words_human,
+    }, sse)
+
+
+@app.post("/analyze/stream", tags=["analyze"])
+async def analyze_stream(
+    body: AnalyzeReq,
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+    Authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """Análisis de documentos largos por ventanas solapadas.
+
+    Devuelve NDJSON (o server-sent events con `format=sse`): una línea
+    `window` por ventana, con su posición en el texto para pintar un mapa
+    de calor, a medida que se puntúan, y una línea final `summary` con la
+    puntuación agregada del documento. Gasta un token del usuario por
+    ventana y ocupa un hueco de admisión hasta emitir el resumen.
+    """
+    # El límite y la admisión van antes de tokenizar el documento: un
+    # texto enorme no gasta CPU si se va a rechazar. Se comprueba un token
+    # y el resto de ventanas se cobra al conocer cuántas son.
+    slot = AsyncExitStack()
+    try:
+        await _limitar_usuario(request, Authorization, db)
+        await slot.enter_async_context(_ADMISSION.slot())
+    except Rejected as e:
+        raise _rejected_error(e)
+
+    try:
+        txt, n_windows, user = await run_in_threadpool(_preparar_stream, body.text, Authorization, db)
+        if _RATE_LIMIT.enabled:
+            _RATE_LIMIT.charge(await _clave_limite(request, Authorization, db), n_windows - 1)
+    except BaseException:
+        await slot.aclose()
+        raise
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        _emitir_con_hueco(
+            slot, _stream_windows(txt, user.id if user else None, _STORE.version, format == "sse")
+        ),
+        media_type=media_type,
+        # Sin buffering en proxies, para que cada ventana llegue al cliente.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _preparar_stream(
+    raw: Optional[str], Authorization: Optional[str], db: Session
+) -> tuple[str, int, Optional[SessionUser]]:
+    """Valida el texto, carga usuario y modelo y cuenta las ventanas."""
+    txt = (raw or "").strip()
+    error = _validar_texto(preparar(txt))
+    if error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=error,
+        )
+
+    user = _session_user(db, _extract_token(Authorization))
+    _lazy_load_model()
+    n_windows = sum(1 for _ in ventanas(txt, WINDOW_WORDS, WINDOW_STRIDE))
+    return txt, n_windows, user
+
+
+async def _emitir_con_hueco(slot: AsyncExitStack, lines: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """Emite las líneas del generador desde el threadpool y libera el hueco
+    de admisión al terminar, también si el cliente se desconecta."""
+    async with slot:
+        async for line in iterate_in_threadpool(lines):
+            yield line
+
+
 from typing import Optional
 import json
 from fastapi import Header, HTTPException, Depends
@@ -270,47 +1395,136 @@ def _extract_token(auth: Optional[str]) -> str:
         return parts[1]
     return auth
 
-@app.get("/history", tags=["analyze"], response_model=list[HistoryItem])
-def get_history(
-    Authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db),
-):
-    token = _extract_token(Authorization)
-    if not token:
+HISTORY_PAGE_DEFAULT = 50
+HISTORY_PAGE_MAX = 200
+
+
+def _encode_cursor(created_at: datetime, analysis_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{analysis_id}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        ts, analysis_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii").split("|")
+        return datetime.fromisoformat(ts), int(analysis_id)
+    except Exception:
         raise HTTPException(
-            status_code=401,
-            detail="Falta token",
+            status_code=400,
+            detail="Cursor inválido",
         )
 
-    user = db.query(User).filter(User.token == token).first()
-    if not user:
-        raise HTTPException(
-            status_code=401,
-            detail="Token inválido",
+
+def _naive_utc(dt: datetime) -> datetime:
+    # created_at se guarda como DATETIME sin zona, en UTC.
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _history_json(rows) -> Iterator[bytes]:
+    """Serializa la página sin pasar por objetos pydantic.
+
+    `top_words` ya está guardado como lista JSON, así que se inserta tal
+    cual en lugar de decodificarlo y volver a codificarlo.
+    """
+    yield b"["
+    for n, r in enumerate(rows):
+        tw = r.top_words if r.top_words and r.top_words.startswith("[") and r.top_words.endswith("]") else "[]"
+        item = (
+            f'{{"id":{r.id},"score":{json.dumps(r.score)},"top_words":{tw},'
+            f'"created_at":"{r.created_at.isoformat()}"}}'
         )
+        yield (b"," if n else b"") + item.encode("utf-8")
+    yield b"]"
 
-    rows = (
-        db.query(Analysis)
+
+@app.get("/history", tags=["analyze"], response_model=list[HistoryItem])
+async def get_history(
+    Authorization: Optional[str] = Header(None),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    limit: int = Query(HISTORY_PAGE_DEFAULT, ge=1, le=HISTORY_PAGE_MAX),
+    since: Optional[datetime] = Query(None, description="Sólo análisis posteriores a esta fecha"),
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None),
+    db: DbSession = Depends(get_session),
+):
+    """Análisis del usuario, del más reciente al más antiguo.
+
+    Paginación por cursor sobre (created_at, id): cada página es una
+    búsqueda en el índice (user_id, created_at), sin OFFSET, así que cuesta
+    lo mismo la primera que la número cien. Si hay más resultados, la
+    cabecera `X-Next-Cursor` trae el cursor de la siguiente página; el
+    cuerpo sigue siendo una lista de `HistoryItem`.
+    """
+    if isinstance(db, AsyncSession):
+        user = await _current_user_async(Authorization, db)
+        return await db.run_sync(_get_history, user, cursor, limit, since)
+    forced = x_profile is not None and _forzar_perfil(x_profile, x_admin_token)
+    return await run_in_threadpool(_get_history_profiled, Authorization, cursor, limit, since, db, forced)
+
+
+def _get_history_profiled(
+    Authorization: Optional[str],
+    cursor: Optional[str],
+    limit: int,
+    since: Optional[datetime],
+    db: Session,
+    forced: bool,
+) -> StreamingResponse:
+    with _PROFILER.perfilar("history", limit, forced=forced):
+        return _get_history(db, _current_user(Authorization, db), cursor, limit, since)
+
+
+def _get_history(
+    db: Session,
+    user: SessionUser,
+    cursor: Optional[str],
+    limit: int,
+    since: Optional[datetime],
+) -> StreamingResponse:
+
+    q = (
+        db.query(Analysis.id, Analysis.score, Analysis.top_words, Analysis.created_at)
         .filter(Analysis.user_id == user.id)
-        .order_by(Analysis.created_at.desc())
-        .limit(200)
+    )
+    if since is not None:
+        q = q.filter(Analysis.created_at > _naive_utc(since))
+    if cursor:
+        ts, last_id = _decode_cursor(cursor)
+        q = q.filter(
+            or_(
+                Analysis.created_at < ts,
+                and_(Analysis.created_at == ts, Analysis.id < last_id),
+            )
+        )
+    rows = (
+        q.order_by(Analysis.created_at.desc(), Analysis.id.desc())
+        .limit(limit + 1)
         .all()
     )
 
-    items: list[HistoryItem] = []
-    for r in rows:
-        try:
-            tw = json.loads(r.top_words) if r.top_words else []
-        except Exception:
-            tw = []
-
-        items.append(
-            HistoryItem(
-                id=r.id,
-                score=r.score,
-                top_words=tw,
-                created_at=r.created_at,
-            )
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return StreamingResponse(_history_json(rows), media_type="application/json", headers=headers)
+
+
+@app.get("/history/{analysis_id}/text", tags=["analyze"], response_model=AnalysisTextRes)
+async def get_analysis_text(
+    analysis_id: int,
+    Authorization: Optional[str] = Header(None),
+    db: DbSession = Depends(get_session),
+):
+    user = await _current_user_async(Authorization, db)
+
+    txt = await _db_run(db, lambda s: cargar_texto(s, analysis_id, user_id=user.id))
+    if txt is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Análisis no encontrado",
         )
 
-    return items
+    return AnalysisTextRes(id=analysis_id, text=txt)
@@ -0,0 +1,162 @@
+# veritext-server/batching.py
+"""Micro-batching de inferencia para peticiones concurrentes.
+
+Las peticiones que llegan dentro de una ventana corta se agrupan y se
+puntúan con una sola llamada al modelo (una única matriz dispersa), en
+lugar de que cada hilo ejecute su propio predict_proba de una fila.
+"""
+from concurrent.futures import Future
+from typing import Any, Callable, Optional, Sequence, Union
+import os
+import queue
+import threading
+import time
+
+
+WINDOW_MS = float(os.getenv("VERITEXT_MICROBATCH_WINDOW_MS", "5"))
+MAX_BATCH = int(os.getenv("VERITEXT_MICROBATCH_MAX", "64"))
+
+# Límites superiores de los cubos del histograma de tamaños de lote.
+_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class MicroBatcher:
+    """Agrupa textos y los puntúa en lote desde un hilo dedicado.
+
+    `score_fn` recibe una lista de textos y devuelve un resultado por
+    texto, en el mismo orden, o un Future que se resolverá con ellos.
+    """
+
+    def __init__(
+        self,
+        score_fn: Callable[[list[str]], Union[Sequence[Any], Future]],
+        window_ms: float = WINDOW_MS,
+        max_batch: int = MAX_BATCH,
+    ):
+        self.score_fn = score_fn
+        self.window_s = max(window_ms, 0.0) / 1000.0
+        self.max_batch = max(max_batch, 1)
+
+        self._queue: "queue.Queue[Optional[tuple[str, Future, float]]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._batches = 0
+        self._items = 0
+        self._size_hist = {b: 0 for b in _SIZE_BUCKETS}
+        self._size_over = 0
+        self._delay_sum = 0.0
+        self._delay_max = 0.0
+
+        self._thread = threading.Thread(
+            target=self._run, name="veritext-microbatch", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, txt: str) -> Future:
+        fut: Future = Future()
+        if self._closed:
+            fut.set_exception(RuntimeError("MicroBatcher cerrado"))
+            return fut
+        self._queue.put((txt, fut, time.perf_counter()))
+        return fut
+
+    def score(self, txt: str, timeout: Optional[float] = None) -> Any:
+        return self.submit(txt).result(timeout=timeout)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _collect(self) -> list[tuple[str, Future, float]]:
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.window_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = (
+                    self._queue.get(timeout=remaining)
+                    if remaining > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+            if item is None:
+                # Se cierra: se procesa lo ya reunido y se sale en la
+                # siguiente vuelta.
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+
+            started = time.perf_counter()
+            self._record(len(batch), [started - t0 for _, _, t0 in batch])
+
+            texts = [txt for txt, _, _ in batch]
+            try:
+                results = self.score_fn(texts)
+            except BaseException as e:  # se entrega el error a cada llamador
+                self._fail(batch, e)
+                continue
+
+            if isinstance(results, Future):
+                # Inferencia fuera de proceso: no se espera aquí, así el
+                # siguiente lote puede despacharse mientras este se calcula.
+                results.add_done_callback(lambda f, b=batch: self._resolve(b, f))
+            else:
+                for (_, fut, _), res in zip(batch, results):
+                    fut.set_result(res)
+
+    @staticmethod
+    def _fail(batch: list[tuple[str, Future, float]], exc: BaseException) -> None:
+        for _, fut, _ in batch:
+            fut.set_exception(exc)
+
+    def _resolve(self, batch: list[tuple[str, Future, float]], result: Future) -> None:
+        exc = result.exception()
+        if exc is not None:
+            self._fail(batch, exc)
+            return
+        for (_, fut, _), res in zip(batch, result.result()):
+            fut.set_result(res)
+
+    def _record(self, size: int, delays: list[float]) -> None:
+        with self._lock:
+            self._batches += 1
+            self._items += size
+            for b in _SIZE_BUCKETS:
+                if size <= b:
+                    self._size_hist[b] += 1
+                    break
+            else:
+                self._size_over += 1
+            self._delay_sum += sum(delays)
+            self._delay_max = max(self._delay_max, max(delays))
+
+    def stats(self) -> dict:
+        with self._lock:
+            hist = {f"le_{b}": n for b, n in self._size_hist.items()}
+            hist["gt_256"] = self._size_over
+            return {
+                "window_ms": self.window_s * 1000.0,
+                "max_batch": self.max_batch,
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": (self._items / self._batches) if self._batches else 0.0,
+                "batch_size_hist": hist,
+                "queue_delay_avg_ms": (self._delay_sum / self._items * 1000.0) if self._items else 0.0,
+                "queue_delay_max_ms": self._delay_max * 1000.0,
+                "pending": self._queue.qsize(),
+            }
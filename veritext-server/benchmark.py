@@ -0,0 +1,224 @@
+# veritext-server/benchmark.py
+"""Benchmark de latencia y rendimiento de la API, en proceso.
+
+Levanta la app con una base de datos SQLite temporal y un modelo pequeño
+entrenado al vuelo (no hace falta MySQL ni model.joblib), y lanza
+peticiones a `/analyze/text`, `/analyze/batch`, `/history` y `/auth/login`
+con varios niveles de concurrencia. El resultado es JSON con p50/p95/p99,
+peticiones por segundo y RSS pico.
+
+Uso:
+    python benchmark.py --out bench.json
+    python benchmark.py --baseline bench.json --tolerance 0.15
+
+Con `--baseline` se compara con un resultado guardado y se sale con código 1
+si algún escenario empeora más que la tolerancia (p95 o peticiones/s).
+Las variables VERITEXT_* del entorno se respetan, así que se pueden medir
+configuraciones distintas (p. ej. VERITEXT_WRITE_BEHIND=1).
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from synthetic_model import AI_WORDS, HUMAN_WORDS, entrenar_modelo
+
+
+SCENARIOS = ("analyze_text", "analyze_batch", "history", "login")
+
+
+def _texto(rng: random.Random, words: int) -> str:
+    vocab = AI_WORDS if rng.random() < 0.5 else HUMAN_WORDS
+    extra = [f"t{rng.randrange(10**6)}" for _ in range(3)]  # algo de vocabulario fuera del modelo
+    return " ".join([rng.choice(vocab) for _ in range(words)] + extra)
+
+
+def _peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _pct(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def _correr(client, make_request, n: int, concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    lat: list[float] = []
+    errors: dict[str, int] = {}
+
+    async def one(i: int) -> None:
+        async with sem:
+            t0 = time.perf_counter()
+            r = await make_request(client, i)
+            lat.append((time.perf_counter() - t0) * 1000)
+            if r.status_code >= 400:
+                errors[str(r.status_code)] = errors.get(str(r.status_code), 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    elapsed = time.perf_counter() - t0
+    return {
+        "requests": n,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": n / elapsed if elapsed else 0.0,
+        "p50_ms": _pct(lat, 0.50),
+        "p95_ms": _pct(lat, 0.95),
+        "p99_ms": _pct(lat, 0.99),
+        "max_ms": max(lat) if lat else 0.0,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+async def _benchmark(args) -> dict:
+    import httpx
+
+    import app as appmod
+
+    await appmod.app.router.startup()
+    transport = httpx.ASGITransport(app=appmod.app)
+    rng = random.Random(args.seed)
+    results: dict[str, dict] = {}
+    cache: dict = {}
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            creds = {"email": "bench@example.com", "password": "benchmark-123"}
+            await client.post("/auth/register", json=creds)
+            token = (await client.post("/auth/login", json=creds)).json()["token"]
+            auth = {"Authorization": f"Bearer {token}"}
+
+            texts = [_texto(rng, args.words) for _ in range(max(args.requests, 1) * 2)]
+            # Cada texto enviado lleva un sufijo que no se repite en toda la
+            # ejecución (calentamiento y todos los niveles): sin aciertos de caché.
+            seq = itertools.count()
+
+            def unico(text: str) -> str:
+                return f"{text} u{next(seq)}"
+
+            async def analyze_text(c, i):
+                return await c.post("/analyze/text", headers=auth, json={"text": unico(texts[i % len(texts)])})
+
+            async def analyze_batch(c, i):
+                start = (i * args.batch_size) % len(texts)
+                body = [{"text": unico(texts[(start + j) % len(texts)])} for j in range(args.batch_size)]
+                return await c.post("/analyze/batch", headers=auth, json=body)
+
+            async def history(c, i):
+                return await c.get("/history", headers=auth, params={"limit": 50})
+
+            async def login(c, i):
+                return await c.post("/auth/login", json=creds)
+
+            requests = {
+                "analyze_text": (analyze_text, args.requests),
+                "analyze_batch": (analyze_batch, max(1, args.requests // args.batch_size)),
+                "history": (history, args.requests),
+                # bcrypt es caro a propósito: menos peticiones para no eternizar.
+                "login": (login, max(1, args.requests // 10)),
+            }
+
+            # Calentamiento: la primera petición paga imports y cachés.
+            await analyze_text(client, 0)
+
+            # login va al final porque rota el token del resto de escenarios.
+            for name in [s for s in SCENARIOS if s in args.scenarios]:
+                fn, n = requests[name]
+                for conc in args.concurrency:
+                    key = f"{name}@{conc}"
+                    results[key] = await _correr(client, fn, n, conc)
+                    r = results[key]
+                    print(
+                        f"[bench] {key:<20} {r['rps']:>8.1f} req/s  p50 {r['p50_ms']:>7.1f}  "
+                        f"p95 {r['p95_ms']:>7.1f}  p99 {r['p99_ms']:>7.1f} ms  errores {r['errors'] or '-'}",
+                        file=sys.stderr,
+                    )
+        # Debería quedar sin aciertos; si no, los escenarios de análisis miden la caché.
+        cache = appmod._CACHE.stats()
+    finally:
+        await appmod.app.router.shutdown()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "words": args.words,
+            "batch_size": args.batch_size,
+            "env": {k: v for k, v in os.environ.items() if k.startswith("VERITEXT_")},
+            "peak_rss_mb": _peak_rss_mb(),
+            "cache": {k: cache.get(k) for k in ("hits_memory", "hits_db", "misses")},
+        },
+        "results": results,
+    }
+
+
+def comparar(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Escenarios que empeoran más que `tolerance` respecto a la línea base."""
+    regressions = []
+    for key, base in baseline.get("results", {}).items():
+        cur = current["results"].get(key)
+        if cur is None:
+            continue
+        if base["p95_ms"] and cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {base['p95_ms']:.1f} -> {cur['p95_ms']:.1f} ms")
+        if base["rps"] and cur["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{key}: rps {base['rps']:.1f} -> {cur['rps']:.1f}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark en proceso de la API de Veritext")
+    parser.add_argument("--requests", type=int, default=200, help="peticiones por escenario y nivel")
+    parser.add_argument("--concurrency", type=lambda v: [int(x) for x in v.split(",")], default=[1, 8, 32])
+    parser.add_argument("--scenarios", type=lambda v: v.split(","), default=list(SCENARIOS))
+    parser.add_argument("--words", type=int, default=300, help="palabras por texto sintético")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", type=Path, default=None, help="fichero JSON de salida (por defecto stdout)")
+    parser.add_argument("--baseline", type=Path, default=None, help="resultado previo con el que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    # Todo en un directorio temporal: base de datos y modelo de prueba.
+    workdir = Path(tempfile.mkdtemp(prefix="veritext-bench-"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'bench.db'}"
+    os.environ["VERITEXT_MODEL_PATH"] = str(workdir / "model.joblib")
+    os.environ["VERITEXT_COMPILED_MODEL_DIR"] = str(workdir / "model_compiled")
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    entrenar_modelo(workdir / "model.joblib")
+
+    try:
+        report = asyncio.run(_benchmark(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    out = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        args.out.write_text(out, encoding="utf-8")
+        print(f"[bench] Resultado guardado en {args.out}", file=sys.stderr)
+    else:
+        print(out)
+
+    if args.baseline:
+        regressions = comparar(report, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+        if regressions:
+            print("[bench] Regresiones respecto a la línea base:", file=sys.stderr)
+            for r in regressions:
+                print("   ", r, file=sys.stderr)
+            sys.exit(1)
+        print("[bench] Sin regresiones respecto a la línea base", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,72 +1,174 @@
 # build_dataset.py
-import pandas as pd
+"""Construye el dataset de entrenamiento a partir de las fuentes en bruto.
+
+Las dos fuentes se leen por bloques y se muestrean con reservorio, así que la
+muestra es uniforme sobre todo el fichero y la memoria no depende de su
+tamaño. Los textos repetidos (tras normalizarlos) se descartan con un filtro
+de Bloom de tamaño fijo: con unos diez millones de textos distintos, menos de
+un 0,2 % de los únicos se toma por duplicado.
+
+La salida son fragmentos Parquet comprimidos en `data/textos_parquet/`,
+deterministas para la misma entrada. Si pyarrow no está instalado se
+escribe `data/textos.csv` como antes.
+"""
+import hashlib
+import random
 from pathlib import Path
 
+import pandas as pd
+
+from preprocess import normalize_text
+
 BASE = Path(__file__).resolve().parent
 DATA_DIR = BASE / "data"
 
 AI_CSV = DATA_DIR / "awesome_prompts.csv"
 HUMAN_CSV = DATA_DIR / "human_arxiv.csv"
 OUT_CSV = DATA_DIR / "textos.csv"
+OUT_DIR = DATA_DIR / "textos_parquet"
 
 
 N_AI = 5000
 N_HUMAN = 5000
 
-def main():
-    # ----------------- TEXTOS IA (ChatGPT prompts) -----------------
-    print("📂 Leyendo IA desde:", AI_CSV)
-    df_ai = pd.read_csv(AI_CSV)
-
-    if "prompt" not in df_ai.columns:
-        raise SystemExit(f"No se encontró la columna 'prompt' en {AI_CSV}")
-
+CHUNKSIZE = 10_000
+SHARD_ROWS = 50_000
+SEED = 42
+
+BLOOM_BITS = 1 << 27  # 16 MiB
+BLOOM_HASHES = 7
+
+
+class Reservorio:
+    """Muestra uniforme de tamaño fijo sobre un flujo de longitud desconocida."""
+
+    def __init__(self, k: int, seed: int = SEED):
+        self.k = k
+        self.items: list[str] = []
+        self.seen = 0
+        self._rng = random.Random(seed)
+
+    def add(self, item: str) -> None:
+        self.seen += 1
+        if len(self.items) < self.k:
+            self.items.append(item)
+            return
+        j = self._rng.randrange(self.seen)
+        if j < self.k:
+            self.items[j] = item
+
+
+class FiltroBloom:
+    """Conjunto aproximado de huellas con memoria fija.
+
+    No hay falsos negativos; un falso positivo descarta un texto único.
+    """
+
+    def __init__(self, bits: int = BLOOM_BITS, hashes: int = BLOOM_HASHES):
+        self.bits = bits
+        self.hashes = hashes
+        self._bytes = bytearray((bits + 7) // 8)
+
+    def _posiciones(self, digest: bytes):
+        # Doble hashing sobre las dos mitades de la huella de 16 bytes.
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def add(self, digest: bytes) -> bool:
+        """Añade la huella; devuelve False si (probablemente) ya estaba."""
+        nuevo = False
+        for pos in self._posiciones(digest):
+            byte, bit = divmod(pos, 8)
+            if not self._bytes[byte] >> bit & 1:
+                self._bytes[byte] |= 1 << bit
+                nuevo = True
+        return nuevo
+
+
+def _digest(texto: str) -> bytes:
+    return hashlib.blake2b(normalize_text(texto).encode("utf-8"), digest_size=16).digest()
+
+
+def _muestrear(textos, k: int, vistos: FiltroBloom) -> tuple[list[str], int, int]:
+    """Devuelve (muestra, textos únicos leídos, duplicados descartados)."""
+    reservorio = Reservorio(k)
+    duplicados = 0
+    for texto in textos:
+        if not vistos.add(_digest(texto)):
+            duplicados += 1
+            continue
+        reservorio.add(texto)
+    return reservorio.items, reservorio.seen, duplicados
+
+
+def _textos_ia():
+    for chunk in pd.read_csv(AI_CSV, chunksize=CHUNKSIZE):
+        if "prompt" not in chunk.columns:
+            raise SystemExit(f"No se encontró la columna 'prompt' en {AI_CSV}")
+        for texto in chunk["prompt"].dropna().astype(str):
+            texto = texto.strip()
+            if texto:
+                yield texto
+
+
+def _textos_humanos():
+    for chunk in pd.read_csv(HUMAN_CSV, usecols=["title", "abstract"], chunksize=CHUNKSIZE):
+        textos = (chunk["title"].fillna("") + ". " + chunk["abstract"].fillna("")).str.strip()
+        for texto in textos:
+            # Un título y resumen vacíos dejan sólo el separador.
+            if texto and texto != ".":
+                yield texto
+
+
+def _escribir_parquet(df: pd.DataFrame) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    for old in OUT_DIR.glob("part-*.parquet"):
+        old.unlink()
+
+    schema = pa.schema([("texto", pa.string()), ("label", pa.int8())])
+    for n, start in enumerate(range(0, len(df), SHARD_ROWS)):
+        part = df.iloc[start:start + SHARD_ROWS]
+        table = pa.Table.from_pandas(part, schema=schema, preserve_index=False)
+        pq.write_table(table, OUT_DIR / f"part-{n:05d}.parquet", compression="zstd")
+    print("💾 Guardado en:", OUT_DIR)
 
-    df_ai = df_ai.rename(columns={"prompt": "texto"})
-    df_ai["label"] = 1   # 1 = IA
 
-    if len(df_ai) > N_AI:
-        df_ai = df_ai.sample(N_AI, random_state=42)
+def main():
+    vistos = FiltroBloom()
 
-    df_ai = df_ai[["texto", "label"]]
-    print("✅ Ejemplos IA:", len(df_ai))
+    # ----------------- TEXTOS IA (ChatGPT prompts) -----------------
+    print("📂 Leyendo IA desde:", AI_CSV)
+    ia, leidos, dups = _muestrear(_textos_ia(), N_AI, vistos)
+    print(f"✅ Ejemplos IA: {len(ia)} de {leidos} únicos ({dups} duplicados descartados)")
 
     # ----------------- TEXTOS HUMANOS (arXiv) -----------------
     print("📂 Leyendo HUMANO desde:", HUMAN_CSV)
-
-
-    df_h = pd.read_csv(
-        HUMAN_CSV,
-        usecols=["title", "abstract"],
-        nrows=N_HUMAN,
-    )
-
-
-    df_h["title"] = df_h["title"].fillna("")
-    df_h["abstract"] = df_h["abstract"].fillna("")
-
-
-    df_h["texto"] = (df_h["title"] + ". " + df_h["abstract"]).str.strip()
-    df_h = df_h.drop(columns=["title", "abstract"])
-
-
-    df_h = df_h[df_h["texto"].str.len() > 0]
-
-    df_h["label"] = 0
-    df_h = df_h[["texto", "label"]]
-
-    print("✅ Ejemplos humanos:", len(df_h))
+    humanos, leidos, dups = _muestrear(_textos_humanos(), N_HUMAN, vistos)
+    print(f"✅ Ejemplos humanos: {len(humanos)} de {leidos} únicos ({dups} duplicados descartados)")
 
     # ----------------- COMBINAR Y GUARDAR -----------------
-    df_all = pd.concat([df_ai, df_h], ignore_index=True)
-    df_all = df_all.sample(frac=1.0, random_state=42).reset_index(drop=True)
+    rows = [(t, 1) for t in ia] + [(t, 0) for t in humanos]
+    random.Random(SEED).shuffle(rows)
+    df_all = pd.DataFrame(rows, columns=["texto", "label"])
 
     print("📊 Dataset final:", df_all.shape)
     print(df_all["label"].value_counts())
 
-    OUT_CSV.parent.mkdir(parents=True, exist_ok=True)
-    df_all.to_csv(OUT_CSV, index=False, encoding="utf-8")
-    print("💾 Guardado en:", OUT_CSV)
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("⚠️ pyarrow no está instalado; se escribe CSV.")
+        OUT_CSV.parent.mkdir(parents=True, exist_ok=True)
+        df_all.to_csv(OUT_CSV, index=False, encoding="utf-8")
+        print("💾 Guardado en:", OUT_CSV)
+        return
+
+    _escribir_parquet(df_all)
 
 
 if __name__ == "__main__":
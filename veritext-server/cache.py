@@ -0,0 +1,102 @@
+# veritext-server/cache.py
+"""Caché de resultados direccionada por contenido.
+
+La clave es el hash del texto normalizado (misma normalización que
+`preprocess.normalize_text`) junto con la versión del modelo, de modo que un
+cambio de modelo invalida todas las entradas anteriores.
+"""
+from collections import OrderedDict
+from typing import Optional, Union
+import hashlib
+import os
+import threading
+import time
+
+from preprocess import Documento, preparar
+
+
+CACHE_SIZE = int(os.getenv("VERITEXT_CACHE_SIZE", "10000"))
+CACHE_TTL_S = float(os.getenv("VERITEXT_CACHE_TTL_S", "3600"))
+
+
+def text_hash(txt: Union[str, Documento]) -> str:
+    return hashlib.sha256(preparar(txt).normalized.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """LRU en memoria con expiración por TTL.
+
+    Las entradas guardan el resultado completo del análisis (score y
+    términos influyentes). Los aciertos del nivel
+    persistente (tabla `analyses`) se registran con `record_db_hit` y se
+    promueven a memoria con `put`.
+    """
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl_s: float = CACHE_TTL_S):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self.version: Optional[str] = None
+        self._data: "OrderedDict[str, tuple[float, tuple]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits_memory = 0
+        self.hits_db = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def set_version(self, version: str) -> None:
+        """Fija la versión del modelo; si cambia, vacía el nivel en memoria."""
+        with self._lock:
+            if version != self.version:
+                self._data.clear()
+                self.version = version
+
+    def get(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits_memory += 1
+            return value
+
+    def put(self, key: str, value: tuple, version: Optional[str] = None) -> None:
+        """Guarda un resultado; se ignora si lo produjo otra versión del modelo."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._data[key] = (time.monotonic() + self.ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def record_db_hit(self) -> None:
+        with self._lock:
+            self.hits_db += 1
+
+    def record_miss(self, n: int = 1) -> None:
+        with self._lock:
+            self.misses += n
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits_memory + self.hits_db + self.misses
+            return {
+                "model_version": self.version,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_s": self.ttl_s,
+                "hits_memory": self.hits_memory,
+                "hits_db": self.hits_db,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": ((self.hits_memory + self.hits_db) / lookups) if lookups else 0.0,
+            }
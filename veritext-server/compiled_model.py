@@ -0,0 +1,155 @@
+# veritext-server/compiled_model.py
+"""Motor de inferencia compilado para servir el modelo TF-IDF + LR.
+
+`export_model.py` convierte el Pipeline de sklearn en un directorio de
+arrays `.npy` que aquí se abren con memory-mapping:
+
+    term_hash.npy   uint64, hash blake2b-64 de cada término, ordenado
+    term_index.npy  int32, columna de la matriz para cada hash
+    term_off.npy    int64, desplazamientos de cada término en term_blob
+    term_blob.npy   uint8, términos en UTF-8 concatenados (en orden de hash)
+    col_pos.npy     int32, posición en term_hash de cada columna
+    idf.npy         float64, pesos IDF por columna
+    coef.npy        float64, coeficientes de la regresión logística
+    meta.json       hiperparámetros del vectorizador, intercepto y versión
+
+La puntuación tokeniza igual que TfidfVectorizer (con `preprocess` cuando
+la configuración lo permite, reutilizando los tokens de un `Documento`),
+construye la fila TF-IDF dispersa y hace el producto escalar directamente,
+sin pasar por la validación genérica de sklearn.
+"""
+from collections import Counter
+from pathlib import Path
+from typing import Optional, Union
+import hashlib
+import json
+import re
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.special import expit
+
+from preprocess import SKLEARN_TOKEN_PATTERN, Documento, preparar, word_ngrams
+
+
+META_FILE = "meta.json"
+
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+class CompiledModel:
+    """Sustituto de `Pipeline.predict_proba` para el modelo exportado."""
+
+    def __init__(self, path: Path, mmap: bool = True):
+        self.path = Path(path)
+        meta = json.loads((self.path / META_FILE).read_text(encoding="utf-8"))
+        self.meta = meta
+        self.version: Optional[str] = meta.get("source_version")
+
+        mode = "r" if mmap else None
+        self.term_hash = np.load(self.path / "term_hash.npy", mmap_mode=mode)
+        self.term_index = np.load(self.path / "term_index.npy", mmap_mode=mode)
+        self.term_off = np.load(self.path / "term_off.npy", mmap_mode=mode)
+        self.term_blob = np.load(self.path / "term_blob.npy", mmap_mode=mode)
+        self.col_pos = np.load(self.path / "col_pos.npy", mmap_mode=mode)
+        self.idf = np.load(self.path / "idf.npy", mmap_mode=mode)
+        self.coef_ = np.load(self.path / "coef.npy", mmap_mode=mode)
+        self.intercept_ = float(meta["intercept"])
+        self.classes_ = np.asarray(meta["classes"])
+
+        self.lowercase = bool(meta["lowercase"])
+        self.ngram_range = tuple(meta["ngram_range"])
+        self.norm = meta["norm"]
+        self.sublinear_tf = bool(meta["sublinear_tf"])
+        self.binary = bool(meta["binary"])
+        self._token_re = re.compile(meta["token_pattern"])
+        self.n_features = int(meta["n_features"])
+        # Si tokeniza como `preprocess`, se usan directamente los n-gramas
+        # ya calculados del Documento.
+        self._shared_tokens = self.lowercase and meta["token_pattern"] == SKLEARN_TOKEN_PATTERN
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledModel":
+        return cls(Path(path))
+
+    # ---------------- vectorización ----------------
+
+    def analyze(self, text: Union[str, Documento]) -> list[str]:
+        if self._shared_tokens:
+            return preparar(text).ngrams(self.ngram_range)
+        if isinstance(text, Documento):
+            text = text.raw
+        if self.lowercase:
+            text = text.lower()
+        return word_ngrams(self._token_re.findall(text), self.ngram_range)
+
+    def _lookup(self, terms: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """Máscara de términos presentes en el vocabulario y sus columnas.
+
+        Con hashes de 64 bits la probabilidad de que un término fuera del
+        vocabulario colisione con uno del vocabulario es despreciable
+        (|V| / 2**64 por búsqueda), así que no se compara el texto.
+        """
+        hashes = np.fromiter((term_hash(t) for t in terms), dtype=np.uint64, count=len(terms))
+        pos = np.searchsorted(self.term_hash, hashes)
+        np.minimum(pos, len(self.term_hash) - 1, out=pos)
+        hit = self.term_hash[pos] == hashes
+        return hit, np.asarray(self.term_index[pos[hit]], dtype=np.int32)
+
+    def _row(self, terms: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        counts = Counter(terms)
+        if not counts or not len(self.term_hash):
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+        hit, cols = self._lookup(list(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))[hit]
+        if self.binary:
+            tf[:] = 1.0
+        elif self.sublinear_tf:
+            tf = np.log(tf) + 1.0
+        vals = tf * self.idf[cols]
+        if self.norm == "l2":
+            vals /= np.sqrt(np.dot(vals, vals)) or 1.0
+        elif self.norm == "l1":
+            vals /= np.abs(vals).sum() or 1.0
+        order = np.argsort(cols)
+        return cols[order], vals[order]
+
+    def feature_name(self, col: int) -> str:
+        """Término de una columna; sólo se decodifica bajo demanda."""
+        p = int(self.col_pos[col])
+        return self.term_blob[self.term_off[p]:self.term_off[p + 1]].tobytes().decode("utf-8")
+
+    def transform(self, texts: list[Union[str, Documento]]) -> sp.csr_matrix:
+        indptr = [0]
+        indices: list[np.ndarray] = []
+        data: list[np.ndarray] = []
+        for text in texts:
+            cols, vals = self._row(self.analyze(text))
+            indices.append(cols)
+            data.append(vals)
+            indptr.append(indptr[-1] + len(cols))
+        return sp.csr_matrix(
+            (
+                np.concatenate(data) if data else np.empty(0, dtype=np.float64),
+                np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+                np.asarray(indptr),
+            ),
+            shape=(len(texts), self.n_features),
+        )
+
+    # ---------------- predicción ----------------
+
+    def decision_function(self, X: sp.csr_matrix) -> np.ndarray:
+        return X @ self.coef_ + self.intercept_
+
+    def predict_proba_matrix(self, X: sp.csr_matrix) -> np.ndarray:
+        p = expit(self.decision_function(X))
+        return np.column_stack([1.0 - p, p])
+
+    def predict_proba(self, texts: list[Union[str, Documento]]) -> np.ndarray:
+        return self.predict_proba_matrix(self.transform(texts))
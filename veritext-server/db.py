@@ -12,13 +12,74 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL no definido")
 
+# Tamaño del pool de conexiones (por proceso). Con SQLite se deja el pool
+# por defecto de SQLAlchemy.
+DB_POOL_SIZE = int(os.getenv("VERITEXT_DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("VERITEXT_DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_S = float(os.getenv("VERITEXT_DB_POOL_TIMEOUT_S", "30"))
+
+# Modo async: auth, /analyze/text y /history usan una AsyncSession con un
+# driver asíncrono (aiomysql), así que esperar a la base de datos no ocupa
+# un hilo del threadpool. El motor síncrono se mantiene para los hilos de
+# fondo (escritura diferida, índice de casi duplicados) y los scripts.
+DB_ASYNC = os.getenv("VERITEXT_DB_ASYNC", "0") == "1"
+
+_ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql+mysqldb": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def _pool_args(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT_S,
+    }
+
+
+def _async_url(url: str) -> str:
+    """URL equivalente con driver asíncrono (VERITEXT_ASYNC_DATABASE_URL la sustituye)."""
+    explicit = os.getenv("VERITEXT_ASYNC_DATABASE_URL")
+    if explicit:
+        return explicit
+    scheme, sep, rest = url.partition("://")
+    if scheme not in _ASYNC_DRIVERS:
+        raise RuntimeError(
+            f"No hay driver async para '{scheme}'; define VERITEXT_ASYNC_DATABASE_URL"
+        )
+    return _ASYNC_DRIVERS[scheme] + sep + rest
+
+
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
     pool_recycle=3600,
+    **_pool_args(DATABASE_URL),
 )
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    ASYNC_DATABASE_URL = _async_url(DATABASE_URL)
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        **_pool_args(ASYNC_DATABASE_URL),
+    )
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine, autoflush=False, expire_on_commit=False
+    )
+
 class Base(DeclarativeBase):
     pass
 
@@ -28,3 +89,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Dependencia de los endpoints que admiten los dos modos.
+get_session = get_async_db if DB_ASYNC else get_db
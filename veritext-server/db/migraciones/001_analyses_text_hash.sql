@@ -0,0 +1,6 @@
+-- Caché de resultados por contenido: hash del texto normalizado y versión
+-- del modelo que produjo el score.
+ALTER TABLE `analyses`
+  ADD COLUMN `text_hash` varchar(64) DEFAULT NULL AFTER `text`,
+  ADD COLUMN `model_version` varchar(32) DEFAULT NULL AFTER `text_hash`,
+  ADD KEY `ix_analyses_hash_version` (`text_hash`, `model_version`);
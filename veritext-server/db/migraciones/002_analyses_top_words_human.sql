@@ -0,0 +1,4 @@
+-- Términos que más empujan el score hacia "humano" (top_words guarda los
+-- que empujan hacia IA).
+ALTER TABLE `analyses`
+  ADD COLUMN `top_words_human` text COLLATE utf8mb4_unicode_520_ci AFTER `top_words`;
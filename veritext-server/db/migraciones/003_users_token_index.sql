@@ -0,0 +1,4 @@
+-- Búsqueda de usuario por token en cada petición autenticada sin recorrer
+-- la tabla entera. Los tokens son aleatorios, así que el índice es único.
+ALTER TABLE `users`
+  ADD UNIQUE KEY `ix_users_token` (`token`);
@@ -0,0 +1,17 @@
+-- Textos comprimidos y direccionados por contenido. Los análisis nuevos
+-- guardan sólo `text_id`; las filas existentes se pasan con
+-- `python migrate_texts.py`, que vacía `analyses.text` al moverlas.
+CREATE TABLE `texts` (
+  `id` varchar(64) NOT NULL,
+  `codec` varchar(8) NOT NULL,
+  `size` int NOT NULL,
+  `data` mediumblob NOT NULL,
+  `created_at` datetime(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+  PRIMARY KEY (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_520_ci;
+
+ALTER TABLE `analyses`
+  MODIFY COLUMN `text` text COLLATE utf8mb4_unicode_520_ci DEFAULT NULL,
+  ADD COLUMN `text_id` varchar(64) DEFAULT NULL AFTER `text`,
+  ADD KEY `ix_analyses_text_id` (`text_id`),
+  ADD CONSTRAINT `fk_analyses_text` FOREIGN KEY (`text_id`) REFERENCES `texts` (`id`);
@@ -0,0 +1,6 @@
+-- Firma MinHash de cada texto para el índice de casi duplicados
+-- (near_dup.py). Las firmas de textos existentes se calculan con
+-- `python near_dup.py`.
+ALTER TABLE `texts`
+  ADD COLUMN `minhash` blob DEFAULT NULL AFTER `data`,
+  ADD KEY `ix_texts_created_at` (`created_at`);
@@ -0,0 +1,125 @@
+# veritext-server/explain.py
+"""Puntuación y explicación en una sola pasada sobre la matriz dispersa.
+
+La contribución de cada término es tfidf × coef. Sólo se recorren las
+entradas no nulas de la fila (unos cientos como mucho), y los k términos
+que más empujan hacia IA y hacia humano se eligen con un heap, así que
+explicar cuesta una fracción de milisegundo por texto.
+"""
+from typing import Any, Callable, Union
+import heapq
+import os
+import threading
+import weakref
+
+import numpy as np
+from sklearn.utils import murmurhash3_32
+
+from compiled_model import CompiledModel
+from preprocess import Analizador, Documento
+
+
+TOP_K = int(os.getenv("VERITEXT_TOP_WORDS", "5"))
+
+# (probabilidad de IA, términos que empujan a IA, términos que empujan a humano)
+Scored = tuple[float, list[str], list[str]]
+
+
+# Los nombres de los términos del Pipeline se construyen una vez por modelo
+# cargado y no en cada petición; al descartar un modelo se libera su entrada.
+_NAMES: "weakref.WeakKeyDictionary[Any, np.ndarray]" = weakref.WeakKeyDictionary()
+_NAMES_LOCK = threading.Lock()
+
+
+def _pipeline_names(model: Any) -> np.ndarray:
+    names = _NAMES.get(model)
+    if names is None:
+        with _NAMES_LOCK:
+            names = _NAMES.get(model)
+            if names is None:
+                names = _NAMES[model] = model.named_steps["tfidf"].get_feature_names_out()
+    return names
+
+
+def _hashed_names(tfidf: Any, doc: Union[str, Documento]) -> dict[int, str]:
+    """Columna -> n-grama de un texto, para vectorizadores de hashing.
+
+    Un `HashingVectorizer` no guarda vocabulario, pero las columnas de una
+    fila salen de los n-gramas del propio texto, así que se recalculan sus
+    hashes (mismo murmurhash3 que sklearn) sólo para ese documento.
+    """
+    if isinstance(tfidf.analyzer, Analizador):
+        grams = tfidf.analyzer(doc)
+    else:
+        grams = tfidf.build_analyzer()(doc.raw if isinstance(doc, Documento) else doc)
+    out: dict[int, str] = {}
+    for g in grams:
+        out.setdefault(abs(murmurhash3_32(g, seed=0)) % tfidf.n_features, g)
+    return out
+
+
+def _parts(model: Any):
+    """(transform, proba de IA sobre la matriz, coeficientes, nombre de columna).
+
+    Con un vectorizador de hashing el nombre depende del texto, así que en
+    lugar de una función se devuelve None y `score_batch` lo resuelve por fila.
+    """
+    if isinstance(model, CompiledModel):
+        return (
+            model.transform,
+            lambda X: model.predict_proba_matrix(X)[:, 1],
+            np.asarray(model.coef_),
+            model.feature_name,
+        )
+    tfidf = model.named_steps["tfidf"]
+    clf = model.named_steps["clf"]
+    if isinstance(tfidf.analyzer, Analizador):
+        transform = tfidf.transform
+    else:
+        # Vectorizador con tokenización propia: necesita el texto original.
+        transform = lambda docs: tfidf.transform(
+            [d.raw if isinstance(d, Documento) else d for d in docs]
+        )
+    return (
+        transform,
+        lambda X: clf.predict_proba(X)[:, 1],
+        np.asarray(clf.coef_[0]),
+        _pipeline_names(model).__getitem__ if hasattr(tfidf, "vocabulary_") else None,
+    )
+
+
+def top_contributions(
+    indices: np.ndarray,
+    data: np.ndarray,
+    coef: np.ndarray,
+    name: Callable[[int], str],
+    k: int = TOP_K,
+) -> tuple[list[str], list[str]]:
+    """Términos de una fila dispersa que más empujan hacia IA y hacia humano."""
+    if k <= 0 or len(indices) == 0:
+        return [], []
+    contrib = data * coef[indices]
+    pairs = list(zip(contrib.tolist(), indices.tolist()))
+    ai = heapq.nlargest(k, (p for p in pairs if p[0] > 0))
+    human = heapq.nsmallest(k, (p for p in pairs if p[0] < 0))
+    return [str(name(i)) for _, i in ai], [str(name(i)) for _, i in human]
+
+
+def score_batch(
+    model: Any, texts: list[Union[str, Documento]], k: int = TOP_K
+) -> list[Scored]:
+    """Probabilidad de IA y explicación de cada texto con una sola transformación."""
+    transform, proba, coef, name = _parts(model)
+    X = transform(texts).tocsr()
+    probs = proba(X)
+    out: list[Scored] = []
+    for i, p in enumerate(probs):
+        start, end = X.indptr[i], X.indptr[i + 1]
+        row_name = name
+        if row_name is None:
+            row_name = _hashed_names(model.named_steps["tfidf"], texts[i]).__getitem__
+        ai, human = top_contributions(
+            X.indices[start:end], X.data[start:end], coef, row_name, k
+        )
+        out.append((float(p), ai, human))
+    return out
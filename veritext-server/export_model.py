@@ -0,0 +1,130 @@
+# veritext-server/export_model.py
+"""Exporta model.joblib al formato compilado de `compiled_model.py`.
+
+Uso:
+    python export_model.py [model.joblib] [model_compiled]
+
+Tras exportar se comprueba que las probabilidades coinciden con las de
+`Pipeline.predict_proba` sobre los textos de ejemplo de `model.py` (y
+sobre una muestra de data/textos.csv si existe).
+"""
+from pathlib import Path
+import json
+import sys
+import time
+
+import numpy as np
+from joblib import load
+
+from compiled_model import META_FILE, CompiledModel, term_hash
+from model import model_file_version
+from preprocess import SKLEARN_TOKEN_PATTERN, Analizador, es_analizador_compatible
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_MODEL = BASE_DIR / "model.joblib"
+DEFAULT_OUT = BASE_DIR / "model_compiled"
+
+TOLERANCE = 1e-9
+
+
+def export(model_path: Path, out_dir: Path) -> None:
+    pipe = load(model_path)
+    tfidf = pipe.named_steps["tfidf"]
+    clf = pipe.named_steps["clf"]
+
+    if not hasattr(tfidf, "vocabulary_"):
+        # Los modelos de `train_model.py --stream` usan hashing: ya cargan
+        # rápido y no tienen vocabulario que exportar.
+        raise SystemExit("El modelo usa un vectorizador sin vocabulario (hashing); se sirve directamente desde model.joblib")
+
+    unsupported = {
+        "analyzer": not es_analizador_compatible(tfidf),
+        "use_idf": not tfidf.use_idf,
+        "clases": len(clf.classes_) != 2,
+    }
+    bad = [k for k, v in unsupported.items() if v]
+    if bad:
+        raise SystemExit(f"Configuración no soportada por el motor compilado: {bad}")
+
+    vocab = tfidf.vocabulary_
+    terms = list(vocab.keys())
+    hashes = np.fromiter((term_hash(t) for t in terms), dtype=np.uint64, count=len(terms))
+    order = np.argsort(hashes, kind="stable")
+    hashes = hashes[order]
+    if len(hashes) > 1 and np.any(hashes[1:] == hashes[:-1]):
+        raise SystemExit("Colisión de hash en el vocabulario; no se puede exportar")
+
+    encoded = [terms[i].encode("utf-8") for i in order]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    index = np.fromiter((vocab[terms[i]] for i in order), dtype=np.int32, count=len(order))
+    col_pos = np.empty(len(index), dtype=np.int32)
+    col_pos[index] = np.arange(len(index), dtype=np.int32)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    np.save(out_dir / "term_hash.npy", hashes)
+    np.save(out_dir / "term_index.npy", index)
+    np.save(out_dir / "term_off.npy", offsets)
+    np.save(out_dir / "term_blob.npy", blob)
+    np.save(out_dir / "col_pos.npy", col_pos)
+    np.save(out_dir / "idf.npy", np.asarray(tfidf.idf_, dtype=np.float64))
+    np.save(out_dir / "coef.npy", np.asarray(clf.coef_[0], dtype=np.float64))
+
+    # Tamaño y mtime del joblib: mientras no cambien, el servidor no
+    # vuelve a calcular su huella (leería el fichero entero).
+    st = Path(model_path).stat()
+    meta = {
+        "source_version": model_file_version(str(model_path)),
+        "source_size": st.st_size,
+        "source_mtime_ns": st.st_mtime_ns,
+        "n_features": len(vocab),
+        "intercept": float(clf.intercept_[0]),
+        "classes": [int(c) for c in clf.classes_],
+        # `Analizador` y el analizador por defecto tokenizan igual.
+        "lowercase": True,
+        "token_pattern": SKLEARN_TOKEN_PATTERN,
+        "ngram_range": list(
+            tfidf.analyzer.ngram_range if isinstance(tfidf.analyzer, Analizador) else tfidf.ngram_range
+        ),
+        "norm": tfidf.norm,
+        "sublinear_tf": bool(tfidf.sublinear_tf),
+        "binary": bool(tfidf.binary),
+    }
+    (out_dir / META_FILE).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    print(f"✅ Modelo compilado en {out_dir} ({len(vocab)} términos)")
+
+    verify(pipe, out_dir)
+
+
+def _sample_texts() -> list[str]:
+    from model import ai_texts, human_texts
+
+    texts = human_texts + ai_texts + ["", "x", "Texto SIN palabras del vocabulario: zzzz qqqq"]
+    csv_path = BASE_DIR / "data" / "textos.csv"
+    if csv_path.exists():
+        import pandas as pd
+
+        df = pd.read_csv(csv_path, nrows=500)
+        texts += df["texto"].dropna().astype(str).tolist()
+    return texts
+
+
+def verify(pipe, out_dir: Path) -> None:
+    t0 = time.perf_counter()
+    compiled = CompiledModel.load(str(out_dir))
+    load_ms = (time.perf_counter() - t0) * 1000.0
+
+    texts = _sample_texts()
+    expected = pipe.predict_proba(texts)[:, 1]
+    got = compiled.predict_proba(texts)[:, 1]
+    diff = float(np.max(np.abs(expected - got))) if len(texts) else 0.0
+    print(f"🔎 {len(texts)} textos | diferencia máxima {diff:.2e} | carga {load_ms:.1f} ms")
+    if diff > TOLERANCE:
+        raise SystemExit(f"❌ El modelo compilado difiere del Pipeline ({diff:.2e} > {TOLERANCE})")
+
+
+if __name__ == "__main__":
+    model_path = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MODEL
+    out_dir = Path(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_OUT
+    export(model_path, out_dir)
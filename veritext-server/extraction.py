@@ -0,0 +1,202 @@
+# veritext-server/extraction.py
+"""Extracción de texto de ficheros subidos, en un pool de procesos.
+
+Extraer texto de un PDF es CPU puro y, con ficheros malformados, puede
+tardar mucho o no terminar. Por eso se hace en procesos aparte, con límite
+de páginas y un timeout tras el que se mata el proceso. Los PDF que en
+las primeras páginas no tienen apenas texto (escaneados, sólo imágenes) se
+rechazan sin recorrer el resto.
+"""
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+import asyncio
+import multiprocessing as mp
+import os
+import threading
+
+
+EXTRACT_WORKERS = int(os.getenv("VERITEXT_EXTRACT_WORKERS", "2"))
+EXTRACT_MAX_PENDING = int(os.getenv("VERITEXT_EXTRACT_MAX_PENDING", "16"))
+EXTRACT_TIMEOUT_S = float(os.getenv("VERITEXT_EXTRACT_TIMEOUT_S", "30"))
+PDF_MAX_PAGES = int(os.getenv("VERITEXT_PDF_MAX_PAGES", "200"))
+# Páginas que se miran antes de decidir que un PDF es sólo imágenes.
+PDF_PROBE_PAGES = int(os.getenv("VERITEXT_PDF_PROBE_PAGES", "3"))
+PDF_MIN_PROBE_CHARS = int(os.getenv("VERITEXT_PDF_MIN_PROBE_CHARS", "200"))
+
+IMAGE_ONLY_MSG = (
+    "El archivo parece contener solo imágenes o muy poco texto legible. "
+    "No es posible analizarlo."
+)
+
+
+class ExtractionError(Exception):
+    """El fichero no se puede analizar; el mensaje es apto para el usuario."""
+
+
+class ExtractionSaturated(Exception):
+    """La cola de extracción está llena."""
+
+
+def extraer_pdf(
+    path: str,
+    max_pages: int = PDF_MAX_PAGES,
+    probe_pages: int = PDF_PROBE_PAGES,
+    min_probe_chars: int = PDF_MIN_PROBE_CHARS,
+) -> dict:
+    """Texto de un PDF leyendo del disco página a página (se ejecuta en un proceso aparte)."""
+    from pypdf import PdfReader
+
+    try:
+        reader = PdfReader(path)
+        if reader.is_encrypted and not reader.decrypt(""):
+            raise ExtractionError("El PDF está protegido con contraseña")
+        total = len(reader.pages)
+
+        parts: list[str] = []
+        chars = 0
+        for i in range(min(total, max_pages)):
+            try:
+                txt = reader.pages[i].extract_text() or ""
+            except Exception:
+                txt = ""
+            parts.append(txt)
+            chars += len(txt.strip())
+            if i + 1 == probe_pages and chars < min_probe_chars:
+                raise ExtractionError(IMAGE_ONLY_MSG)
+    except ExtractionError:
+        raise
+    except Exception:
+        # Con ficheros malformados pypdf no sólo lanza PdfReadError
+        # (también KeyError, ValueError, AssertionError...).
+        raise ExtractionError("El archivo PDF está dañado o no es válido")
+
+    # Documentos más cortos que la muestra: se decide con lo que hay.
+    if len(parts) < probe_pages and chars < min_probe_chars:
+        raise ExtractionError(IMAGE_ONLY_MSG)
+
+    return {"text": "\n".join(parts), "pages": total, "pages_read": len(parts)}
+
+
+def _trabajo(conn, fn, args) -> None:
+    """Cuerpo del proceso hijo: ejecuta `fn` y envía `(ok, resultado o excepción)`."""
+    try:
+        out = (True, fn(*args))
+    except BaseException as e:
+        out = (False, e)
+    try:
+        conn.send(out)
+    except Exception as e:
+        # Resultado o excepción que no se puede serializar.
+        conn.send((False, RuntimeError(repr(e))))
+    finally:
+        conn.close()
+
+
+def _recibir(conn):
+    try:
+        return conn.recv()
+    finally:
+        conn.close()
+
+
+class ExtractionPool:
+    """Un proceso por extracción, con concurrencia y cola acotadas.
+
+    Cada trabajo corre en su propio proceso, así que un timeout mata sólo
+    el proceso atascado y no los que están atendiendo otras subidas.
+    """
+
+    def __init__(
+        self,
+        workers: int = EXTRACT_WORKERS,
+        max_pending: int = EXTRACT_MAX_PENDING,
+        timeout_s: float = EXTRACT_TIMEOUT_S,
+    ):
+        self.workers = max(workers, 1)
+        self.max_pending = max(max_pending, self.workers)
+        self.timeout_s = timeout_s
+
+        # Igual que el pool de inferencia: fork donde exista, así los
+        # procesos arrancan sin reimportar la aplicación.
+        methods = mp.get_all_start_methods()
+        self._ctx = mp.get_context("fork" if "fork" in methods else methods[0])
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._running: Optional[asyncio.Semaphore] = None
+        self._procs: set = set()
+
+        self.submitted = 0
+        self.rejected = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.killed = 0
+
+    async def run(self, fn, *args):
+        """Ejecuta `fn(*args)` en un proceso nuevo y devuelve su resultado.
+
+        Lanza `ExtractionSaturated` si la cola está llena, `TimeoutError` si
+        el proceso tarda más de `timeout_s` (el plazo no incluye la espera en
+        la cola) y `BrokenProcessPool` si el proceso muere sin responder.
+        """
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise ExtractionSaturated()
+        try:
+            if self._running is None:
+                self._running = asyncio.Semaphore(self.workers)
+            async with self._running:
+                self.submitted += 1
+                ok, value = await self._ejecutar(fn, args)
+        finally:
+            self._slots.release()
+        if ok:
+            return value
+        if not isinstance(value, ExtractionError):
+            self.failed += 1
+        raise value
+
+    async def _ejecutar(self, fn, args) -> tuple[bool, object]:
+        recv, send = self._ctx.Pipe(duplex=False)
+        proc = self._ctx.Process(target=_trabajo, args=(send, fn, args), daemon=True)
+        proc.start()
+        send.close()
+        self._procs.add(proc)
+        try:
+            # La lectura se hace en un hilo: si el proceso muere o se mata,
+            # recv() recibe EOF y el hilo termina.
+            reply = asyncio.get_running_loop().run_in_executor(None, _recibir, recv)
+            return await asyncio.wait_for(reply, timeout=self.timeout_s)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._matar(proc)
+            raise TimeoutError("La extracción de texto superó el tiempo máximo")
+        except EOFError:
+            self.failed += 1
+            raise BrokenProcessPool("El proceso de extracción terminó sin responder")
+        finally:
+            self._procs.discard(proc)
+            proc.join(timeout=0)
+
+    def _matar(self, proc) -> None:
+        """Mata un proceso (p. ej. atascado en un PDF patológico)."""
+        if proc.is_alive():
+            print(f"[extract] Matando el proceso de extracción {proc.pid}")
+            proc.kill()
+            self.killed += 1
+
+    def shutdown(self) -> None:
+        for proc in list(self._procs):
+            self._matar(proc)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.max_pending - self._slots._value,
+            "running": len(self._procs),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "killed": self.killed,
+            "max_pages": PDF_MAX_PAGES,
+        }
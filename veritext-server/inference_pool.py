@@ -0,0 +1,272 @@
+# veritext-server/inference_pool.py
+"""Pool de procesos para la inferencia del modelo.
+
+Los workers no se crean con fork desde el servidor: para entonces hay
+hilos (write-behind, vigilancia del modelo, threadpool) y un hijo podría
+heredar un lock tomado, p. ej. el de los nombres de `explain`. Se usa
+forkserver (spawn donde no existe) y cada worker carga el modelo con
+`joblib.load(..., mmap_mode="r")` (o el modelo compilado, que ya usa
+memory-mapping), así que los arrays numpy se comparten a través de la
+caché de páginas.
+
+Un lote que supera `timeout_s` no se queda ocupando un worker: se matan
+los workers y se crea un pool nuevo. Los demás lotes que estaban en
+vuelo se reenvían una vez al pool nuevo.
+"""
+from concurrent.futures import CancelledError, Future, InvalidStateError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Optional
+import multiprocessing as mp
+import os
+import threading
+
+from explain import Scored, score_batch
+from preprocess import adaptar_pipeline
+
+
+INFERENCE_WORKERS = int(os.getenv("VERITEXT_INFERENCE_WORKERS", "0"))
+INFERENCE_MAX_PENDING = int(os.getenv("VERITEXT_INFERENCE_MAX_PENDING", "256"))
+INFERENCE_TIMEOUT_S = float(os.getenv("VERITEXT_INFERENCE_TIMEOUT_S", "10"))
+
+
+class PoolSaturated(Exception):
+    """La cola del pool está llena; el llamador debe rechazar la petición."""
+
+
+# Modelo del worker; lo carga `_init_worker` al arrancar el proceso.
+_WORKER_MODEL: Any = None
+
+
+def _init_worker(model_path: str) -> None:
+    global _WORKER_MODEL
+    if os.path.isdir(model_path):
+        from compiled_model import CompiledModel
+
+        _WORKER_MODEL = CompiledModel.load(model_path)
+    else:
+        from joblib import load
+
+        _WORKER_MODEL = load(model_path, mmap_mode="r")
+        adaptar_pipeline(_WORKER_MODEL)
+
+
+def _score_in_worker(texts: list[str]) -> list[Scored]:
+    return score_batch(_WORKER_MODEL, texts)
+
+
+def _contexto():
+    methods = mp.get_all_start_methods()
+    ctx = mp.get_context("forkserver" if "forkserver" in methods else "spawn")
+    if ctx.get_start_method() == "forkserver":
+        # Los workers nacen del forkserver con esto ya importado.
+        ctx.set_forkserver_preload(["inference_pool", "explain", "preprocess", "compiled_model"])
+    return ctx
+
+
+class InferencePool:
+    """ProcessPoolExecutor con cola acotada, timeouts y reinicio tras caídas."""
+
+    def __init__(
+        self,
+        model: Any,
+        model_path: str,
+        workers: int = INFERENCE_WORKERS,
+        max_pending: int = INFERENCE_MAX_PENDING,
+        timeout_s: float = INFERENCE_TIMEOUT_S,
+    ):
+        # `model` ya no se comparte con los workers (cargan `model_path`);
+        # se conserva por compatibilidad con los llamadores.
+        self.model = model
+        self.model_path = model_path
+        self.workers = max(workers, 1)
+        self.max_pending = max(max_pending, 1)
+        self.timeout_s = timeout_s
+
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._jobs: dict[Future, ProcessPoolExecutor] = {}  # lote -> pool donde corre
+        self._closed = False
+
+        self.submitted = 0
+        self.rejected = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.resubmitted = 0
+        self.restarts = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._closed = False
+            ctx = _contexto()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(self.model_path,),
+            )
+            # Un lote vacío por worker: arrancan y cargan el modelo ya, no
+            # con las primeras peticiones.
+            for _ in range(self.workers):
+                self._executor.submit(_score_in_worker, [])
+            print(f"[pool] {self.workers} workers de inferencia ({ctx.get_start_method()})")
+
+    def shutdown(self) -> None:
+        # Fuera del lock: cancelar los lotes encolados ejecuta sus callbacks.
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._closed = True
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._closed or self._executor is not broken:
+                return  # cerrado, o ya lo reinició otro hilo
+            self._executor = None
+            self.restarts += 1
+        print("[pool] Un worker terminó de forma inesperada; reiniciando el pool")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def _kill(self, executor: ProcessPoolExecutor) -> None:
+        """Mata los workers de `executor` (p. ej. uno atascado en un lote)."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self.restarts += 1
+        print("[pool] Un lote superó el tiempo máximo; reiniciando los workers")
+        for p in list((executor._processes or {}).values()):
+            p.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def reload(self, model: Any, model_path: str) -> None:
+        """Sustituye los workers por otros con el modelo nuevo.
+
+        Los lotes ya encolados terminan en los workers anteriores; los
+        nuevos van al pool recién creado.
+        """
+        with self._lock:
+            old = self._executor
+            self.model = model
+            self.model_path = model_path
+            self._executor = None
+        self.start()
+        if old is not None:
+            old.shutdown(wait=False)
+
+    def submit(self, texts: list[str]) -> Future:
+        """Encola un lote y devuelve un Future con un resultado por texto.
+
+        El Future termina con `TimeoutError` si el lote no acaba en
+        `timeout_s`; entonces se matan los workers para liberar el atascado.
+        """
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PoolSaturated()
+
+        outer: Future = Future()
+        outer.set_running_or_notify_cancel()
+        self.submitted += 1
+        timer = threading.Timer(self.timeout_s, self._vencer, (outer,))
+        timer.daemon = True
+
+        def _done(f: Future) -> None:
+            timer.cancel()
+            self._slots.release()
+            if f.exception() is not None:
+                self.failed += 1
+
+        outer.add_done_callback(_done)
+        self._enviar(outer, texts, retries=1)
+        if not outer.done():
+            timer.start()
+        return outer
+
+    def _enviar(self, outer: Future, texts: list[str], retries: int) -> None:
+        try:
+            for attempt in range(2):
+                if self._executor is None:
+                    self.start()
+                executor = self._executor
+                try:
+                    inner = executor.submit(_score_in_worker, texts)
+                    break
+                except BrokenProcessPool:
+                    if attempt:
+                        raise
+                    self._restart(executor)
+                except RuntimeError:
+                    # El executor se cerró (recarga o timeout) entre la
+                    # lectura y el submit; se reintenta con el nuevo.
+                    if attempt or self._executor is executor:
+                        raise
+        except BaseException as e:
+            self._resolver(outer, exc=e)
+            return
+        with self._lock:
+            self._jobs[outer] = executor
+        inner.add_done_callback(partial(self._terminado, outer, texts, executor, retries))
+
+    def _terminado(
+        self, outer: Future, texts: list[str], executor: ProcessPoolExecutor, retries: int, inner: Future
+    ) -> None:
+        if outer.done():
+            return  # ya venció
+        exc = CancelledError() if inner.cancelled() else inner.exception()
+        if isinstance(exc, (BrokenProcessPool, CancelledError)):
+            # Pool roto o matado por el timeout de otro lote: este lote no
+            # tiene la culpa y se reenvía una vez al pool nuevo.
+            if not self._closed:
+                self._restart(executor)
+                if retries:
+                    self.resubmitted += 1
+                    self._enviar(outer, texts, retries - 1)
+                    return
+            if isinstance(exc, CancelledError):
+                exc = BrokenProcessPool("El pool de inferencia se cerró o se reinició")
+        if exc is not None:
+            self._resolver(outer, exc=exc)
+        else:
+            self._resolver(outer, result=inner.result())
+
+    def _vencer(self, outer: Future) -> None:
+        with self._lock:
+            executor = self._jobs.get(outer)
+        if not self._resolver(outer, exc=TimeoutError("El lote superó el tiempo máximo de inferencia")):
+            return
+        self.timeouts += 1
+        if executor is not None:
+            self._kill(executor)
+
+    def _resolver(self, outer: Future, result: Any = None, exc: Optional[BaseException] = None) -> bool:
+        """Termina `outer` si nadie lo hizo antes; devuelve si lo terminó esta llamada."""
+        with self._lock:
+            self._jobs.pop(outer, None)
+        try:
+            if exc is not None:
+                outer.set_exception(exc)
+            else:
+                outer.set_result(result)
+        except InvalidStateError:
+            return False  # lo terminó antes el timeout o el worker
+        return True
+
+    def score(self, texts: list[str]) -> list[Scored]:
+        return self.submit(texts).result()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.max_pending - self._slots._value,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "resubmitted": self.resubmitted,
+            "restarts": self.restarts,
+        }
@@ -0,0 +1,237 @@
+# veritext-server/metrics.py
+"""Métricas de la API en formato de exposición de Prometheus.
+
+Histogramas de duración por etapa del análisis (auth, validación, caché,
+inferencia, guardado) y por petición HTTP, contadores de errores y
+métricas "de lectura" que se calculan al hacer scrape (pool de conexiones,
+estado del modelo, cachés).
+
+Con `VERITEXT_METRICS=0` (por defecto) `etapa()` devuelve un contexto vacío
+compartido y no se instala el middleware, así que el camino caliente no
+mide nada. Sin dependencias: el formato de texto es sencillo y así no hace
+falta `prometheus_client`.
+"""
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Callable, Iterable, Optional, Union
+import os
+import threading
+import time
+
+
+METRICS_ENABLED = os.getenv("VERITEXT_METRICS", "0") == "1"
+
+# Segundos; cubren desde una búsqueda en caché hasta un PDF grande.
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+Number = Union[int, float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(v: Number) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: Number = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                out.append(f"{self.name}{_labels(self.labels, key)} {_fmt(v)}")
+        return out
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # Por etiquetas: [contadores por bucket (no acumulados) + el de +Inf, suma]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(v[0]), v[1]) for k, v in self._series.items())
+        for key, counts, total in series:
+            acc = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le_label = 'le="' + _fmt(le) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.labels, key, le_label)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labels, key)} {_fmt(total)}")
+            out.append(f"{self.name}_count{_labels(self.labels, key)} {acc}")
+        return out
+
+
+class Gauges:
+    """Familia de gauges cuyo valor se lee al hacer scrape.
+
+    `fn` devuelve un número, o un dict {valores de etiquetas: número}.
+    """
+
+    def __init__(self, name: str, help: str, fn: Callable, labels: Iterable[str] = (), kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = tuple(labels)
+        self.kind = kind
+
+    def render(self) -> list[str]:
+        try:
+            values = self.fn()
+        except Exception as e:
+            print(f"[metrics] Error al leer {self.name}:", repr(e))
+            return []
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, v in values.items():
+            if isinstance(v, bool) or v is None:
+                v = int(bool(v))
+            if not isinstance(key, tuple):
+                key = (key,)
+            out.append(f"{self.name}{_labels(self.labels, key)} {_fmt(v)}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "veritext_stage_seconds", "Duración de cada etapa del análisis", ("stage",),
+))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "veritext_stage_errors_total", "Excepciones salidas de cada etapa", ("stage", "error"),
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "veritext_http_request_seconds", "Duración de las peticiones HTTP hasta el último byte",
+    ("method", "route", "status"),
+))
+
+
+class _Timer:
+    __slots__ = ("stage", "t0")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        STAGE_SECONDS.observe(time.perf_counter() - self.t0, self.stage)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(self.stage, exc_type.__name__)
+
+
+_NULL = nullcontext()
+
+
+def etapa(stage: str):
+    """Contexto que mide la etapa `stage`; no hace nada si las métricas están desactivadas."""
+    return _Timer(stage) if METRICS_ENABLED else _NULL
+
+
+def pool_stats(engine) -> Optional[dict]:
+    """Estado del pool de conexiones de SQLAlchemy (QueuePool)."""
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return None
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide cada petición hasta enviar el último byte.
+
+    La etiqueta `route` es la plantilla de la ruta (`/history/{analysis_id}/text`),
+    no la URL, para no crear una serie por id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        t0 = time.perf_counter()
+        status_code = 500
+
+        async def _send(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - t0,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status_code),
+            )
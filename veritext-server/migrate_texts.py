@@ -0,0 +1,73 @@
+# veritext-server/migrate_texts.py
+"""Mueve `analyses.text` de las filas antiguas a la tabla `texts`.
+
+Uso (después de aplicar db/migraciones/004_texts.sql):
+    python migrate_texts.py [--batch 500] [--keep-text]
+
+Recorre los análisis por id en lotes; cada lote es una transacción, así que
+se puede interrumpir y volver a lanzar sin repetir trabajo. Sin
+`--keep-text` vacía `analyses.text` tras copiarlo; después conviene un
+`OPTIMIZE TABLE analyses` para devolver el espacio.
+"""
+import argparse
+import time
+
+from sqlalchemy import bindparam, select, update
+
+from db import engine
+from models import Analysis
+from text_store import guardar_textos
+
+
+def migrar(batch: int = 500, keep_text: bool = False) -> None:
+    last_id = 0
+    moved = 0
+    raw_bytes = 0
+    t0 = time.perf_counter()
+    set_text_id = (
+        update(Analysis)
+        .where(Analysis.id == bindparam("row_id"))
+        .values(text_id=bindparam("tid"))
+    )
+    if not keep_text:
+        set_text_id = set_text_id.values(text=None)
+
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(Analysis.id, Analysis.text)
+                .where(
+                    Analysis.id > last_id,
+                    Analysis.text_id.is_(None),
+                    Analysis.text.is_not(None),
+                )
+                .order_by(Analysis.id)
+                .limit(batch)
+            ).all()
+            if not rows:
+                break
+
+            ids = guardar_textos(conn, [r.text for r in rows])
+            conn.execute(set_text_id, [{"row_id": r.id, "tid": tid} for r, tid in zip(rows, ids)])
+
+        last_id = rows[-1].id
+        moved += len(rows)
+        raw_bytes += sum(len(r.text.encode("utf-8")) for r in rows)
+        print(f"[migrate] {moved} análisis migrados (último id {last_id})")
+
+    print(
+        f"[migrate] Listo: {moved} análisis, {raw_bytes / 1e6:.1f} MB de texto "
+        f"en {time.perf_counter() - t0:.1f}s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Migra los textos de analyses a la tabla texts")
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--keep-text", action="store_true", help="no vaciar analyses.text tras copiarlo")
+    args = parser.parse_args()
+    migrar(batch=args.batch, keep_text=args.keep_text)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,10 @@
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
-import joblib, os, re
+import hashlib, joblib, os
+
+from explain import score_batch
+from preprocess import normalize_text
 
 MODEL_PATH = "model.joblib"
 
@@ -23,10 +26,13 @@ ai_texts = [
     "El informe integra definiciones, categorizaciones y una visión holística del fenómeno.",
 ]
 
-def normalize_text(t: str) -> str:
-    t = t.lower()
-    t = re.sub(r"\s+", " ", t)
-    return t.strip()
+def model_file_version(path: str) -> str:
+    """Huella corta del fichero del modelo; cambia con cada reentrenamiento."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:12]
 
 def build_or_load_model() -> Pipeline:
     if os.path.exists(MODEL_PATH):
@@ -42,23 +48,9 @@ def build_or_load_model() -> Pipeline:
     return pipe
 
 def get_top_influential_words(pipe: Pipeline, text: str, top_k: int = 8) -> List[str]:
-    tfidf = pipe.named_steps["tfidf"]
-    clf: LogisticRegression = pipe.named_steps["clf"]
-    vocab = tfidf.get_feature_names_out()
-    X_text = tfidf.transform([text])
-    coefs = clf.coef_[0]
-    scores = (X_text.toarray()[0]) * coefs
-    idx_sorted = scores.argsort()[::-1]
-    words = []
-    for idx in idx_sorted:
-        if X_text.toarray()[0][idx] > 0:
-            words.append(vocab[idx])
-        if len(words) >= top_k:
-            break
-    return words
+    return score_batch(pipe, [text], k=top_k)[0][1]
 
 def score_text(pipe: Pipeline, text: str) -> Tuple[float, List[str]]:
     t = normalize_text(text)
-    prob = pipe.predict_proba([t])[0][1]
-    top_words = get_top_influential_words(pipe, t, top_k=8)
-    return float(prob), top_words
+    prob, top_words, _ = score_batch(pipe, [t], k=8)[0]
+    return prob, top_words
@@ -0,0 +1,212 @@
+# veritext-server/model_store.py
+"""Ciclo de vida del modelo servido: carga, calentamiento y recarga en caliente.
+
+El modelo activo se guarda como una única tupla `(modelo, versión, origen)`
+que se reemplaza de golpe, así que una petición nunca ve un modelo de una
+versión con la etiqueta de otra. La recarga lee y calienta el modelo nuevo
+mientras el anterior sigue atendiendo peticiones.
+"""
+from typing import Any, Callable, Optional
+import json
+import os
+import threading
+import time
+
+from compiled_model import META_FILE, CompiledModel
+from model import model_file_version
+from preprocess import adaptar_pipeline
+
+
+MODEL_PATH = os.getenv("VERITEXT_MODEL_PATH", "model.joblib")
+# Si existe el modelo exportado con export_model.py se sirve ese: carga en
+# milisegundos y sus arrays quedan mapeados en memoria.
+COMPILED_MODEL_DIR = os.getenv("VERITEXT_COMPILED_MODEL_DIR", "model_compiled")
+# Intervalo de sondeo de los ficheros del modelo; 0 desactiva la vigilancia.
+MODEL_WATCH_S = float(os.getenv("VERITEXT_MODEL_WATCH_S", "0"))
+
+WARMUP_TEXTS = [
+    "Texto de calentamiento para el modelo.",
+    "El presente documento sintetiza hallazgos relevantes de fuentes secundarias.",
+    "Hoy fui a la universidad y conversé con mis compañeros sobre el proyecto. " * 20,
+]
+
+
+class ModelStore:
+    def __init__(self, model_path: str = MODEL_PATH, compiled_dir: str = COMPILED_MODEL_DIR):
+        self.model_path = model_path
+        self.compiled_dir = compiled_dir
+
+        self._active: Optional[tuple[Any, str, str]] = None
+        # ((ruta, tamaño, mtime), versión) del último model.joblib cuya huella se calculó.
+        self._joblib_seen: Optional[tuple[tuple[str, int, int], str]] = None
+        self._load_lock = threading.Lock()
+        self._listeners: list[Callable[[Any, str, str], None]] = []
+
+        self._watch_thread: Optional[threading.Thread] = None
+        self._watch_stop = threading.Event()
+
+        self.loaded_at: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+
+    # ---------------- estado ----------------
+
+    @property
+    def ready(self) -> bool:
+        return self._active is not None
+
+    @property
+    def version(self) -> Optional[str]:
+        active = self._active
+        return active[1] if active else None
+
+    @property
+    def source(self) -> Optional[str]:
+        active = self._active
+        return active[2] if active else None
+
+    def snapshot(self) -> tuple[Any, str, str]:
+        """Modelo, versión y origen activos, cargando el modelo si hace falta."""
+        if self._active is None:
+            with self._load_lock:
+                if self._active is None:
+                    try:
+                        new = self._read()
+                    except Exception as e:
+                        self.last_error = repr(e)
+                        raise
+                    self._swap(*new)
+        return self._active
+
+    def get(self) -> Any:
+        return self.snapshot()[0]
+
+    def on_swap(self, fn: Callable[[Any, str, str], None]) -> None:
+        """Registra una función que se llama con cada modelo nuevo antes de publicarlo."""
+        self._listeners.append(fn)
+
+    # ---------------- carga ----------------
+
+    def _compiled_meta(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.compiled_dir, META_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _joblib_version(self, meta: Optional[dict] = None) -> str:
+        """Versión de model.joblib sin leerlo entero mientras no cambie.
+
+        La huella (sha1 del fichero) sólo se calcula si el tamaño o el mtime
+        no coinciden con los de la última vez ni con los que anotó
+        export_model.py en `meta`.
+        """
+        st = os.stat(self.model_path)
+        key = (self.model_path, st.st_size, st.st_mtime_ns)
+        if self._joblib_seen is not None and self._joblib_seen[0] == key:
+            return self._joblib_seen[1]
+        if meta and (meta.get("source_size"), meta.get("source_mtime_ns")) == key[1:]:
+            version = meta["source_version"]
+        else:
+            version = model_file_version(self.model_path)
+        self._joblib_seen = (key, version)
+        return version
+
+    def _disk_version(self) -> str:
+        meta = self._compiled_meta()
+        if os.path.exists(self.model_path):
+            return self._joblib_version(meta)
+        if meta is None:
+            raise FileNotFoundError(self.model_path)
+        return meta["source_version"]
+
+    def _load_compiled(self) -> Optional[CompiledModel]:
+        """Devuelve el modelo compilado si existe y corresponde a model.joblib."""
+        if not os.path.exists(os.path.join(self.compiled_dir, META_FILE)):
+            return None
+        compiled = CompiledModel.load(self.compiled_dir)
+        if os.path.exists(self.model_path) and compiled.version != self._joblib_version(compiled.meta):
+            print("[model] model_compiled no corresponde a model.joblib; vuelve a ejecutar export_model.py")
+            return None
+        return compiled
+
+    def _read(self) -> tuple[Any, str, str]:
+        t0 = time.perf_counter()
+        compiled = self._load_compiled()
+        if compiled is not None:
+            model, version, source = compiled, compiled.version, self.compiled_dir
+        else:
+            from joblib import load
+
+            model = load(self.model_path)
+            adaptar_pipeline(model)
+            version, source = self._joblib_version(), self.model_path
+
+        # Unas predicciones de prueba calientan cachés y páginas mapeadas
+        # antes de que el modelo reciba tráfico real.
+        model.predict_proba(WARMUP_TEXTS)
+        model.predict_proba(WARMUP_TEXTS[:1])
+
+        self.load_seconds = time.perf_counter() - t0
+        print(f"[model] Modelo {version} cargado desde {source} en {self.load_seconds:.2f}s")
+        return model, version, source
+
+    def _swap(self, model: Any, version: str, source: str) -> None:
+        for fn in self._listeners:
+            fn(model, version, source)
+        self._active = (model, version, source)
+        self.loaded_at = time.time()
+        self.last_error = None
+
+    def reload(self, force: bool = False) -> bool:
+        """Carga el modelo del disco y lo activa si cambió. Devuelve si hubo cambio."""
+        with self._load_lock:
+            try:
+                if not force and self._active is not None and self._disk_version() == self._active[1]:
+                    return False
+                new = self._read()
+            except Exception as e:
+                self.last_error = repr(e)
+                raise
+            self._swap(*new)
+            self.reloads += 1
+            return True
+
+    # ---------------- vigilancia de ficheros ----------------
+
+    def _fingerprint(self) -> tuple:
+        out = []
+        for p in (self.model_path, os.path.join(self.compiled_dir, META_FILE)):
+            try:
+                st = os.stat(p)
+                out.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                out.append(None)
+        return tuple(out)
+
+    def start_watch(self, interval_s: float = MODEL_WATCH_S) -> None:
+        if interval_s <= 0 or self._watch_thread is not None:
+            return
+
+        def _loop() -> None:
+            seen = self._fingerprint()
+            while not self._watch_stop.wait(interval_s):
+                current = self._fingerprint()
+                if current == seen:
+                    continue
+                # Se espera a que el fichero deje de cambiar (copia en curso).
+                if self._watch_stop.wait(interval_s) or self._fingerprint() != current:
+                    continue
+                seen = current
+                try:
+                    if self.reload():
+                        print("[model] Recarga automática completada:", self.version)
+                except Exception as e:
+                    print("[model] Error en la recarga automática:", repr(e))
+
+        self._watch_thread = threading.Thread(target=_loop, name="veritext-model-watch", daemon=True)
+        self._watch_thread.start()
+
+    def stop_watch(self) -> None:
+        self._watch_stop.set()
@@ -1,17 +1,22 @@
 from datetime import datetime
 
-from sqlalchemy import BigInteger, String, func, ForeignKey, Text, Float
+from sqlalchemy import BigInteger, String, func, ForeignKey, Text, Float, Index, Integer, LargeBinary
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.dialects.mysql import DATETIME
+from sqlalchemy.dialects.mysql import DATETIME, MEDIUMBLOB
 
 from db import Base
 
 
+# BIGINT en MySQL. En SQLite (benchmark.py) la clave autoincremental tiene
+# que ser INTEGER para que sea alias del rowid.
+BigId = BigInteger().with_variant(Integer, "sqlite")
+
+
 class User(Base):
     __tablename__ = "users"
 
     id: Mapped[int] = mapped_column(
-        BigInteger, primary_key=True, autoincrement=True
+        BigId, primary_key=True, autoincrement=True
     )
     email: Mapped[str] = mapped_column(
         String(191), unique=True, nullable=False, index=True
@@ -19,7 +24,10 @@ class User(Base):
     password_hash: Mapped[str] = mapped_column(String(255), nullable=False)
 
 
-    token: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    # Se busca por token en cada petición autenticada.
+    token: Mapped[str | None] = mapped_column(
+        String(128), nullable=True, unique=True, index=True
+    )
 
 
     created_at: Mapped[datetime] = mapped_column(
@@ -31,27 +39,69 @@ class User(Base):
 
 class Analysis(Base):
     __tablename__ = "analyses"
+    __table_args__ = (
+        Index("ix_analyses_hash_version", "text_hash", "model_version"),
+        # Páginas de /history: (user_id, created_at) y el id implícito de
+        # InnoDB cubren el orden (created_at, id) del cursor.
+        Index("ix_analyses_user_created", "user_id", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(
-        BigInteger, primary_key=True, autoincrement=True
+        BigId, primary_key=True, autoincrement=True
     )
     user_id: Mapped[int | None] = mapped_column(
-        BigInteger,
+        BigId,
         ForeignKey("users.id"),
         nullable=True,
         index=True,
     )
 
-    text: Mapped[str] = mapped_column(Text, nullable=False)
+    # Sólo filas anteriores a la tabla `texts`; las nuevas guardan el texto
+    # comprimido en `texts` y apuntan a él con `text_id`. Diferida para que
+    # listar análisis no cargue el texto.
+    text: Mapped[str | None] = mapped_column(Text, nullable=True, deferred=True)
+    text_id: Mapped[str | None] = mapped_column(
+        String(64), ForeignKey("texts.id"), nullable=True, index=True
+    )
+
+    # sha256 del texto normalizado; clave de la caché de resultados.
+    text_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    model_version: Mapped[str | None] = mapped_column(String(32), nullable=True)
 
 
     score: Mapped[float] = mapped_column(Float, nullable=False)
 
 
     top_words: Mapped[str | None] = mapped_column(Text, nullable=True)
+    top_words_human: Mapped[str | None] = mapped_column(Text, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(
         DATETIME(fsp=6), server_default=func.now(), nullable=False
     )
 
     user = relationship("User", back_populates="analyses")
+
+
+class TextBlob(Base):
+    """Texto enviado, comprimido y direccionado por su sha256."""
+
+    __tablename__ = "texts"
+    __table_args__ = (
+        # Sincronización incremental del índice de casi duplicados.
+        Index("ix_texts_created_at", "created_at"),
+    )
+
+    # sha256 del texto original (no del normalizado): se guarda una vez
+    # aunque se analice muchas veces.
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    codec: Mapped[str] = mapped_column(String(8), nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    data: Mapped[bytes] = mapped_column(
+        LargeBinary().with_variant(MEDIUMBLOB(), "mysql"), nullable=False
+    )
+    # Firma MinHash (ver near_dup.py); NULL si no se calculó.
+    minhash: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DATETIME(fsp=6), server_default=func.now(), nullable=False
+    )
@@ -0,0 +1,228 @@
+# veritext-server/near_dup.py
+"""Índice MinHash/LSH de textos casi duplicados.
+
+La caché exacta no reconoce un ensayo al que se le han cambiado unas pocas
+palabras. Aquí cada texto se resume en una firma MinHash sobre sus
+3-gramas de palabras; dos textos con Jaccard alto tienen firmas casi
+iguales. El índice LSH parte la firma en bandas y sólo compara con los
+textos que coinciden en alguna banda, así que una consulta no recorre todo
+el histórico.
+
+Las firmas se guardan en `texts.minhash`, así que el índice es persistente:
+al arrancar se carga desde la base de datos y un hilo incorpora las filas
+nuevas (también las de otros procesos). `python near_dup.py` calcula las
+firmas que falten, p. ej. tras migrar textos antiguos.
+
+Uso desde la API con `VERITEXT_NEARDUP`:
+  - "off" (por defecto): desactivado.
+  - "report": se informa del casi duplicado en la respuesta.
+  - "reuse": además se reutiliza su resultado si es un análisis del mismo
+    usuario y del mismo modelo.
+"""
+from datetime import timedelta
+from typing import Iterable, Optional, Union
+import os
+import threading
+import zlib
+
+import numpy as np
+
+from preprocess import Documento, preparar
+
+
+NEARDUP_MODE = os.getenv("VERITEXT_NEARDUP", "off")
+NEARDUP_ENABLED = NEARDUP_MODE in ("report", "reuse")
+# Jaccard estimado mínimo para considerar dos textos casi iguales.
+NEARDUP_THRESHOLD = float(os.getenv("VERITEXT_NEARDUP_THRESHOLD", "0.85"))
+NEARDUP_SYNC_S = float(os.getenv("VERITEXT_NEARDUP_SYNC_S", "30"))
+# `created_at` lo pone la base de datos al insertar, no al confirmar: una
+# fila de otro worker o del write-behind puede aparecer con un instante
+# anterior al ya sincronizado. Cada sincronización vuelve a leer este margen.
+NEARDUP_SYNC_LAG_S = float(os.getenv("VERITEXT_NEARDUP_SYNC_LAG_S", "300"))
+
+NUM_PERM = 64
+BANDS = 16  # 16 bandas de 4 filas: candidatos a partir de Jaccard ~0.5
+SHINGLE = 3
+_SEED = 1234
+_P = (1 << 31) - 1
+_MAX_ROWS = 4096  # shingles por bloque al calcular la firma
+
+_rng = np.random.RandomState(_SEED)
+_A = _rng.randint(1, _P, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, _P, size=NUM_PERM).astype(np.uint64)
+
+
+def firma(txt: Union[str, Documento]) -> Optional[np.ndarray]:
+    """Firma MinHash (uint32[NUM_PERM]) del texto, o None si no tiene palabras."""
+    words = preparar(txt).words
+    if not words:
+        return None
+    shingles = {" ".join(words[i:i + SHINGLE]) for i in range(max(1, len(words) - SHINGLE + 1))}
+    # crc32 es estable entre procesos (a diferencia de hash()), así que las
+    # firmas guardadas siguen valiendo tras reiniciar.
+    x = np.fromiter((zlib.crc32(s.encode("utf-8")) & _P for s in shingles), dtype=np.uint64, count=len(shingles))
+    sig = np.full(NUM_PERM, _P, dtype=np.uint64)
+    for start in range(0, len(x), _MAX_ROWS):
+        block = (np.outer(x[start:start + _MAX_ROWS], _A) + _B) % _P
+        np.minimum(sig, block.min(axis=0), out=sig)
+    return sig.astype(np.uint32)
+
+
+def firma_bytes(txt: Union[str, Documento]) -> Optional[bytes]:
+    sig = firma(txt)
+    return None if sig is None else sig.tobytes()
+
+
+class NearDupIndex:
+    """LSH en memoria: banda -> posiciones, y la matriz de firmas."""
+
+    def __init__(self, num_perm: int = NUM_PERM, bands: int = BANDS):
+        self.rows = num_perm // bands
+        self.bands = bands
+        self._buckets: list[dict[bytes, list[int]]] = [{} for _ in range(bands)]
+        self._keys: list[str] = []
+        self._pos: dict[str, int] = {}
+        self._sigs = np.empty((1024, num_perm), dtype=np.uint32)
+        self._lock = threading.RLock()
+
+        self.watermark = None  # created_at de la última fila sincronizada
+        self.loaded = False
+        self.queries = 0
+        self.matches = 0
+        self._sync_thread: Optional[threading.Thread] = None
+        self._sync_stop = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _band_keys(self, sig: np.ndarray) -> Iterable[tuple[int, bytes]]:
+        r = self.rows
+        for b in range(self.bands):
+            yield b, sig[b * r:(b + 1) * r].tobytes()
+
+    def add(self, key: str, sig: np.ndarray) -> None:
+        with self._lock:
+            if key in self._pos:
+                return
+            n = len(self._keys)
+            if n == len(self._sigs):
+                self._sigs = np.concatenate([self._sigs, np.empty_like(self._sigs)])
+            self._sigs[n] = sig
+            self._keys.append(key)
+            self._pos[key] = n
+            for b, bk in self._band_keys(sig):
+                self._buckets[b].setdefault(bk, []).append(n)
+
+    def query(self, sig: np.ndarray, threshold: float = NEARDUP_THRESHOLD) -> Optional[tuple[str, float]]:
+        """Clave y similitud estimada del texto indexado más parecido, si supera el umbral."""
+        with self._lock:
+            self.queries += 1
+            cands: set[int] = set()
+            for b, bk in self._band_keys(sig):
+                cands.update(self._buckets[b].get(bk, ()))
+            if not cands:
+                return None
+            idx = np.fromiter(cands, dtype=np.int64, count=len(cands))
+            sims = (self._sigs[idx] == sig).mean(axis=1)
+            best = int(np.argmax(sims))
+            if sims[best] < threshold:
+                return None
+            self.matches += 1
+            return self._keys[idx[best]], float(sims[best])
+
+    # ---------------- persistencia ----------------
+
+    def sync(self, engine, lag_s: float = NEARDUP_SYNC_LAG_S) -> int:
+        """Incorpora las firmas de `texts` creadas desde la última sincronización.
+
+        Se relee el margen `lag_s` anterior a la marca para no perder filas
+        confirmadas tarde; `add` ignora las que ya están en el índice.
+        """
+        from sqlalchemy import select
+        from models import TextBlob
+
+        stmt = select(TextBlob.id, TextBlob.minhash, TextBlob.created_at).where(TextBlob.minhash.is_not(None))
+        if self.watermark is not None:
+            stmt = stmt.where(TextBlob.created_at >= self.watermark - timedelta(seconds=lag_s))
+        added = 0
+        with engine.connect() as conn:
+            for row in conn.execution_options(yield_per=5000).execute(stmt.order_by(TextBlob.created_at)):
+                before = len(self)
+                self.add(row.id, np.frombuffer(row.minhash, dtype=np.uint32))
+                added += len(self) - before
+                if self.watermark is None or row.created_at > self.watermark:
+                    self.watermark = row.created_at
+        self.loaded = True
+        return added
+
+    def start_sync(self, engine, interval_s: float = NEARDUP_SYNC_S) -> None:
+        if self._sync_thread is not None:
+            return
+
+        def _loop() -> None:
+            wait = 0.0
+            while not self._sync_stop.wait(wait):
+                try:
+                    added = self.sync(engine)
+                    if added and wait == 0.0:
+                        print(f"[neardup] Índice cargado: {added} textos")
+                except Exception as e:
+                    print("[neardup] Error al sincronizar el índice:", repr(e))
+                if interval_s <= 0:
+                    return
+                wait = interval_s
+
+        self._sync_thread = threading.Thread(target=_loop, name="veritext-neardup-sync", daemon=True)
+        self._sync_thread.start()
+
+    def stop_sync(self) -> None:
+        self._sync_stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": NEARDUP_MODE,
+                "threshold": NEARDUP_THRESHOLD,
+                "loaded": self.loaded,
+                "size": len(self._keys),
+                "queries": self.queries,
+                "matches": self.matches,
+            }
+
+
+def reconstruir(batch: int = 500) -> None:
+    """Calcula `texts.minhash` para los textos que no lo tengan."""
+    from sqlalchemy import bindparam, select, update
+
+    from db import engine
+    from models import TextBlob
+    from text_store import descomprimir
+
+    set_sig = update(TextBlob).where(TextBlob.id == bindparam("tid")).values(minhash=bindparam("sig"))
+    done = 0
+    last = ""
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(TextBlob.id, TextBlob.codec, TextBlob.data)
+                .where(TextBlob.id > last, TextBlob.minhash.is_(None))
+                .order_by(TextBlob.id)
+                .limit(batch)
+            ).all()
+            if not rows:
+                break
+            params = [
+                {"tid": r.id, "sig": firma_bytes(descomprimir(r.codec, r.data))}
+                for r in rows
+            ]
+            params = [p for p in params if p["sig"] is not None]
+            if params:
+                conn.execute(set_sig, params)
+        last = rows[-1].id
+        done += len(rows)
+        print(f"[neardup] {done} textos procesados")
+    print("[neardup] Firmas al día")
+
+
+if __name__ == "__main__":
+    reconstruir()
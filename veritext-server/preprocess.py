@@ -0,0 +1,141 @@
+# veritext-server/preprocess.py
+"""Preprocesado único del texto, compartido por entrenamiento y servicio.
+
+`preparar` normaliza y tokeniza el texto una sola vez y devuelve un
+`Documento` que reutilizan la validación (conteo de palabras), la caché
+(hash del texto normalizado), el vectorizador y la explicación.
+
+La tokenización es la misma que la de `TfidfVectorizer` por defecto
+(minúsculas y `(?u)\\b\\w\\w+\\b`): las palabras son las secuencias de
+`\\w`, y los tokens del modelo son las de dos caracteres o más. Así un
+modelo entrenado con `Analizador` y uno entrenado con el analizador por
+defecto ven exactamente los mismos términos.
+"""
+from collections import deque
+from typing import Iterator, Union
+import re
+
+
+WORD_RE = re.compile(r"\w+")
+
+# Patrón del vectorizador de sklearn equivalente a `Documento.tokens`.
+SKLEARN_TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+
+
+def normalize_text(t: str) -> str:
+    t = t.lower()
+    t = re.sub(r"\s+", " ", t)
+    return t.strip()
+
+
+class Documento:
+    __slots__ = ("raw", "normalized", "words", "_tokens", "_ngrams")
+
+    def __init__(self, raw: str):
+        self.raw = raw
+        self.normalized = normalize_text(raw)
+        self.words: list[str] = WORD_RE.findall(self.normalized)
+        self._tokens: Union[list[str], None] = None
+        self._ngrams: dict[tuple[int, int], list[str]] = {}
+
+    def __reduce__(self):
+        # Entre procesos viaja sólo el texto; se retokeniza al otro lado.
+        return (Documento, (self.raw,))
+
+    @property
+    def word_count(self) -> int:
+        return len(self.words)
+
+    @property
+    def tokens(self) -> list[str]:
+        if self._tokens is None:
+            self._tokens = [w for w in self.words if len(w) > 1]
+        return self._tokens
+
+    def ngrams(self, ngram_range: tuple[int, int] = (1, 2)) -> list[str]:
+        """Mismos n-gramas que `TfidfVectorizer._word_ngrams`."""
+        out = self._ngrams.get(ngram_range)
+        if out is None:
+            out = self._ngrams[ngram_range] = word_ngrams(self.tokens, ngram_range)
+        return out
+
+
+def preparar(txt: Union[str, Documento]) -> Documento:
+    return txt if isinstance(txt, Documento) else Documento(txt)
+
+
+def ventanas(raw: str, size: int, stride: int) -> Iterator[tuple[int, int]]:
+    """Posiciones (inicio, fin) en `raw` de ventanas de `size` palabras que
+    avanzan `stride` palabras; con `stride < size` se solapan.
+
+    Se recorre el texto con un iterador de coincidencias y sólo se guardan
+    las posiciones de la ventana actual, no las de todo el documento.
+    """
+    stride = max(1, min(stride, size))
+    spans: deque = deque()
+    pending = 0  # palabras nuevas desde la última ventana emitida
+    emitted = False
+    for m in WORD_RE.finditer(raw):
+        spans.append(m.span())
+        pending += 1
+        if len(spans) > size:
+            spans.popleft()
+        if len(spans) == size and (not emitted or pending >= stride):
+            yield spans[0][0], spans[-1][1]
+            emitted, pending = True, 0
+    # Cola final (o texto más corto que una ventana).
+    if spans and (not emitted or pending):
+        yield spans[0][0], spans[-1][1]
+
+
+def word_ngrams(tokens: list[str], ngram_range: tuple[int, int]) -> list[str]:
+    min_n, max_n = ngram_range
+    if max_n == 1:
+        return tokens
+    out = list(tokens) if min_n == 1 else []
+    for n in range(max(min_n, 2), max_n + 1):
+        for i in range(len(tokens) - n + 1):
+            out.append(" ".join(tokens[i:i + n]))
+    return out
+
+
+class Analizador:
+    """Analizador para `TfidfVectorizer(analyzer=...)`.
+
+    Acepta tanto texto como `Documento`; con un `Documento` reutiliza sus
+    n-gramas en lugar de volver a tokenizar.
+    """
+
+    def __init__(self, ngram_range: tuple[int, int] = (1, 2)):
+        self.ngram_range = tuple(ngram_range)
+
+    def __call__(self, doc: Union[str, Documento]) -> list[str]:
+        return preparar(doc).ngrams(self.ngram_range)
+
+
+def es_analizador_compatible(tfidf) -> bool:
+    """Si el vectorizador tokeniza igual que `Documento` y puede consumirlo."""
+    if isinstance(tfidf.analyzer, Analizador):
+        return True
+    return (
+        tfidf.analyzer == "word"
+        and tfidf.lowercase
+        and tfidf.token_pattern == SKLEARN_TOKEN_PATTERN
+        and tfidf.tokenizer is None
+        and tfidf.preprocessor is None
+        and tfidf.stop_words is None
+        and tfidf.strip_accents is None
+    )
+
+
+def adaptar_pipeline(pipe) -> None:
+    """Hace que un Pipeline entrenado con el analizador por defecto consuma
+    `Documento` sin retokenizar.
+
+    Sólo se cambia el analizador en memoria cuando es equivalente, así que
+    el vocabulario y los IDF siguen siendo válidos.
+    """
+    tfidf = pipe.named_steps["tfidf"]
+    if isinstance(tfidf.analyzer, Analizador) or not es_analizador_compatible(tfidf):
+        return
+    tfidf.analyzer = Analizador(tfidf.ngram_range)
@@ -0,0 +1,149 @@
+# veritext-server/profiling.py
+"""Perfilado bajo demanda de peticiones concretas.
+
+Algunas peticiones lentas sólo aparecen con entradas muy particulares. Una
+petición se perfila con cProfile si:
+  - trae `X-Profile: 1` junto con un `X-Admin-Token` válido, o
+  - sale elegida por muestreo (`VERITEXT_PROFILE_SAMPLE`, fracción 0-1).
+
+Cada perfil se guarda como `<nombre>.prof` (formato de pstats, se abre con
+snakeviz o `python -m pstats`) más `<nombre>.json` con la ruta, el tamaño de
+la entrada y la duración. El directorio es un búfer circular: sólo se
+conservan los `VERITEXT_PROFILE_KEEP` más recientes.
+
+cProfile sólo ve el hilo de la petición: con el micro-batching o el pool
+de inferencia activos, la predicción aparece como espera. En modo async
+(VERITEXT_DB_ASYNC=1) no se perfila, porque en el bucle de eventos el
+perfil mezclaría varias peticiones.
+
+Las peticiones que no se perfilan sólo pagan una comparación. Se perfila
+una petición a la vez: cProfile no admite dos perfiladores activos en
+Python 3.12+, y así el perfilado tampoco puede acaparar el servidor.
+"""
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Iterator, Optional
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+
+PROFILE_SAMPLE = float(os.getenv("VERITEXT_PROFILE_SAMPLE", "0"))
+PROFILE_DIR = os.getenv("VERITEXT_PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.getenv("VERITEXT_PROFILE_KEEP", "50"))
+
+# <fecha>T<hora con milisegundos>-<ruta>-<aleatorio>: ordenar por nombre es ordenar por fecha.
+_NAME_RE = re.compile(r"^[0-9]{8}T[0-9]{9}-[a-z_]+-[0-9a-f]{6}$")
+_NULL = nullcontext()
+
+
+class Profiler:
+    def __init__(self, directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP, sample: float = PROFILE_SAMPLE):
+        self.directory = Path(directory)
+        self.keep = max(keep, 1)
+        self.sample = sample
+        self._busy = threading.Lock()
+        self._files_lock = threading.Lock()
+
+        self.recorded = 0
+        self.skipped_busy = 0
+
+    def perfilar(self, route: str, input_size: int, forced: bool = False):
+        """Contexto que perfila el bloque si la petición está elegida."""
+        if not forced and not (self.sample > 0 and random.random() < self.sample):
+            return _NULL
+        return self._perfilar(route, input_size, "header" if forced else "sample")
+
+    @contextmanager
+    def _perfilar(self, route: str, input_size: int, reason: str) -> Iterator[None]:
+        if not self._busy.acquire(blocking=False):
+            self.skipped_busy += 1
+            yield
+            return
+        prof = cProfile.Profile()
+        error: Optional[str] = None
+        t0 = time.perf_counter()
+        try:
+            prof.enable()
+            try:
+                yield
+            finally:
+                prof.disable()
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - t0
+            self._busy.release()
+            try:
+                self._guardar(prof, {
+                    "route": route,
+                    "input_size": input_size,
+                    "reason": reason,
+                    "duration_ms": round(elapsed * 1000, 2),
+                    "error": error,
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                })
+            except OSError as e:
+                print("[profile] No se pudo guardar el perfil:", repr(e))
+
+    def _guardar(self, prof: cProfile.Profile, meta: dict) -> None:
+        now = time.time()
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(now)) + f"{int(now * 1000) % 1000:03d}"
+        name = f"{stamp}-{meta['route']}-{os.urandom(3).hex()}"
+        meta["name"] = name
+        with self._files_lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            prof.dump_stats(self.directory / f"{name}.prof")
+            (self.directory / f"{name}.json").write_text(json.dumps(meta), encoding="utf-8")
+            self.recorded += 1
+            for old in self._nombres()[:-self.keep]:
+                for ext in (".prof", ".json"):
+                    (self.directory / f"{old}{ext}").unlink(missing_ok=True)
+        print(f"[profile] Perfil {name} guardado ({meta['duration_ms']} ms)")
+
+    def _nombres(self) -> list[str]:
+        """Perfiles en disco, del más antiguo al más reciente."""
+        if not self.directory.is_dir():
+            return []
+        return sorted(p.stem for p in self.directory.glob("*.json") if _NAME_RE.match(p.stem))
+
+    def listar(self) -> list[dict]:
+        out = []
+        for name in reversed(self._nombres()):
+            try:
+                out.append(json.loads((self.directory / f"{name}.json").read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        return out
+
+    def ruta(self, name: str) -> Optional[Path]:
+        """Fichero .prof del perfil `name`, o None si no existe (o el nombre no es válido)."""
+        if not _NAME_RE.match(name):
+            return None
+        path = self.directory / f"{name}.prof"
+        return path if path.is_file() else None
+
+    def resumen(self, name: str, limit: int = 40, sort: str = "cumulative") -> Optional[str]:
+        """Las `limit` funciones más costosas del perfil, en texto."""
+        path = self.ruta(name)
+        if path is None:
+            return None
+        buf = io.StringIO()
+        pstats.Stats(str(path), stream=buf).strip_dirs().sort_stats(sort).print_stats(limit)
+        return buf.getvalue()
+
+    def stats(self) -> dict:
+        return {
+            "sample": self.sample,
+            "keep": self.keep,
+            "recorded": self.recorded,
+            "skipped_busy": self.skipped_busy,
+            "stored": len(self._nombres()),
+        }
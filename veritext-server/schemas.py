@@ -1,4 +1,6 @@
 from datetime import datetime
+from typing import Optional
+
 from pydantic import BaseModel, EmailStr
 
 
@@ -27,10 +29,32 @@ class AnalyzeReq(BaseModel):
     text: str
 
 
+class NearDuplicate(BaseModel):
+    similarity: float
+    # Si el análisis parecido es del propio usuario; sólo entonces se da su id.
+    own: bool
+    analysis_id: Optional[int] = None
+    # Si el resultado devuelto es el del análisis parecido.
+    reused: bool = False
+
+
 class AnalyzeRes(BaseModel):
     score: float
     buckets: dict[str, float]
+    # Términos que más empujan hacia IA y hacia humano, en ese orden.
     top_words: list[str]
+    top_words_human: list[str] = []
+    near_duplicate: Optional[NearDuplicate] = None
+
+
+class AnalyzeBatchItem(BaseModel):
+    index: int
+    ok: bool
+    score: Optional[float] = None
+    buckets: Optional[dict[str, float]] = None
+    top_words: Optional[list[str]] = None
+    top_words_human: Optional[list[str]] = None
+    error: Optional[str] = None
 
 
 class HistoryItem(BaseModel):
@@ -43,3 +67,7 @@ class HistoryItem(BaseModel):
 
         from_attributes = True
 
+
+class AnalysisTextRes(BaseModel):
+    id: int
+    text: str
@@ -0,0 +1,290 @@
+# veritext-server/score_corpus.py
+"""Puntúa un corpus completo sin pasar por la API.
+
+Uso:
+    python score_corpus.py corpus.csv --out resultados.jsonl
+    python score_corpus.py corpus.jsonl --out resultados.csv --text-col body --id-col doc_id
+    python score_corpus.py corpus_parquet/ --out resultados.jsonl --workers 8 --resume
+
+Lee CSV, JSONL o Parquet (un fichero o un directorio de fragmentos) por
+lotes, los puntúa en el pool de procesos de inferencia (el mismo modelo,
+preprocesado y explicación que el servidor) y escribe cada resultado en
+cuanto su lote termina, en el orden de entrada. La memoria está acotada: en
+vuelo hay como mucho `2 x workers` lotes.
+
+Tras cada lote escrito se guarda `<salida>.ckpt` con las filas hechas y el
+tamaño de la salida. Con `--resume` se trunca la salida a ese tamaño (por
+si el proceso murió a mitad de una línea) y se sigue desde esa fila.
+"""
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Iterator, Optional
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+from explain import score_batch
+from inference_pool import InferencePool
+from model_store import COMPILED_MODEL_DIR, MODEL_PATH, ModelStore
+
+
+OUT_FIELDS = ("id", "score", "top_words", "top_words_human", "model_version", "error")
+
+
+# ---------------- lectura ----------------
+
+def _formato(path: Path) -> str:
+    if path.is_dir() or path.suffix == ".parquet":
+        return "parquet"
+    if path.suffix in (".jsonl", ".ndjson"):
+        return "jsonl"
+    return "csv"
+
+
+def _leer_csv(path: Path, text_col: str, id_col: Optional[str], batch: int):
+    import pandas as pd
+
+    cols = [text_col] + ([id_col] if id_col else [])
+    for chunk in pd.read_csv(path, usecols=cols, chunksize=batch, dtype=str, keep_default_na=False):
+        yield chunk[text_col].tolist(), chunk[id_col].tolist() if id_col else None
+
+
+def _leer_jsonl(path: Path, text_col: str, id_col: Optional[str], batch: int):
+    texts: list[str] = []
+    ids: list = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            texts.append(str(row.get(text_col) or ""))
+            if id_col:
+                ids.append(row.get(id_col))
+            if len(texts) == batch:
+                yield texts, ids if id_col else None
+                texts, ids = [], []
+    if texts:
+        yield texts, ids if id_col else None
+
+
+def _leer_parquet(path: Path, text_col: str, id_col: Optional[str], batch: int):
+    import pyarrow.parquet as pq
+
+    shards = sorted(path.glob("*.parquet")) if path.is_dir() else [path]
+    cols = [text_col] + ([id_col] if id_col else [])
+    for shard in shards:
+        pf = pq.ParquetFile(shard, memory_map=True)
+        for rb in pf.iter_batches(batch_size=batch, columns=cols):
+            texts = [t or "" for t in rb.column(text_col).to_pylist()]
+            yield texts, rb.column(id_col).to_pylist() if id_col else None
+
+
+_LECTORES = {"csv": _leer_csv, "jsonl": _leer_jsonl, "parquet": _leer_parquet}
+
+
+def leer_lotes(
+    path: Path, text_col: str, id_col: Optional[str], batch: int, skip: int = 0
+) -> Iterator[tuple[int, list[str], list]]:
+    """Lotes `(fila inicial, textos, ids)`; sin columna de id, el id es el número de fila."""
+    row = 0
+    for texts, ids in _LECTORES[_formato(path)](path, text_col, id_col, batch):
+        n = len(texts)
+        if ids is None:
+            ids = list(range(row, row + n))
+        if row + n <= skip:
+            row += n
+            continue
+        if row < skip:
+            cut = skip - row
+            texts, ids, row = texts[cut:], ids[cut:], skip
+        yield row, texts, ids
+        row += len(texts)
+
+
+# ---------------- escritura y checkpoint ----------------
+
+class Salida:
+    """Fichero de resultados (JSONL o CSV) con checkpoint para reanudar."""
+
+    def __init__(self, path: Path, input_path: Path, model_version: str, resume: bool):
+        self.path = path
+        self.ckpt_path = path.with_name(path.name + ".ckpt")
+        self.csv = path.suffix == ".csv"
+        self.input = str(input_path.resolve())
+        self.model_version = model_version
+        self.rows_done = 0
+
+        offset = 0
+        if resume and self.ckpt_path.exists():
+            ckpt = json.loads(self.ckpt_path.read_text(encoding="utf-8"))
+            if ckpt["input"] != self.input or ckpt["model_version"] != model_version:
+                raise SystemExit(
+                    "❌ El checkpoint es de otra entrada u otro modelo; borra "
+                    f"{self.ckpt_path} y {path} para empezar de cero."
+                )
+            self.rows_done = ckpt["rows_done"]
+            offset = ckpt["out_bytes"]
+        elif path.exists() and path.stat().st_size:
+            if resume:
+                raise SystemExit(f"❌ No hay checkpoint para {path}; bórralo para empezar de cero.")
+            raise SystemExit(f"❌ {path} ya existe; usa --resume para continuar o bórralo.")
+
+        self._f = open(path, "a+b")
+        # Lo escrito después del último checkpoint (p. ej. media línea) se descarta.
+        self._f.truncate(offset)
+        self._f.seek(offset)
+        if self.csv and offset == 0:
+            self._escribir([OUT_FIELDS])
+
+    def _escribir(self, rows: list) -> None:
+        if self.csv:
+            buf = io.StringIO()
+            csv.writer(buf).writerows(rows)
+            self._f.write(buf.getvalue().encode("utf-8"))
+        else:
+            self._f.write(b"".join(
+                (json.dumps(dict(zip(OUT_FIELDS, r)), ensure_ascii=False) + "\n").encode("utf-8") for r in rows
+            ))
+
+    def escribir_lote(self, ids: list, results: list) -> None:
+        rows = []
+        for doc_id, res in zip(ids, results):
+            if res is None:
+                rows.append((doc_id, None, None, None, self.model_version, "texto vacío"))
+                continue
+            prob, ai, human = res
+            if self.csv:
+                ai, human = json.dumps(ai, ensure_ascii=False), json.dumps(human, ensure_ascii=False)
+            rows.append((doc_id, prob, ai, human, self.model_version, None))
+        self._escribir(rows)
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self.rows_done += len(ids)
+        self._guardar_ckpt()
+
+    def _guardar_ckpt(self) -> None:
+        tmp = self.ckpt_path.with_name(self.ckpt_path.name + ".tmp")
+        tmp.write_text(json.dumps({
+            "input": self.input,
+            "model_version": self.model_version,
+            "rows_done": self.rows_done,
+            "out_bytes": self._f.tell(),
+        }), encoding="utf-8")
+        os.replace(tmp, self.ckpt_path)
+
+    def close(self) -> None:
+        self._f.close()
+
+
+# ---------------- puntuación ----------------
+
+def _resuelto(value) -> Future:
+    fut: Future = Future()
+    fut.set_result(value)
+    return fut
+
+
+def puntuar(
+    input_path: Path,
+    out_path: Path,
+    text_col: str = "texto",
+    id_col: Optional[str] = None,
+    batch: int = 1000,
+    workers: int = os.cpu_count() or 1,
+    model_path: str = MODEL_PATH,
+    compiled_dir: str = COMPILED_MODEL_DIR,
+    resume: bool = False,
+) -> None:
+    model, version, source = ModelStore(model_path, compiled_dir).snapshot()
+    salida = Salida(out_path, input_path, version, resume)
+    if salida.rows_done:
+        print(f"[score] Reanudando desde la fila {salida.rows_done}")
+
+    pool: Optional[InferencePool] = None
+    if workers > 0:
+        # Como mucho 2 lotes por worker en vuelo: memoria acotada y los
+        # workers nunca esperan al lector.
+        pool = InferencePool(model, source, workers=workers, max_pending=2 * workers)
+        pool.start()
+
+    t0 = time.perf_counter()
+    start_rows = salida.rows_done
+    last_report = t0
+    pending: deque = deque()
+
+    def _drain(block_until: int) -> None:
+        nonlocal last_report
+        while len(pending) > block_until:
+            ids, mask, fut = pending.popleft()
+            it = iter(fut.result())
+            salida.escribir_lote(ids, [next(it) if ok else None for ok in mask])
+            now = time.perf_counter()
+            if now - last_report >= 5 or not pending:
+                done = salida.rows_done - start_rows
+                print(f"[score] {salida.rows_done} documentos ({done / (now - t0):.0f} docs/s)")
+                last_report = now
+
+    try:
+        for _, texts, ids in leer_lotes(input_path, text_col, id_col, batch, skip=salida.rows_done):
+            texts = [t.strip() if isinstance(t, str) else "" for t in texts]
+            mask = [bool(t) for t in texts]
+            todo = [t for t in texts if t]
+            if not todo:
+                pending.append((ids, mask, _resuelto([])))
+            elif pool is not None:
+                _drain(2 * workers - 1)
+                pending.append((ids, mask, pool.submit(todo)))
+            else:
+                pending.append((ids, mask, _resuelto(score_batch(model, todo))))
+            if pool is None:
+                _drain(0)
+        _drain(0)
+    finally:
+        salida.close()
+        if pool is not None:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - t0
+    done = salida.rows_done - start_rows
+    print(
+        f"✅ {done} documentos en {elapsed:.1f}s ({done / elapsed if elapsed else 0:.0f} docs/s) "
+        f"con el modelo {version} -> {out_path}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Puntúa un corpus CSV/JSONL/Parquet con el modelo entrenado")
+    parser.add_argument("input", type=Path, help="CSV, JSONL, fichero Parquet o directorio de fragmentos")
+    parser.add_argument("--out", type=Path, required=True, help="resultados (.jsonl o .csv)")
+    parser.add_argument("--text-col", default="texto")
+    parser.add_argument("--id-col", default=None, help="columna de id (por defecto, el número de fila)")
+    parser.add_argument("--batch", type=int, default=1000, help="documentos por lote")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="procesos de inferencia (0 = en este proceso)")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--compiled-dir", default=COMPILED_MODEL_DIR)
+    parser.add_argument("--resume", action="store_true", help="continuar desde el último checkpoint")
+    args = parser.parse_args()
+
+    if not args.input.exists():
+        sys.exit(f"❌ No existe {args.input}")
+    puntuar(
+        args.input,
+        args.out,
+        text_col=args.text_col,
+        id_col=args.id_col,
+        batch=args.batch,
+        workers=args.workers,
+        model_path=args.model,
+        compiled_dir=args.compiled_dir,
+        resume=args.resume,
+    )
+
+
+if __name__ == "__main__":
+    main()
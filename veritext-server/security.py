@@ -1,9 +1,40 @@
 # veritext-server/security.py
-from passlib.context import CryptContext
+"""Contraseñas y tokens.
+
+bcrypt es caro a propósito (decenas o cientos de milisegundos por hash), así
+que los endpoints de auth no lo ejecutan en el threadpool compartido de
+FastAPI sino en `HashExecutor`: pocos hilos dedicados y una cola acotada.
+Una ráfaga de logins se rechaza con 503 en lugar de ocupar los hilos que
+atienden `/analyze/text`.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+import asyncio
+import os
 import secrets
+import threading
+import time
+
+from passlib.context import CryptContext
+
 
+# Coste de bcrypt. Los hashes con otro coste se rehacen en el siguiente login.
+BCRYPT_ROUNDS = int(os.getenv("VERITEXT_BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("VERITEXT_HASH_WORKERS", "2"))
+# Peticiones de hash en espera además de las que se están ejecutando.
+HASH_MAX_PENDING = int(os.getenv("VERITEXT_HASH_MAX_PENDING", "32"))
 
-_pwd = CryptContext(schemes=["bcrypt_sha256"], deprecated="auto")
+
+_pwd = CryptContext(
+    schemes=["bcrypt_sha256"],
+    deprecated="auto",
+    bcrypt_sha256__default_rounds=BCRYPT_ROUNDS,
+    # Fijar min y max al coste configurado hace que `verify_and_update`
+    # marque como obsoleto cualquier hash con otro coste.
+    bcrypt_sha256__min_rounds=BCRYPT_ROUNDS,
+    bcrypt_sha256__max_rounds=BCRYPT_ROUNDS,
+)
 
 
 def hash_password(password: str) -> str:
@@ -14,6 +45,78 @@ def verify_password(password: str, hashed: str) -> bool:
     return _pwd.verify(password, hashed)
 
 
+def verify_and_update(password: str, hashed: str) -> tuple[bool, Optional[str]]:
+    """Verifica la contraseña y, si el hash está obsoleto, devuelve uno nuevo."""
+    return _pwd.verify_and_update(password, hashed)
+
+
 def new_token() -> str:
 
     return secrets.token_hex(32)
+
+
+class HashSaturated(Exception):
+    """La cola de hashing está llena; el cliente debe reintentar más tarde."""
+
+
+class HashExecutor:
+    def __init__(self, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="veritext-hash")
+        self._slots = threading.BoundedSemaphore(self.workers + max_pending)
+        self._lock = threading.Lock()
+
+        self.completed = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self._wait_ms: deque = deque(maxlen=1024)
+        self._run_ms: deque = deque(maxlen=1024)
+
+    def _timed(self, fn: Callable[..., Any], enqueued: float, *args: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            done = time.perf_counter()
+            with self._lock:
+                self._wait_ms.append((started - enqueued) * 1000)
+                self._run_ms.append((done - started) * 1000)
+                self.completed += 1
+                self.in_flight -= 1
+            self._slots.release()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashSaturated()
+        with self._lock:
+            self.in_flight += 1
+        future = self._executor.submit(self._timed, fn, time.perf_counter(), *args)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        def pct(values: list, q: float) -> Optional[float]:
+            if not values:
+                return None
+            values = sorted(values)
+            return round(values[min(len(values) - 1, int(q * len(values)))], 2)
+
+        with self._lock:
+            wait, run = list(self._wait_ms), list(self._run_ms)
+            return {
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "queue_wait_ms_p50": pct(wait, 0.5),
+                "queue_wait_ms_p95": pct(wait, 0.95),
+                "hash_ms_p50": pct(run, 0.5),
+                "hash_ms_p95": pct(run, 0.95),
+            }
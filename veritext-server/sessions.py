@@ -0,0 +1,87 @@
+# veritext-server/sessions.py
+"""Caché en memoria de sesiones: token -> (id, email) del usuario.
+
+Con la caché caliente una petición autenticada no consulta la base de datos
+para resolver el token. `login` rota el token del usuario, así que al
+hacerlo se invalida cualquier token anterior de ese usuario en este
+proceso. Con varios procesos, un token rotado puede seguir aceptándose en
+los demás hasta que caduque su entrada (`VERITEXT_SESSION_TTL_S`).
+"""
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+import os
+import threading
+import time
+
+
+SESSION_CACHE_SIZE = int(os.getenv("VERITEXT_SESSION_CACHE_SIZE", "10000"))
+SESSION_TTL_S = float(os.getenv("VERITEXT_SESSION_TTL_S", "60"))
+
+
+class SessionUser(NamedTuple):
+    id: int
+    email: str
+
+
+class SessionCache:
+    def __init__(self, maxsize: int = SESSION_CACHE_SIZE, ttl_s: float = SESSION_TTL_S):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[str, tuple[float, SessionUser]]" = OrderedDict()
+        self._by_user: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> Optional[SessionUser]:
+        with self._lock:
+            entry = self._data.get(token)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._drop(token)
+                self.misses += 1
+                return None
+            self._data.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token: str, user: SessionUser) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            old = self._by_user.get(user.id)
+            if old is not None and old != token:
+                self._drop(old)
+            self._data[token] = (time.monotonic() + self.ttl_s, user)
+            self._data.move_to_end(token)
+            self._by_user[user.id] = token
+            while len(self._data) > self.maxsize:
+                self._drop(next(iter(self._data)))
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Olvida el token cacheado de un usuario (p. ej. al rotarlo en login)."""
+        with self._lock:
+            token = self._by_user.get(user_id)
+            if token is not None:
+                self._drop(token)
+                self.invalidations += 1
+
+    def _drop(self, token: str) -> None:
+        entry = self._data.pop(token, None)
+        if entry is not None and self._by_user.get(entry[1].id) == token:
+            del self._by_user[entry[1].id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
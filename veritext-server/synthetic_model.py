@@ -0,0 +1,40 @@
+# veritext-server/synthetic_model.py
+"""Modelo pequeño entrenado al vuelo con dos vocabularios sintéticos.
+
+Lo usan benchmark.py y las pruebas, que así no necesitan model.joblib:
+los textos con `HUMAN_WORDS` puntúan como humanos y los de `AI_WORDS`
+como IA.
+"""
+from pathlib import Path
+from typing import Union
+import random
+
+HUMAN_WORDS = (
+    "hoy fui a la universidad y conversé con mis compañeros sobre el proyecto "
+    "ayer tuvimos una reunión larga creo que mi opinión cambió bastante después"
+).split()
+AI_WORDS = (
+    "presenta análisis detallado integral coherente perspectiva sistemático holístico "
+    "fenómeno optimiza asimismo marco relevante fundamental implementación estrategia"
+).split()
+
+
+def entrenar_modelo(path: Union[str, Path]) -> None:
+    """Entrena el Pipeline tfidf + regresión logística y lo guarda en `path`."""
+    from joblib import dump
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+
+    from preprocess import Analizador
+
+    rng = random.Random(0)
+    X = [" ".join(rng.choice(HUMAN_WORDS) for _ in range(60)) for _ in range(200)]
+    X += [" ".join(rng.choice(AI_WORDS) for _ in range(60)) for _ in range(200)]
+    y = [0] * 200 + [1] * 200
+    pipe = Pipeline([
+        ("tfidf", TfidfVectorizer(analyzer=Analizador(ngram_range=(1, 2)), token_pattern=None)),
+        ("clf", LogisticRegression(max_iter=200)),
+    ])
+    pipe.fit(X, y)
+    dump(pipe, path)
@@ -0,0 +1,57 @@
+# veritext-server/tests/conftest.py
+"""Entorno común de las pruebas.
+
+Como el benchmark: SQLite temporal y un modelo pequeño entrenado al vuelo,
+así que no hace falta MySQL ni model.joblib. Las variables de entorno se
+fijan antes de importar nada del servidor, porque los módulos leen su
+configuración al importarse.
+"""
+from pathlib import Path
+import os
+import sys
+import tempfile
+
+import pytest
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+WORKDIR = Path(tempfile.mkdtemp(prefix="veritext-test-"))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{WORKDIR / 'test.db'}"
+os.environ["VERITEXT_MODEL_PATH"] = str(WORKDIR / "model.joblib")
+os.environ["VERITEXT_COMPILED_MODEL_DIR"] = str(WORKDIR / "model_compiled")
+os.environ["VERITEXT_PROFILE_DIR"] = str(WORKDIR / "profiles")
+os.environ["VERITEXT_BCRYPT_ROUNDS"] = "4"
+os.environ["VERITEXT_MICROBATCH"] = "0"
+sys.path.insert(0, str(SERVER_DIR))
+
+from synthetic_model import AI_WORDS, HUMAN_WORDS, entrenar_modelo  # noqa: E402
+
+entrenar_modelo(WORKDIR / "model.joblib")
+
+
+@pytest.fixture(scope="session")
+def workdir() -> Path:
+    return WORKDIR
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import app as appmod
+
+    with TestClient(appmod.app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def login(client):
+    """`login(email)` registra al usuario si hace falta y devuelve sus cabeceras."""
+
+    def _login(email: str = "ana@example.com") -> dict:
+        client.post("/auth/register", json={"email": email, "password": "secret1"})
+        r = client.post("/auth/login", json={"email": email, "password": "secret1"})
+        assert r.status_code == 200, r.text
+        return {"Authorization": f"Bearer {r.json()['token']}"}
+
+    return _login
@@ -0,0 +1,21 @@
+# veritext-server/tests/modelo_lento.py
+"""Analizador que tarda a propósito, para probar los timeouts del pool.
+
+Vive en un módulo propio porque los workers del pool (forkserver) no ven
+los monkeypatch de la prueba: lo importan al cargar el modelo.
+"""
+import time
+
+from preprocess import Analizador, preparar
+
+# Palabra -> segundos que tarda el worker al analizar el texto.
+PAUSAS = {"dormir": 60.0, "lento": 1.0}
+
+
+class AnalizadorLento(Analizador):
+    def __call__(self, doc):
+        doc = preparar(doc)
+        for palabra, segundos in PAUSAS.items():
+            if palabra in doc.words:
+                time.sleep(segundos)
+        return super().__call__(doc)
@@ -0,0 +1,121 @@
+import time
+
+import pytest
+
+from admission import AdmissionController, Rejected, UserRateLimiter
+from conftest import AI_WORDS
+
+
+def _texto(n: int = 40) -> str:
+    return " ".join(AI_WORDS[i % len(AI_WORDS)] for i in range(n))
+
+
+def test_token_bucket_burst_and_refill():
+    limiter = UserRateLimiter(rate=20, burst=3)
+    for _ in range(3):
+        limiter.check("ana")
+    with pytest.raises(Rejected) as exc:
+        limiter.check("ana")
+    assert exc.value.reason == "rate_limit"
+    assert exc.value.retry_after >= 1
+
+    # Cada clave tiene su propio cubo.
+    limiter.check("luis")
+
+    time.sleep(0.1)  # 2 tokens a 20/s
+    limiter.check("ana")
+    assert limiter.stats()["allowed"] == 5
+    assert limiter.stats()["limited"] == 1
+
+
+def test_token_bucket_charges_cost():
+    limiter = UserRateLimiter(rate=0.01, burst=10)
+    limiter.check("ana", cost=8)
+    with pytest.raises(Rejected):
+        limiter.check("ana", cost=3)
+    limiter.check("ana", cost=2)
+    with pytest.raises(Rejected):
+        limiter.check("ana")
+
+
+def test_cost_above_burst_needs_full_bucket_and_leaves_debt():
+    limiter = UserRateLimiter(rate=0.01, burst=5)
+    limiter.check("ana", cost=50)
+    with pytest.raises(Rejected) as exc:
+        limiter.check("ana")
+    # 45 tokens de deuda más el que pide, a 0.01/s.
+    assert exc.value.retry_after >= 4600
+
+
+def test_disabled_limiter_allows_everything():
+    limiter = UserRateLimiter(rate=0, burst=1)
+    for _ in range(100):
+        limiter.check("ana", cost=1000)
+
+
+@pytest.fixture
+def limited_app(monkeypatch):
+    import app as appmod
+
+    limiter = UserRateLimiter(rate=0.001, burst=10)
+    admission = AdmissionController(max_concurrency=4, max_queue=0)
+    monkeypatch.setattr(appmod, "_RATE_LIMIT", limiter)
+    monkeypatch.setattr(appmod, "_ADMISSION", admission)
+    return limiter, admission
+
+
+def test_batch_is_charged_per_item(client, login, limited_app):
+    limiter, _ = limited_app
+    headers = login("lotes@example.com")
+
+    r = client.post("/analyze/batch", json=[{"text": _texto(40 + i)} for i in range(8)], headers=headers)
+    assert r.status_code == 200, r.text
+    r = client.post("/analyze/batch", json=[{"text": _texto(60 + i)} for i in range(3)], headers=headers)
+    assert r.status_code == 429
+    assert "Retry-After" in r.headers
+    assert limiter.stats()["allowed"] == 1
+
+
+def test_stream_is_charged_per_window(client, login, limited_app):
+    limiter, admission = limited_app
+    headers = login("ventanas@example.com")
+
+    # 2000 palabras son más ventanas que la ráfaga: entra con el cubo lleno.
+    r = client.post("/analyze/stream", json={"text": _texto(2000)}, headers=headers)
+    assert r.status_code == 200, r.text
+    r = client.post("/analyze/text", json={"text": _texto(50)}, headers=headers)
+    assert r.status_code == 429
+    # El hueco de admisión se libera al terminar de emitir.
+    assert admission.in_flight == 0
+
+
+@pytest.mark.parametrize("path,body", [
+    ("/analyze/batch", [{"text": _texto()}]),
+    ("/analyze/stream", {"text": _texto()}),
+])
+def test_batch_and_stream_go_through_admission(client, login, limited_app, path, body):
+    _, admission = limited_app
+    admission.in_flight = admission.max_concurrency  # servidor lleno y sin cola
+    r = client.post(path, json=body, headers=login("admision@example.com"))
+    assert r.status_code == 503
+    assert "Retry-After" in r.headers
+    assert admission.stats()["rejected_queue_full"] == 1
+
+
+@pytest.mark.parametrize("lleno", ["rate_limit", "admission"])
+def test_stream_is_rejected_before_preprocessing(client, login, limited_app, monkeypatch, lleno):
+    import app as appmod
+
+    limiter, admission = limited_app
+    headers = login("rechazo@example.com")
+    if lleno == "rate_limit":
+        limiter.charge(("user", client.get("/auth/verify", headers=headers).json()["id"]), 10)
+    else:
+        admission.in_flight = admission.max_concurrency
+
+    def _no_preparar(*args):
+        raise AssertionError("se preprocesó un documento rechazado")
+
+    monkeypatch.setattr(appmod, "_preparar_stream", _no_preparar)
+    r = client.post("/analyze/stream", json={"text": _texto(5000)}, headers=headers)
+    assert r.status_code == (429 if lleno == "rate_limit" else 503)
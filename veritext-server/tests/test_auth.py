@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import event
+
+from db import DB_ASYNC, engine
+
+
+def test_login_issues_working_token(client, login):
+    headers = login("luis@example.com")
+    r = client.get("/auth/verify", headers=headers)
+    assert r.status_code == 200
+    assert r.json()["email"] == "luis@example.com"
+
+
+# En modo async las sesiones no expiran al hacer commit y usan otro engine.
+@pytest.mark.skipif(DB_ASYNC, reason="sólo aplica a la base de datos síncrona")
+def test_login_does_not_reload_user_after_commit(client, login):
+    login("marta@example.com")
+    statements: list[str] = []
+
+    def _record(conn, cursor, statement, *args):
+        statements.append(statement.lstrip().split()[0].upper())
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        r = client.post("/auth/login", json={"email": "marta@example.com", "password": "secret1"})
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+
+    assert r.status_code == 200
+    assert statements == ["SELECT", "UPDATE"]
+
+
+def test_session_cache_counts_one_miss_per_lookup(client, login, monkeypatch):
+    import app as appmod
+    from sessions import SessionCache
+
+    headers = login("sesiones@example.com")
+    cache = SessionCache()
+    monkeypatch.setattr(appmod, "_SESSIONS", cache)
+
+    assert client.get("/auth/verify", headers=headers).status_code == 200
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (0, 1)
+    assert client.get("/auth/verify", headers=headers).status_code == 200
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
@@ -0,0 +1,61 @@
+from datetime import datetime
+import json
+
+from sqlalchemy import event, insert
+
+from cache import text_hash
+from conftest import AI_WORDS, HUMAN_WORDS
+from db import DB_ASYNC, engine
+from models import Analysis
+
+
+def _texto(words: list[str], tag: str) -> str:
+    return " ".join(words * 3) + f" {tag}"
+
+
+def test_batch_validates_each_item(client, login):
+    r = client.post("/analyze/batch", json=[{"text": _texto(AI_WORDS, "v1")}, {"text": "   "}], headers=login())
+    assert r.status_code == 200
+    first, second = r.json()
+    assert first["ok"] and 0.0 <= first["score"] <= 1.0
+    assert not second["ok"] and second["error"]
+
+
+def test_batch_reads_one_stored_row_per_hash(client, login):
+    import app as appmod
+
+    texts = [_texto(HUMAN_WORDS, "popular1"), _texto(AI_WORDS, "popular2")]
+    version = appmod._STORE.version
+    # Textos populares: muchos análisis guardados por hash; el último manda.
+    with engine.begin() as conn:
+        for t, text in enumerate(texts):
+            conn.execute(insert(Analysis), [
+                {
+                    "text_hash": text_hash(text),
+                    "model_version": version,
+                    "score": (t * 100 + i) / 1000,
+                    "top_words": json.dumps([f"w{i}"]),
+                    "created_at": datetime(2024, 1, 1),
+                }
+                for i in range(60)
+            ])
+
+    selects: list[tuple] = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "analyses.text_hash IN" in statement:
+            selects.append((statement, parameters))
+
+    event.listen(engine, "after_cursor_execute", _record)
+    try:
+        r = client.post("/analyze/batch", json=[{"text": t} for t in texts], headers=login())
+    finally:
+        event.remove(engine, "after_cursor_execute", _record)
+
+    assert r.status_code == 200, r.text
+    assert [item["score"] for item in r.json()] == [0.059, 0.159]
+    assert [item["top_words"] for item in r.json()] == [["w59"], ["w59"]]
+    if not DB_ASYNC:
+        (statement, parameters), = selects
+        with engine.connect() as conn:
+            assert len(conn.exec_driver_sql(statement, parameters).fetchall()) == 2
@@ -0,0 +1,14 @@
+from build_dataset import FiltroBloom, _muestrear
+
+
+def test_dedup_spans_sources_with_fixed_memory():
+    vistos = FiltroBloom(bits=1 << 16)
+    textos = [f"Texto número {i}" for i in range(500)]
+
+    muestra, unicos, dups = _muestrear(textos + ["  TEXTO número 3 "], 50, vistos)
+    assert (len(muestra), unicos, dups) == (50, 500, 1)
+
+    # La segunda fuente también descarta lo que ya salió en la primera.
+    muestra, unicos, dups = _muestrear(["Texto número 7", "otro texto"], 50, vistos)
+    assert (muestra, unicos, dups) == (["otro texto"], 1, 1)
+    assert len(vistos._bytes) == (1 << 16) // 8
@@ -0,0 +1,40 @@
+import numpy as np
+from joblib import load
+
+from compiled_model import CompiledModel
+from conftest import AI_WORDS, HUMAN_WORDS
+from explain import score_batch
+from export_model import TOLERANCE, export
+from preprocess import adaptar_pipeline
+
+TEXTS = [
+    " ".join(HUMAN_WORDS[:20]),
+    " ".join(AI_WORDS),
+    "Presenta un ANÁLISIS detallado, y creo que hoy fui a la universidad.",
+    "Texto SIN palabras del vocabulario: zzzz qqqq",
+    "x",
+    "",
+]
+
+
+def test_compiled_model_matches_pipeline(workdir, tmp_path):
+    export(workdir / "model.joblib", tmp_path)
+    pipe = load(workdir / "model.joblib")
+    adaptar_pipeline(pipe)
+    compiled = CompiledModel.load(str(tmp_path))
+
+    expected = pipe.predict_proba(TEXTS)[:, 1]
+    got = compiled.predict_proba(TEXTS)[:, 1]
+    assert np.max(np.abs(expected - got)) <= TOLERANCE
+
+
+def test_compiled_model_explains_like_pipeline(workdir, tmp_path):
+    export(workdir / "model.joblib", tmp_path)
+    pipe = load(workdir / "model.joblib")
+    adaptar_pipeline(pipe)
+    compiled = CompiledModel.load(str(tmp_path))
+
+    for (p1, ai1, human1), (p2, ai2, human2) in zip(score_batch(pipe, TEXTS), score_batch(compiled, TEXTS)):
+        assert abs(p1 - p2) <= TOLERANCE
+        assert ai1 == ai2
+        assert human1 == human2
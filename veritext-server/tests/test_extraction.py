@@ -0,0 +1,100 @@
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import os
+import time
+
+import pytest
+
+from extraction import ExtractionError, ExtractionPool, ExtractionSaturated, extraer_pdf
+
+
+def _dormir(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+def _rechazar() -> None:
+    raise ExtractionError("no válido")
+
+
+def _morir() -> None:
+    os._exit(1)
+
+
+def test_timeout_kills_only_the_stuck_job():
+    pool = ExtractionPool(workers=2, max_pending=4, timeout_s=1.0)
+
+    async def main():
+        return await asyncio.gather(
+            pool.run(_dormir, 0.8), pool.run(_dormir, 30), return_exceptions=True
+        )
+
+    ok, stuck = asyncio.run(main())
+    assert ok == 0.8
+    assert isinstance(stuck, TimeoutError)
+    assert pool.stats()["timeouts"] == 1
+    assert pool.stats()["running"] == 0
+
+
+def test_dead_process_raises_broken_pool():
+    pool = ExtractionPool(workers=1, timeout_s=5.0)
+    with pytest.raises(BrokenProcessPool):
+        asyncio.run(pool.run(_morir))
+    # El siguiente trabajo usa un proceso nuevo.
+    assert asyncio.run(pool.run(_dormir, 0)) == 0
+
+
+def test_extraction_error_reaches_caller():
+    pool = ExtractionPool(workers=1, timeout_s=5.0)
+    with pytest.raises(ExtractionError):
+        asyncio.run(pool.run(_rechazar))
+    assert pool.stats()["failed"] == 0
+
+
+def test_full_queue_is_rejected():
+    pool = ExtractionPool(workers=1, max_pending=1, timeout_s=5.0)
+
+    async def main():
+        first = asyncio.ensure_future(pool.run(_dormir, 0.3))
+        await asyncio.sleep(0.05)
+        with pytest.raises(ExtractionSaturated):
+            await pool.run(_dormir, 0)
+        return await first
+
+    assert asyncio.run(main()) == 0.3
+
+
+def _pdf(objs: list[bytes], root: str = "1 0 R") -> bytes:
+    """PDF con una tabla xref correcta y los objetos dados, válidos o no."""
+    out, offsets = b"%PDF-1.4\n", []
+    for i, obj in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{o:010d} 00000 n \n".encode() for o in offsets)
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root {root} >>\nstartxref\n{xref}\n%%EOF".encode()
+    return out
+
+
+@pytest.mark.parametrize("data", [
+    b"%PDF-1.4\nbasura sin estructura",
+    # Estos hacen que pypdf lance TypeError o AttributeError, no PdfReadError.
+    _pdf([b"<< /Type /Catalog /Pages 2 0 R >>", b"<< /Type /Pages /Kids 7 /Count 1 >>"]),
+    _pdf([b"<< /Type /Catalog >>"]),
+    _pdf([b"<< >>"], root="42"),
+])
+def test_malformed_pdf_is_extraction_error(tmp_path, data):
+    path = tmp_path / "roto.pdf"
+    path.write_bytes(data)
+    with pytest.raises(ExtractionError):
+        extraer_pdf(str(path))
+
+
+def test_malformed_pdf_upload_is_400(client, login):
+    r = client.post(
+        "/analyze/file",
+        files={"file": ("roto.pdf", b"%PDF-1.4\nbasura sin estructura", "application/pdf")},
+        headers=login(),
+    )
+    assert r.status_code == 400
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from db import engine
+from models import Analysis
+
+
+def _user_id(client, headers) -> int:
+    return client.get("/auth/verify", headers=headers).json()["id"]
+
+
+def _insert(user_id: int, created: list[datetime]) -> None:
+    rows = [
+        {"user_id": user_id, "score": 0.5, "top_words": '["w"]', "created_at": ts}
+        for ts in created
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(Analysis), rows)
+
+
+def _pages(client, headers, limit: int, **params) -> list[list[dict]]:
+    pages, cursor = [], None
+    while True:
+        query = {"limit": limit, **params, **({"cursor": cursor} if cursor else {})}
+        r = client.get("/history", headers=headers, params=query)
+        assert r.status_code == 200, r.text
+        pages.append(r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+
+
+def test_keyset_pages_cover_history_once_in_order(client, login):
+    headers = login("paginas@example.com")
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    # Varias filas con el mismo created_at: el id desempata entre páginas.
+    _insert(_user_id(client, headers), [base + timedelta(seconds=i // 4) for i in range(11)])
+    _insert(_user_id(client, login("otro@example.com")), [base] * 3)
+
+    pages = _pages(client, headers, limit=3)
+    items = [item for page in pages for item in page]
+
+    assert [len(p) for p in pages] == [3, 3, 3, 2]
+    ids = [item["id"] for item in items]
+    assert len(set(ids)) == 11
+    keys = [(item["created_at"], item["id"]) for item in items]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_since_filters_older_rows(client, login):
+    headers = login("desde@example.com")
+    base = datetime(2024, 2, 1)
+    _insert(_user_id(client, headers), [base + timedelta(days=d) for d in range(5)])
+
+    items = client.get("/history", headers=headers, params={"since": "2024-02-03T00:00:00"}).json()
+    assert [item["created_at"][:10] for item in items] == ["2024-02-05", "2024-02-04"]
+
+
+def test_invalid_cursor_is_rejected(client, login):
+    r = client.get("/history", headers=login(), params={"cursor": "no-es-un-cursor"})
+    assert r.status_code == 400
+
+
+def test_text_is_compressed_off_the_event_loop_and_readable(client, login, monkeypatch):
+    import asyncio
+
+    import text_store
+
+    en_bucle = []
+    comprimir = text_store.comprimir
+
+    def _comprimir(*args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+            en_bucle.append(True)
+        except RuntimeError:
+            pass
+        return comprimir(*args, **kwargs)
+
+    monkeypatch.setattr(text_store, "comprimir", _comprimir)
+    headers = login("textos@example.com")
+    text = "Texto guardado comprimido para leerlo después. " * 50
+    r = client.post("/analyze/text", json={"text": text}, headers=headers)
+    assert r.status_code == 200, r.text
+    assert not en_bucle
+
+    latest = client.get("/history", headers=headers, params={"limit": 1}).json()[0]
+    r = client.get(f"/history/{latest['id']}/text", headers=headers)
+    assert r.status_code == 200, r.text
+    assert r.json()["text"] == text.strip()
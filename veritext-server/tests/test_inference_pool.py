@@ -0,0 +1,66 @@
+import time
+
+import pytest
+from joblib import dump, load
+
+from conftest import AI_WORDS, HUMAN_WORDS
+from inference_pool import InferencePool
+from modelo_lento import AnalizadorLento
+
+
+def _texto(words: list[str], extra: str = "") -> str:
+    return " ".join(words) + (f" {extra}" if extra else "")
+
+
+@pytest.fixture
+def modelo_lento(workdir, tmp_path):
+    pipe = load(workdir / "model.joblib")
+    tfidf = pipe.named_steps["tfidf"]
+    tfidf.set_params(analyzer=AnalizadorLento(tfidf.analyzer.ngram_range))
+    path = tmp_path / "lento.joblib"
+    dump(pipe, path)
+    return str(path)
+
+
+def _esperar_libre(pool: InferencePool) -> None:
+    deadline = time.monotonic() + 5
+    while pool.stats()["pending"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def test_workers_do_not_fork_from_the_server(workdir):
+    pool = InferencePool(None, str(workdir / "model.joblib"), workers=1)
+    pool.start()
+    try:
+        assert pool._executor._mp_context.get_start_method() in ("forkserver", "spawn")
+        (score, _, _), = pool.score([_texto(AI_WORDS)])
+        assert 0.0 <= score <= 1.0
+    finally:
+        pool.shutdown()
+
+
+def test_hung_batch_is_killed_and_siblings_are_resubmitted(modelo_lento):
+    pool = InferencePool(None, modelo_lento, workers=2, max_pending=4, timeout_s=3)
+    pool.start()
+    try:
+        pool.score([_texto(HUMAN_WORDS)])  # workers ya arrancados
+
+        atascado = pool.submit([_texto(AI_WORDS, "dormir")])
+        time.sleep(2.5)
+        # En vuelo cuando vence el atascado: el pool se mata y se reenvía.
+        vecino = pool.submit([_texto(AI_WORDS, "lento")])
+
+        with pytest.raises(TimeoutError):
+            atascado.result()
+        (score, _, _), = vecino.result(timeout=10)
+        assert 0.0 <= score <= 1.0
+
+        # El pool nuevo sigue atendiendo y no quedan huecos ocupados.
+        assert len(pool.score([_texto(HUMAN_WORDS), _texto(AI_WORDS)])) == 2
+        _esperar_libre(pool)
+        stats = pool.stats()
+        assert stats["timeouts"] == 1
+        assert stats["resubmitted"] == 1
+        assert stats["pending"] == 0
+    finally:
+        pool.shutdown()
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from model_store import ModelStore
+
+
+def test_first_load_failure_is_recorded(tmp_path):
+    store = ModelStore(str(tmp_path / "no_existe.joblib"), str(tmp_path / "model_compiled"))
+    with pytest.raises(Exception):
+        store.snapshot()
+    assert not store.ready
+    assert store.last_error is not None
+
+
+def test_successful_load_clears_error(workdir, tmp_path):
+    store = ModelStore(str(tmp_path / "no_existe.joblib"), str(tmp_path / "model_compiled"))
+    with pytest.raises(Exception):
+        store.snapshot()
+
+    store.model_path = str(workdir / "model.joblib")
+    model, version, source = store.snapshot()
+    assert store.ready
+    assert store.last_error is None
+    assert source == store.model_path
+
+
+def test_compiled_load_does_not_rehash_joblib(workdir, tmp_path, monkeypatch):
+    import shutil
+
+    import model_store
+    from export_model import export
+
+    model_path = tmp_path / "model.joblib"
+    shutil.copy2(workdir / "model.joblib", model_path)
+    export(model_path, tmp_path / "model_compiled")
+
+    hashed = []
+    real = model_store.model_file_version
+    monkeypatch.setattr(model_store, "model_file_version", lambda p: hashed.append(p) or real(p))
+
+    store = ModelStore(str(model_path), str(tmp_path / "model_compiled"))
+    _, version, source = store.snapshot()
+    assert source == store.compiled_dir
+    assert not store.reload()
+    assert hashed == []
+
+    # Con otro mtime se vuelve a calcular la huella, una sola vez.
+    st = os.stat(model_path)
+    os.utime(model_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert not store.reload()
+    assert not store.reload()
+    assert hashed == [str(model_path)]
+    assert store.version == version
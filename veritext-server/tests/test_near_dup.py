@@ -0,0 +1,99 @@
+import random
+
+import numpy as np
+
+from conftest import AI_WORDS, HUMAN_WORDS
+from near_dup import NUM_PERM, NearDupIndex, firma
+
+
+def _texto(seed: int, n: int = 200) -> list[str]:
+    rng = random.Random(seed)
+    return [rng.choice(HUMAN_WORDS + AI_WORDS) for _ in range(n)]
+
+
+def _editar(words: list[str], n: int) -> list[str]:
+    out = list(words)
+    for i in range(0, len(out), len(out) // n):
+        out[i] = "cambiada"
+    return out
+
+
+def _jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+def test_signature_is_stable_and_tracks_similarity():
+    words = _texto(1)
+    sig = firma(" ".join(words))
+    assert sig.shape == (NUM_PERM,)
+    assert np.array_equal(sig, firma(" ".join(words)))
+    assert firma("") is None
+
+    near = firma(" ".join(_editar(words, 3)))
+    far = firma(" ".join(_texto(2)))
+    assert _jaccard(sig, near) > 0.8
+    assert _jaccard(sig, far) < 0.3
+
+
+def test_index_finds_near_duplicates_only():
+    index = NearDupIndex()
+    words = _texto(3)
+    index.add("original", firma(" ".join(words)))
+    index.add("otro", firma(" ".join(_texto(4))))
+
+    match = index.query(firma(" ".join(_editar(words, 2))), threshold=0.7)
+    assert match is not None and match[0] == "original"
+    assert index.query(firma(" ".join(_texto(5))), threshold=0.7) is None
+
+
+def test_reuse_is_limited_to_own_analyses(client, login, monkeypatch):
+    import app as appmod
+
+    monkeypatch.setattr(appmod, "NEARDUP_ENABLED", True)
+    monkeypatch.setattr(appmod, "NEARDUP_MODE", "reuse")
+
+    words = _texto(6)
+    alice, bob = login("alice@example.com"), login("bob@example.com")
+    original = client.post("/analyze/text", json={"text": " ".join(words)}, headers=alice).json()
+
+    # Otro usuario: se avisa del parecido, pero el resultado es el de su texto.
+    other = client.post("/analyze/text", json={"text": " ".join(_editar(words, 2))}, headers=bob).json()
+    near = other["near_duplicate"]
+    assert near is not None
+    assert (near["own"], near["analysis_id"], near["reused"]) == (False, None, False)
+
+    # El mismo usuario: se reutiliza su análisis anterior.
+    again = client.post("/analyze/text", json={"text": " ".join(_editar(words, 3))}, headers=alice).json()
+    assert again["near_duplicate"]["own"] is True
+    assert again["near_duplicate"]["reused"] is True
+    assert again["score"] == original["score"]
+    assert again["top_words"] == original["top_words"]
+
+
+def test_sync_picks_up_rows_committed_behind_the_watermark(tmp_path):
+    from datetime import datetime
+
+    from sqlalchemy import create_engine, insert
+
+    from models import TextBlob
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'neardup.db'}")
+    TextBlob.__table__.create(engine)
+
+    def _insertar(key: str, seed: int, created_at: datetime) -> None:
+        with engine.begin() as conn:
+            conn.execute(insert(TextBlob), {
+                "id": key, "codec": "raw", "size": 0, "data": b"",
+                "minhash": firma(" ".join(_texto(seed))).tobytes(), "created_at": created_at,
+            })
+
+    index = NearDupIndex()
+    _insertar("a", 10, datetime(2024, 1, 1, 12, 0, 10))
+    assert index.sync(engine) == 1
+
+    # Otro worker inserta antes pero confirma después de la sincronización.
+    _insertar("b", 11, datetime(2024, 1, 1, 12, 0, 5))
+    assert index.sync(engine) == 1
+    assert index.watermark == datetime(2024, 1, 1, 12, 0, 10)
+    assert index.sync(engine) == 0
+    assert len(index) == 2
@@ -0,0 +1,92 @@
+import csv
+import json
+import random
+
+import pytest
+
+import score_corpus
+from conftest import AI_WORDS, HUMAN_WORDS
+from score_corpus import Salida, puntuar
+
+
+class Caida(Exception):
+    pass
+
+
+def _corpus(path, n: int = 57) -> None:
+    rng = random.Random(0)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["doc_id", "texto"])
+        for i in range(n):
+            words = HUMAN_WORDS if i % 2 else AI_WORDS
+            # Algunas filas vacías: salen con error y no cuentan como puntuadas.
+            w.writerow([f"d{i}", "" if i % 10 == 3 else " ".join(rng.choice(words) for _ in range(30))])
+
+
+def _puntuar(workdir, input_path, out_path, **kw) -> None:
+    puntuar(
+        input_path, out_path, id_col="doc_id", batch=5,
+        model_path=str(workdir / "model.joblib"), compiled_dir=str(workdir / "no_compilado"), **kw,
+    )
+
+
+@pytest.mark.parametrize("out_name,workers", [("res.jsonl", 0), ("res.csv", 0), ("res.jsonl", 2)])
+def test_resume_after_crash_matches_full_run(workdir, tmp_path, monkeypatch, out_name, workers):
+    corpus = tmp_path / "corpus.csv"
+    _corpus(corpus)
+    full, partial = tmp_path / "full" / out_name, tmp_path / "partial" / out_name
+    full.parent.mkdir()
+    partial.parent.mkdir()
+    _puntuar(workdir, corpus, full, workers=workers)
+
+    # El proceso muere tras 4 lotes, a mitad de escribir una línea.
+    escribir = Salida.escribir_lote
+    lotes = 0
+
+    def escribir_y_caer(self, ids, results):
+        nonlocal lotes
+        if lotes == 4:
+            self._f.write(b'{"id": "d20", "sco')
+            self._f.flush()
+            raise Caida()
+        lotes += 1
+        escribir(self, ids, results)
+
+    monkeypatch.setattr(score_corpus.Salida, "escribir_lote", escribir_y_caer)
+    with pytest.raises(Caida):
+        _puntuar(workdir, corpus, partial, workers=workers)
+    monkeypatch.setattr(score_corpus.Salida, "escribir_lote", escribir)
+
+    ckpt = json.loads(partial.with_name(partial.name + ".ckpt").read_text(encoding="utf-8"))
+    assert ckpt["rows_done"] == 20
+
+    _puntuar(workdir, corpus, partial, workers=workers, resume=True)
+    assert partial.read_bytes() == full.read_bytes()
+
+
+def test_output_keeps_input_order_and_ids(workdir, tmp_path):
+    corpus = tmp_path / "corpus.csv"
+    _corpus(corpus, n=12)
+    out = tmp_path / "res.jsonl"
+    _puntuar(workdir, corpus, out, workers=0)
+
+    rows = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert [r["id"] for r in rows] == [f"d{i}" for i in range(12)]
+    assert rows[3]["score"] is None and rows[3]["error"] == "texto vacío"
+    assert all(0.0 <= r["score"] <= 1.0 for i, r in enumerate(rows) if i != 3)
+
+
+def test_refuses_to_overwrite_or_resume_foreign_checkpoint(workdir, tmp_path):
+    corpus = tmp_path / "corpus.csv"
+    _corpus(corpus, n=10)
+    out = tmp_path / "res.jsonl"
+    _puntuar(workdir, corpus, out, workers=0)
+
+    with pytest.raises(SystemExit):
+        _puntuar(workdir, corpus, out, workers=0)
+
+    other = tmp_path / "otro.csv"
+    _corpus(other, n=10)
+    with pytest.raises(SystemExit):
+        _puntuar(workdir, other, out, workers=0, resume=True)
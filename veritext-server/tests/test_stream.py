@@ -0,0 +1,42 @@
+import json
+import random
+
+from conftest import AI_WORDS, HUMAN_WORDS
+from explain import score_batch
+from preprocess import preparar
+
+
+def _texto_largo(seed: int) -> str:
+    rng = random.Random(seed)
+    # Primera mitad humana y segunda de IA: las ventanas puntúan muy distinto.
+    return " ".join(
+        [rng.choice(HUMAN_WORDS) for _ in range(300)] + [rng.choice(AI_WORDS) for _ in range(300)]
+    )
+
+
+def _stream(client, headers, text: str) -> list[dict]:
+    r = client.post("/analyze/stream", json={"text": text}, headers=headers)
+    assert r.status_code == 200, r.text
+    return [json.loads(line) for line in r.text.splitlines() if line]
+
+
+def test_stream_emits_windows_and_summary(client, login):
+    lines = _stream(client, login(), _texto_largo(1))
+    kinds = [line["type"] for line in lines]
+    assert kinds[-1] == "summary"
+    assert kinds.count("window") == lines[-1]["windows"] > 1
+
+
+def test_stream_result_is_not_served_from_cache(client, login):
+    import app as appmod
+
+    headers = login()
+    text = _texto_largo(2)
+    summary = _stream(client, headers, text)[-1]
+
+    expected = score_batch(appmod._STORE.get(), [preparar(text)])[0][0]
+    assert abs(summary["score"] - expected) > 1e-3
+
+    r = client.post("/analyze/text", json={"text": text}, headers=headers)
+    assert r.status_code == 200, r.text
+    assert abs(r.json()["score"] - expected) < 1e-9
@@ -0,0 +1,102 @@
+import threading
+import time
+
+from write_behind import WriteBehind
+
+
+class FakeDB:
+    """`write_fn` que guarda las filas y puede fallar a demanda."""
+
+    def __init__(self):
+        self.rows: list[dict] = []
+        self.down = False
+        self.poison: set[int] = set()
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def write(self, rows: list[dict]) -> None:
+        with self.lock:
+            self.calls += 1
+            if self.down:
+                raise ConnectionError("base de datos caída")
+            if any(r["id"] in self.poison for r in rows):
+                raise ValueError("fila rechazada")
+            self.rows.extend(rows)
+
+
+def _rows(start: int, n: int) -> list[dict]:
+    return [{"id": i, "user_id": 1, "text_hash": f"h{i}"} for i in range(start, start + n)]
+
+
+def _wait_for(cond, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timeout"
+        time.sleep(0.01)
+
+
+def test_flushes_in_batches():
+    db = FakeDB()
+    wb = WriteBehind(db.write, flush_rows=10, flush_ms=50, max_queue=100)
+    assert wb.submit(_rows(0, 25))
+    _wait_for(lambda: len(db.rows) == 25)
+    wb.close()
+    assert [r["id"] for r in db.rows] == list(range(25))
+    assert wb.stats()["written"] == 25
+    assert db.calls == 3
+
+
+def test_flushes_pending_rows_on_close():
+    db = FakeDB()
+    wb = WriteBehind(db.write, flush_rows=100, flush_ms=60_000)
+    assert wb.submit(_rows(0, 5))
+    wb.close()
+    assert len(db.rows) == 5
+
+
+def test_full_queue_falls_back_to_caller():
+    db = FakeDB()
+    entered, gate = threading.Event(), threading.Event()
+
+    def slow_write(rows):
+        entered.set()
+        gate.wait()
+        db.write(rows)
+
+    wb = WriteBehind(slow_write, flush_rows=5, flush_ms=1, max_queue=10)
+    assert wb.submit(_rows(0, 5))
+    entered.wait(5)
+    assert wb.submit(_rows(5, 10))
+    assert not wb.submit(_rows(15, 1))
+    assert wb.stats()["rejected_sync_fallback"] == 1
+    gate.set()
+    wb.close()
+    assert len(db.rows) == 15
+
+
+def test_rows_survive_database_outage():
+    db = FakeDB()
+    db.down = True
+    wb = WriteBehind(db.write, flush_rows=10, flush_ms=1, retry_max_s=0.2)
+    assert wb.submit(_rows(0, 20))
+    _wait_for(lambda: wb.stats()["retried"] > 0)
+    db.down = False
+    _wait_for(lambda: len(db.rows) == 20)
+    wb.close()
+
+    assert [r["id"] for r in db.rows] == list(range(20))
+    stats = wb.stats()
+    assert stats["written"] == 20
+    assert stats["failed"] == 0
+
+
+def test_rejected_row_does_not_block_the_batch():
+    db = FakeDB()
+    db.poison = {3}
+    wb = WriteBehind(db.write, flush_rows=10, flush_ms=1)
+    assert wb.submit(_rows(0, 10))
+    _wait_for(lambda: wb.stats()["failed"] == 1)
+    wb.close()
+
+    assert [r["id"] for r in db.rows] == [i for i in range(10) if i != 3]
+    assert wb.stats()["written"] == 9
@@ -0,0 +1,128 @@
+# veritext-server/text_store.py
+"""Almacenamiento de los textos analizados.
+
+Cada texto se guarda una sola vez en la tabla `texts`, comprimido con zlib
+y con su sha256 como clave; los análisis sólo guardan esa clave
+(`analyses.text_id`). Los listados no tocan `texts` y el texto se
+descomprime únicamente cuando se pide (`cargar_texto`).
+"""
+from typing import Any, Optional
+import hashlib
+import os
+import zlib
+
+from sqlalchemy import insert, select
+
+from models import Analysis, TextBlob
+from near_dup import NEARDUP_ENABLED, firma_bytes
+
+
+CODEC = "zlib"
+ZLIB_LEVEL = int(os.getenv("VERITEXT_TEXT_ZLIB_LEVEL", "6"))
+
+
+def text_id(txt: str) -> str:
+    return hashlib.sha256(txt.encode("utf-8")).hexdigest()
+
+
+def comprimir(txt: str, minhash: Optional[bytes] = None) -> tuple[str, dict]:
+    raw = txt.encode("utf-8")
+    tid = hashlib.sha256(raw).hexdigest()
+    if minhash is None and NEARDUP_ENABLED:
+        minhash = firma_bytes(txt)
+    return tid, {
+        "id": tid,
+        "codec": CODEC,
+        "size": len(raw),
+        "data": zlib.compress(raw, ZLIB_LEVEL),
+        "minhash": minhash,
+    }
+
+
+def descomprimir(codec: str, data: bytes) -> str:
+    if codec != CODEC:
+        raise ValueError(f"Códec de texto desconocido: {codec}")
+    return zlib.decompress(data).decode("utf-8")
+
+
+# INSERT que ignora los textos ya guardados (la clave es su hash).
+_INSERT_TEXTS = (
+    insert(TextBlob)
+    .prefix_with("IGNORE", dialect="mysql")
+    .prefix_with("OR IGNORE", dialect="sqlite")
+)
+
+
+def _comprimir_textos(
+    textos: list[str], firmas: Optional[list[Optional[bytes]]] = None
+) -> tuple[list[str], list[dict]]:
+    """Ids de los textos, en orden, y una fila de `texts` por texto distinto."""
+    ids: list[str] = []
+    blobs: dict[str, dict] = {}
+    for i, txt in enumerate(textos):
+        tid, blob = comprimir(txt, firmas[i] if firmas else None)
+        ids.append(tid)
+        blobs.setdefault(tid, blob)
+    return ids, list(blobs.values())
+
+
+def guardar_textos(
+    conn: Any, textos: list[str], firmas: Optional[list[Optional[bytes]]] = None
+) -> list[str]:
+    """Guarda los textos que aún no existan y devuelve sus ids, en orden.
+
+    `conn` puede ser una Session o una Connection; el commit es del llamador.
+    `firmas` son las firmas MinHash ya calculadas, si las hay.
+    """
+    ids, blobs = _comprimir_textos(textos, firmas)
+    if blobs:
+        conn.execute(_INSERT_TEXTS, blobs)
+    return ids
+
+
+def comprimir_analisis(rows: list[dict]) -> tuple[list[dict], list[dict]]:
+    """Prepara los análisis cuyo campo "text" trae el texto en claro.
+
+    Devuelve las filas de `texts` (comprimidas) y las de `analyses`, que
+    guardan sólo el id del texto. Un campo opcional "minhash" evita
+    recalcular la firma. Es el trabajo de CPU de `guardar_analisis`.
+    """
+    ids, blobs = _comprimir_textos([r["text"] for r in rows], [r.get("minhash") for r in rows])
+    rows = [
+        {**{k: v for k, v in r.items() if k not in ("text", "minhash")}, "text_id": tid}
+        for r, tid in zip(rows, ids)
+    ]
+    return blobs, rows
+
+
+def insertar_analisis(conn: Any, blobs: list[dict], rows: list[dict]) -> None:
+    """Inserta lo que devuelve `comprimir_analisis`; el commit es del llamador."""
+    if blobs:
+        conn.execute(_INSERT_TEXTS, blobs)
+    conn.execute(insert(Analysis), rows)
+
+
+def guardar_analisis(conn: Any, rows: list[dict]) -> None:
+    """Inserta análisis cuyo campo "text" trae el texto en claro.
+
+    El texto va a `texts` y la fila de `analyses` guarda sólo su id. Un
+    campo opcional "minhash" evita recalcular la firma del texto.
+    """
+    insertar_analisis(conn, *comprimir_analisis(rows))
+
+
+def cargar_texto(conn: Any, analysis_id: int, user_id: Optional[int] = None) -> Optional[str]:
+    """Texto de un análisis (de `texts` o, en filas antiguas, de `analyses.text`)."""
+    stmt = (
+        select(Analysis.text_id, Analysis.text, TextBlob.codec, TextBlob.data)
+        .outerjoin(TextBlob, TextBlob.id == Analysis.text_id)
+        .where(Analysis.id == analysis_id)
+    )
+    if user_id is not None:
+        stmt = stmt.where(Analysis.user_id == user_id)
+    row = conn.execute(stmt).first()
+    if row is None:
+        return None
+    if row.data is not None:
+        return descomprimir(row.codec, row.data)
+    return row.text
@@ -1,65 +1,410 @@
 # veritext-server/train_model.py
+"""Entrena el modelo TF-IDF + Regresión Logística.
+
+Uso:
+    python train_model.py              # carga todo el CSV en memoria
+    python train_model.py --stream     # por bloques, memoria constante
+    python train_model.py --keep 20000 --report 2000,5000,20000
+                                       # poda por chi² y compara tamaños
+
+Lee los fragmentos Parquet de build_dataset.py si existen y, si no,
+data/textos.csv.
+"""
 from pathlib import Path
+import argparse
+import resource
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, classification_report, f1_score
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.feature_selection import chi2
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.pipeline import Pipeline
-from joblib import dump
+from sklearn.preprocessing import normalize
+from joblib import dump, load
+
+from explain import score_batch
+from preprocess import Analizador
 
 BASE_DIR = Path(__file__).resolve().parent
 CSV_PATH = BASE_DIR / "data" / "textos.csv"
+# Salida de build_dataset.py; si existe se prefiere al CSV.
+PARQUET_DIR = BASE_DIR / "data" / "textos_parquet"
+MODEL_PATH = BASE_DIR / "model.joblib"
 
-print(f"📄 Cargando dataset desde: {CSV_PATH}")
 
-# 1) Cargar dataset
-df = pd.read_csv(CSV_PATH)
-df = df.dropna(subset=["texto", "label"])
+def _dataset_por_defecto() -> Path:
+    return PARQUET_DIR if any(PARQUET_DIR.glob("part-*.parquet")) else CSV_PATH
 
-X = df["texto"].astype(str)
-y = df["label"].astype(int)  # 0 = humano, 1 = IA
 
-n_samples = len(df)
-n_classes = df["label"].nunique()
-print(f"🔎 Muestras: {n_samples} | Clases: {n_classes}")
+def _shards(path: Path) -> list[Path]:
+    return sorted(path.glob("part-*.parquet"))
 
 
-pipe = Pipeline([
-    ("tfidf", TfidfVectorizer(
-        lowercase=True,
-        ngram_range=(1, 2),
+def _leer_dataset(path: Path) -> pd.DataFrame:
+    if path.is_dir():
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Los fragmentos se mapean en memoria en lugar de leerse y parsearse.
+        tables = [pq.read_table(p, columns=["texto", "label"], memory_map=True) for p in _shards(path)]
+        return pa.concat_tables(tables).to_pandas()
+    return pd.read_csv(path)
+
+
+def _vectorizador(min_df=1, max_features=None, norm="l2") -> TfidfVectorizer:
+    # El analizador de preprocess es el mismo que usa el servidor, así que la
+    # tokenización de entrenamiento y de servicio no pueden divergir.
+    return TfidfVectorizer(
+        analyzer=Analizador(ngram_range=(1, 2)),
+        token_pattern=None,
         max_df=0.9,
-        min_df=1,
-    )),
-    ("clf", LogisticRegression(
+        min_df=min_df,
+        max_features=max_features,
+        norm=norm,
+    )
+
+
+def _clasificador() -> LogisticRegression:
+    return LogisticRegression(
         max_iter=200,
         n_jobs=-1,
         class_weight="balanced",
-    )),
-])
+    )
+
+
+def _seleccionar(Xraw, y, metodo: str, k) -> np.ndarray:
+    """Índices (ordenados) de las k columnas que se conservan."""
+    n = Xraw.shape[1]
+    if k is None or k >= n:
+        return np.arange(n)
+    if metodo == "chi2":
+        scores = np.nan_to_num(chi2(normalize(Xraw), y)[0])
+    else:
+        # Magnitud del coeficiente de un modelo ajustado con todo el vocabulario.
+        scores = np.abs(_clasificador().fit(normalize(Xraw), y).coef_[0])
+    return np.sort(np.argsort(-scores, kind="stable")[:k])
+
+
+def _podar(base: TfidfVectorizer, Xraw, y, idx: np.ndarray) -> Pipeline:
+    """Pipeline con sólo las columnas `idx` del vectorizador `base` ya ajustado.
+
+    No se vuelve a tokenizar: el vocabulario y los IDF se copian de `base` y
+    el clasificador se ajusta sobre las columnas elegidas, renormalizadas en
+    L2 igual que hará el vectorizador al servir.
+    """
+    names = base.get_feature_names_out()
+    vec = _vectorizador(base.min_df, base.max_features)
+    vec.vocabulary_ = {names[i]: j for j, i in enumerate(idx)}
+    vec.idf_ = base.idf_[idx]
+    clf = _clasificador().fit(normalize(Xraw[:, idx]), y)
+    return Pipeline([("tfidf", vec), ("clf", clf)])
+
+
+def _medir(pipe: Pipeline, X_test, y_test) -> dict:
+    """Tamaño, tiempo de carga, latencia por texto y calidad de un modelo."""
+    with tempfile.TemporaryDirectory() as d:
+        path = Path(d) / "model.joblib"
+        dump(pipe, path)
+        size = path.stat().st_size
+        t0 = time.perf_counter()
+        model = load(path)
+        load_ms = (time.perf_counter() - t0) * 1000
+
+    # Mismo camino que el servidor: puntuación y explicación de un texto.
+    lat = []
+    for txt in list(X_test)[:200]:
+        t0 = time.perf_counter()
+        score_batch(model, [txt])
+        lat.append((time.perf_counter() - t0) * 1000)
+    y_pred = model.predict(X_test)
+    return {
+        "features": len(pipe.named_steps["tfidf"].vocabulary_),
+        "size_mb": size / 1e6,
+        "load_ms": load_ms,
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "accuracy": accuracy_score(y_test, y_pred),
+        "f1": f1_score(y_test, y_pred, average="macro"),
+    }
+
+
+def _informe_poda(base, Xraw_tr, y_train, X_test, y_test, metodo: str, niveles: list) -> None:
+    print(f"📏 Informe de poda ({metodo}):")
+    print(f"{'features':>10} {'MB':>8} {'carga ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'accuracy':>9} {'f1':>7}")
+    for k in sorted(set(niveles), key=lambda k: float("inf") if k is None else k):
+        idx = _seleccionar(Xraw_tr, y_train, metodo, k)
+        m = _medir(_podar(base, Xraw_tr, y_train, idx), X_test, y_test)
+        print(
+            f"{m['features']:>10} {m['size_mb']:>8.2f} {m['load_ms']:>9.1f} {m['p50_ms']:>8.2f} "
+            f"{m['p95_ms']:>8.2f} {m['accuracy']:>9.4f} {m['f1']:>7.4f}"
+        )
+
+
+def entrenar_completo(
+    data_path: Path,
+    min_df=1,
+    max_features=None,
+    prune: str = "chi2",
+    keep=None,
+    niveles=None,
+) -> Pipeline:
+    """Entrena con el dataset en memoria.
+
+    `min_df` y `max_features` limitan el vocabulario al ajustar; `keep`
+    conserva además sólo las `keep` columnas mejor puntuadas por `prune`
+    (chi² o |coeficiente|). Con `niveles` se imprime, para cada tamaño de
+    vocabulario, el tamaño del modelo, su carga, la latencia y la calidad.
+    """
+    print(f"📄 Cargando dataset desde: {data_path}")
+
+    # 1) Cargar dataset
+    df = _leer_dataset(data_path)
+    df = df.dropna(subset=["texto", "label"])
+
+    X = df["texto"].astype(str)
+    y = df["label"].astype(int)  # 0 = humano, 1 = IA
+
+    n_samples = len(df)
+    n_classes = df["label"].nunique()
+    print(f"🔎 Muestras: {n_samples} | Clases: {n_classes}")
+
+    # Se vectoriza una sola vez sin normalizar; cada nivel de poda reutiliza
+    # la misma matriz.
+    base = _vectorizador(min_df, max_features, norm=None)
+
+    if n_samples >= 10 and n_classes >= 2:
+        print("🚀 Entrenando con train/test split (con stratify)...")
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42, stratify=y
+        )
+
+        Xraw = base.fit_transform(X_train)
+        print(f"🔤 Vocabulario: {Xraw.shape[1]} términos")
+        if niveles:
+            _informe_poda(base, Xraw, y_train, X_test, y_test, prune, list(niveles) + [keep, None])
+
+        pipe = _podar(base, Xraw, y_train, _seleccionar(Xraw, y_train, prune, keep))
+
+        # 4) Evaluar en test
+        y_pred = pipe.predict(X_test)
+        print("📊 Evaluación en conjunto de prueba:")
+        print(classification_report(y_test, y_pred, digits=3))
 
+    else:
+        # Dataset pequeño -> entrenamos con TODO sin split
+        print("⚠️ Muy pocos datos para hacer split estratificado.")
+        print("   Se entrenará el modelo usando TODO el dataset.")
+        Xraw = base.fit_transform(X)
+        pipe = _podar(base, Xraw, y, _seleccionar(Xraw, y, prune, keep))
 
-if n_samples >= 10 and n_classes >= 2:
-    print("🚀 Entrenando con train/test split (con stratify)...")
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
+    if keep is not None:
+        print(f"✂️ Vocabulario podado a {len(pipe.named_steps['tfidf'].vocabulary_)} términos ({prune})")
+    return pipe
+
+
+# =========================
+#   ENTRENAMIENTO STREAMING
+# =========================
+
+class _Confusion:
+    """Matriz de confusión binaria que se acumula bloque a bloque."""
+
+    def __init__(self):
+        self.tp = self.fp = self.tn = self.fn = 0
+
+    def update(self, y_true, y_pred) -> None:
+        for t, p in zip(y_true, y_pred):
+            if p == 1:
+                if t == 1:
+                    self.tp += 1
+                else:
+                    self.fp += 1
+            elif t == 1:
+                self.fn += 1
+            else:
+                self.tn += 1
+
+    @property
+    def total(self) -> int:
+        return self.tp + self.fp + self.tn + self.fn
+
+    def report(self) -> str:
+        def prf(tp, fp, fn):
+            p = tp / (tp + fp) if tp + fp else 0.0
+            r = tp / (tp + fn) if tp + fn else 0.0
+            f = 2 * p * r / (p + r) if p + r else 0.0
+            return p, r, f
+
+        acc = (self.tp + self.tn) / self.total if self.total else 0.0
+        lines = [f"{'':>10} {'precision':>9} {'recall':>9} {'f1':>9} {'soporte':>9}"]
+        for name, (tp, fp, fn), sup in (
+            ("humano", (self.tn, self.fn, self.fp), self.tn + self.fp),
+            ("IA", (self.tp, self.fp, self.fn), self.tp + self.fn),
+        ):
+            p, r, f = prf(tp, fp, fn)
+            lines.append(f"{name:>10} {p:9.3f} {r:9.3f} {f:9.3f} {sup:9d}")
+        lines.append(f"{'accuracy':>10} {'':>9} {'':>9} {acc:9.3f} {self.total:9d}")
+        return "\n".join(lines)
+
+
+def _es_test(texto: str, test_pct: int) -> bool:
+    # Partición determinista por contenido: la misma fila cae siempre del
+    # mismo lado, sin tener que guardar índices en memoria.
+    return zlib.crc32(texto.encode("utf-8")) % 100 < test_pct
+
+
+def _chunks(path: Path, chunksize: int):
+    if path.is_dir():
+        import pyarrow.parquet as pq
+
+        for shard in _shards(path):
+            pf = pq.ParquetFile(shard, memory_map=True)
+            for batch in pf.iter_batches(batch_size=chunksize, columns=["texto", "label"]):
+                yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=["texto", "label"], chunksize=chunksize)
+
+
+def _bloques(data_path: Path, chunksize: int):
+    for chunk in _chunks(data_path, chunksize):
+        chunk = chunk.dropna(subset=["texto", "label"])
+        yield chunk["texto"].astype(str).tolist(), chunk["label"].astype(int).to_numpy()
+
+
+def _peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def entrenar_streaming(
+    data_path: Path,
+    chunksize: int = 5000,
+    n_features_log2: int = 20,
+    test_pct: int = 20,
+    epochs: int = 1,
+) -> Pipeline:
+    """Entrena leyendo el dataset (CSV o fragmentos Parquet) por bloques con un vectorizador de hashing.
+
+    La memoria depende del tamaño de bloque y de `n_features`, no del
+    tamaño del dataset. Las métricas de test se acumulan en una matriz de
+    confusión: durante el entrenamiento (validación progresiva, cada bloque
+    de test se evalúa con el modelo que aún no lo ha visto) y al final, en
+    una segunda pasada sólo sobre las filas de test.
+    """
+    print(f"📄 Entrenando en streaming desde: {data_path} (bloques de {chunksize})")
+
+    # Se mantiene el nombre "tfidf" del paso porque el servidor lo busca
+    # por ese nombre; aquí es un HashingVectorizer normalizado en L2.
+    vectorizer = HashingVectorizer(
+        analyzer=Analizador(ngram_range=(1, 2)),
+        token_pattern=None,
+        n_features=2 ** n_features_log2,
+        alternate_sign=False,
+        norm="l2",
     )
+    clf = SGDClassifier(loss="log_loss", alpha=1e-6, random_state=42)
+    classes = [0, 1]
 
-    pipe.fit(X_train, y_train)
+    t0 = time.perf_counter()
+    rows = 0
+    progresiva = _Confusion()
+    for epoch in range(epochs):
+        for i, (textos, labels) in enumerate(_bloques(data_path, chunksize)):
+            is_test = [_es_test(t, test_pct) for t in textos]
+            train_x = [t for t, e in zip(textos, is_test) if not e]
+            train_y = labels[[not e for e in is_test]]
+            test_x = [t for t, e in zip(textos, is_test) if e]
+            test_y = labels[is_test]
 
-    # 4) Evaluar en test
-    y_pred = pipe.predict(X_test)
-    print("📊 Evaluación en conjunto de prueba:")
-    print(classification_report(y_test, y_pred, digits=3))
+            if epoch == 0 and test_x and hasattr(clf, "coef_"):
+                progresiva.update(test_y, clf.predict(vectorizer.transform(test_x)))
+            if train_x:
+                clf.partial_fit(vectorizer.transform(train_x), train_y, classes=classes)
 
-else:
-    # Dataset pequeño -> entrenamos con TODO sin split
-    print("⚠️ Muy pocos datos para hacer split estratificado.")
-    print("   Se entrenará el modelo usando TODO el dataset.")
-    pipe.fit(X, y)
+            rows += len(textos)
+            elapsed = time.perf_counter() - t0
+            print(
+                f"   época {epoch + 1} bloque {i + 1}: {rows} filas | "
+                f"{rows / elapsed:,.0f} filas/s | RSS pico {_peak_rss_mb():.0f} MB"
+            )
 
+    if not hasattr(clf, "coef_"):
+        raise SystemExit("No hay filas de entrenamiento en el dataset")
 
-MODEL_PATH = BASE_DIR / "model.joblib"
-dump(pipe, MODEL_PATH)
-print(f"✅ Modelo guardado en {MODEL_PATH}")
+    elapsed = time.perf_counter() - t0
+    print(f"🚀 Entrenado con {rows} filas en {elapsed:.1f}s ({rows / elapsed:,.0f} filas/s)")
+
+    if progresiva.total:
+        print("📈 Validación progresiva (test evaluado antes de cada actualización):")
+        print(progresiva.report())
+
+    final = _Confusion()
+    for textos, labels in _bloques(data_path, chunksize):
+        is_test = [_es_test(t, test_pct) for t in textos]
+        test_x = [t for t, e in zip(textos, is_test) if e]
+        if test_x:
+            final.update(labels[is_test], clf.predict(vectorizer.transform(test_x)))
+    if final.total:
+        print("📊 Evaluación en conjunto de prueba:")
+        print(final.report())
+    print(f"💾 RSS pico: {_peak_rss_mb():.0f} MB")
+
+    return Pipeline([("tfidf", vectorizer), ("clf", clf)])
+
+
+def _min_df(v: str):
+    return float(v) if "." in v else int(v)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Entrena el modelo de Veritext")
+    parser.add_argument("--data", "--csv", dest="data", type=Path, default=None,
+                        help="CSV o directorio de fragmentos Parquet (por defecto data/textos_parquet si existe)")
+    parser.add_argument("--out", type=Path, default=MODEL_PATH)
+    parser.add_argument("--stream", action="store_true", help="entrenamiento por bloques con memoria constante")
+    parser.add_argument("--chunksize", type=int, default=5000)
+    parser.add_argument("--n-features-log2", type=int, default=20)
+    parser.add_argument("--test-pct", type=int, default=20)
+    parser.add_argument("--epochs", type=int, default=1)
+    # Poda del vocabulario (sólo entrenamiento completo; en streaming el
+    # tamaño lo fija --n-features-log2).
+    parser.add_argument("--min-df", type=_min_df, default=1, help="frecuencia documental mínima (entero o fracción)")
+    parser.add_argument("--max-features", type=int, default=None, help="tope de términos por frecuencia")
+    parser.add_argument("--prune", choices=["chi2", "coef"], default="chi2", help="criterio para --keep")
+    parser.add_argument("--keep", type=int, default=None, help="términos que se conservan tras la poda")
+    parser.add_argument("--report", type=lambda v: [int(x) for x in v.split(",")], default=None,
+                        help="niveles de poda a comparar, p. ej. 2000,10000,50000")
+    args = parser.parse_args()
+    data = args.data or _dataset_por_defecto()
+
+    if args.stream:
+        pipe = entrenar_streaming(
+            data,
+            chunksize=args.chunksize,
+            n_features_log2=args.n_features_log2,
+            test_pct=args.test_pct,
+            epochs=args.epochs,
+        )
+    else:
+        pipe = entrenar_completo(
+            data,
+            min_df=args.min_df,
+            max_features=args.max_features,
+            prune=args.prune,
+            keep=args.keep,
+            niveles=args.report,
+        )
+
+    dump(pipe, args.out)
+    print(f"✅ Modelo guardado en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
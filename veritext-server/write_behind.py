@@ -0,0 +1,181 @@
+# veritext-server/write_behind.py
+"""Persistencia diferida de los análisis.
+
+Con `VERITEXT_WRITE_BEHIND=1` los endpoints de análisis no esperan al
+INSERT: encolan la fila y un hilo dedicado la escribe junto con las demás
+en un único INSERT por lote, cada `VERITEXT_WRITE_BEHIND_ROWS` filas o
+cada `VERITEXT_WRITE_BEHIND_MS` milisegundos, lo que ocurra antes.
+
+La cola está acotada. Si se llena, `submit` devuelve False y el llamador
+escribe la fila de forma síncrona, así que la contrapresión frena a los
+clientes en lugar de perder análisis; `stats()` la hace visible. Las filas
+encoladas tardan como mucho un intervalo en aparecer en `/history`.
+
+Si un lote falla se reintenta fila a fila: las que la base de datos acepta
+se guardan y, si ninguna entra (base de datos caída), el lote vuelve al
+principio de la cola y se reintenta con espera exponencial. Mientras tanto
+la cola se llena y los clientes pasan a la escritura síncrona. Sólo se
+descartan, con su usuario y hash en el log, las filas que la base de datos
+rechaza cuando las demás sí entran, o las pendientes al cerrar.
+"""
+from collections import deque
+from typing import Any, Callable, Optional
+import os
+import threading
+import time
+
+
+WRITE_BEHIND_ENABLED = os.getenv("VERITEXT_WRITE_BEHIND", "0") == "1"
+FLUSH_ROWS = int(os.getenv("VERITEXT_WRITE_BEHIND_ROWS", "200"))
+FLUSH_MS = float(os.getenv("VERITEXT_WRITE_BEHIND_MS", "200"))
+MAX_QUEUE = int(os.getenv("VERITEXT_WRITE_BEHIND_QUEUE", "10000"))
+RETRY_MIN_S = 0.1
+RETRY_MAX_S = float(os.getenv("VERITEXT_WRITE_BEHIND_RETRY_MAX_S", "30"))
+
+
+class WriteBehind:
+    """Cola acotada de filas que `write_fn` escribe por lotes desde un hilo."""
+
+    def __init__(
+        self,
+        write_fn: Callable[[list[dict]], None],
+        flush_rows: int = FLUSH_ROWS,
+        flush_ms: float = FLUSH_MS,
+        max_queue: int = MAX_QUEUE,
+        retry_max_s: float = RETRY_MAX_S,
+    ):
+        self.write_fn = write_fn
+        self.flush_rows = max(flush_rows, 1)
+        self.flush_s = max(flush_ms, 1.0) / 1000.0
+        self.max_queue = max(max_queue, self.flush_rows)
+        self.retry_max_s = max(retry_max_s, RETRY_MIN_S)
+        self._retry_s = 0.0
+
+        self._rows: deque = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stop = threading.Event()  # interrumpe la espera entre reintentos
+
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.retried = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.max_depth = 0
+        self._flush_ms_max = 0.0
+        self._flush_ms_sum = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="veritext-write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, rows: list[dict]) -> bool:
+        """Encola las filas; False si no caben y hay que escribirlas ya."""
+        with self._cond:
+            if self._closed or len(self._rows) + len(rows) > self.max_queue:
+                self.rejected += len(rows)
+                return False
+            self._rows.extend(rows)
+            self.enqueued += len(rows)
+            self.max_depth = max(self.max_depth, len(self._rows))
+            self._cond.notify()
+            return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Deja de aceptar filas y escribe las pendientes."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+
+    def _take(self) -> Optional[list[dict]]:
+        with self._cond:
+            while not self._rows and not self._closed:
+                self._cond.wait()
+            # El plazo cuenta desde que hay algo que escribir.
+            deadline = time.monotonic() + self.flush_s
+            while len(self._rows) < self.flush_rows and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if not self._rows:
+                return None
+            n = min(len(self._rows), self.flush_rows)
+            return [self._rows.popleft() for _ in range(n)]
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            self._flush(batch)
+
+    def _flush(self, batch: list[dict]) -> None:
+        t0 = time.perf_counter()
+        try:
+            self.write_fn(batch)
+        except Exception as e:
+            print(f"[write-behind] Error al escribir {len(batch)} análisis:", repr(e))
+            self._recover(batch)
+            return
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        with self._cond:
+            self._retry_s = 0.0
+            self.written += len(batch)
+            self.flushes += 1
+            self._flush_ms_sum += elapsed_ms
+            self._flush_ms_max = max(self._flush_ms_max, elapsed_ms)
+
+    def _recover(self, batch: list[dict]) -> None:
+        """Reintenta un lote fallido fila a fila y devuelve a la cola lo que no entra."""
+        pending = []
+        for row in batch:
+            try:
+                self.write_fn([row])
+            except Exception:
+                pending.append(row)
+        with self._cond:
+            self.written += len(batch) - len(pending)
+            if not pending:
+                self._retry_s = 0.0
+                return
+            if len(pending) < len(batch) or self._closed:
+                # La base de datos acepta otras filas (estas no entrarán nunca)
+                # o se está cerrando: se descartan, pero no en silencio.
+                self.failed += len(pending)
+                for row in pending:
+                    print(
+                        "[write-behind] ❌ Análisis descartado:",
+                        f"user_id={row.get('user_id')} text_hash={row.get('text_hash')}",
+                    )
+                return
+            # Nada entra: base de datos caída. El lote vuelve al principio de
+            # la cola y se espera antes de reintentar; entretanto la cola se
+            # llena y `submit` desvía a los clientes a la escritura síncrona.
+            self._rows.extendleft(reversed(pending))
+            self.retried += len(pending)
+            self._retry_s = wait = min(max(self._retry_s * 2, RETRY_MIN_S), self.retry_max_s)
+        print(f"[write-behind] {len(pending)} análisis en cola; reintento en {wait:.1f}s")
+        self._stop.wait(wait)
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            return {
+                "flush_rows": self.flush_rows,
+                "flush_ms": self.flush_s * 1000,
+                "max_queue": self.max_queue,
+                "depth": len(self._rows),
+                "max_depth": self.max_depth,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "failed": self.failed,
+                "retried": self.retried,
+                "rejected_sync_fallback": self.rejected,
+                "flushes": self.flushes,
+                "flush_ms_avg": (self._flush_ms_sum / self.flushes) if self.flushes else 0.0,
+                "flush_ms_max": self._flush_ms_max,
+            }